@@ -4,8 +4,21 @@ import argparse
 import time
 import concurrent.futures
 import contextlib
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
 import lz4.frame
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from firebase_admin import credentials, initialize_app, storage, delete_app
+from inserir_scripts_sql_no_banco import (
+    NOME_MANIFESTO,
+    NOME_MANIFESTO_PENDENTE,
+    executar_pos_carga_paralelo,
+    invalidar_cache_da_api,
+)
 
 
 # Funções de carregamento e salvamento de dados
@@ -17,9 +30,21 @@ def carrega_csv(caminho_arquivo: str) -> pl.DataFrame:
         return None
 
 
-def salva_csv(dataframe: pl.DataFrame, caminho_arquivo: str) -> bool:
+def escaneia_csv(caminho_arquivo: str) -> pl.LazyFrame:
     try:
-        dataframe.write_csv(caminho_arquivo, separator=";")
+        return pl.scan_csv(caminho_arquivo, separator=";", encoding="utf8")
+    except Exception as e:
+        print(f"Erro ao escanear o arquivo {caminho_arquivo}: {e}")
+        return None
+
+
+def salva_csv(dataframe: pl.DataFrame | pl.LazyFrame, caminho_arquivo: str) -> bool:
+    try:
+        if isinstance(dataframe, pl.LazyFrame):
+            # Executa o plano em modo streaming, gravando o resultado sem materializá-lo inteiro
+            dataframe.sink_csv(caminho_arquivo, separator=";")
+        else:
+            dataframe.write_csv(caminho_arquivo, separator=";")
         return True
     except Exception as e:
         print(f"Erro ao salvar o arquivo {caminho_arquivo}: {e}")
@@ -45,17 +70,31 @@ def para_lower_case(column_name: str) -> str:
     return column_name.lower()
 
 
+def nomes_das_colunas(df: pl.DataFrame | pl.LazyFrame) -> list[str]:
+    return df.collect_schema().names()
+
+
+def iterar_chunks(df: pl.DataFrame | pl.LazyFrame, tamanho_chunk: int):
+    # LazyFrame.collect_batches existe a partir do polars 1.34 (versão mínima no requirements.txt)
+    if isinstance(df, pl.LazyFrame):
+        yield from df.collect_batches(chunk_size=tamanho_chunk)
+    else:
+        yield from df.iter_slices(n_rows=tamanho_chunk)
+
+
 def corrigir_valores_numericos(
-    df: pl.DataFrame, colunas_numericas: list[str]
-) -> pl.DataFrame:
+    df: pl.DataFrame | pl.LazyFrame, colunas_numericas: list[str]
+) -> pl.DataFrame | pl.LazyFrame:
     for coluna in colunas_numericas:
-        if coluna in df.columns:
+        if coluna in nomes_das_colunas(df):
             df = df.with_columns(pl.col(coluna).str.replace(",", ".").cast(pl.Float64))
     return df
 
 
-def converter_datas(df: pl.DataFrame, coluna: str) -> pl.DataFrame:
-    if coluna in df.columns:
+def converter_datas(
+    df: pl.DataFrame | pl.LazyFrame, coluna: str
+) -> pl.DataFrame | pl.LazyFrame:
+    if coluna in nomes_das_colunas(df):
         df = df.with_columns(
             pl.when(pl.col(coluna).str.contains(r"^\d{2}/\d{2}/\d{4}$", strict=False))
             .then(pl.col(coluna).str.replace(r"(\d{2})/(\d{2})/(\d{4})", r"$3-$2-$1"))
@@ -65,8 +104,8 @@ def converter_datas(df: pl.DataFrame, coluna: str) -> pl.DataFrame:
     return df
 
 
-def tratar_descricoes_de_demonstracoes(df: pl.DataFrame):
-    if "descricao" in df.columns:
+def tratar_descricoes_de_demonstracoes(df: pl.DataFrame | pl.LazyFrame):
+    if "descricao" in nomes_das_colunas(df):
         df = df.with_columns(
             pl.col("descricao")
             .str.replace_all(r"\t", " ")
@@ -95,14 +134,14 @@ def tratar_os_dados_operadoras_ativas(df: pl.DataFrame) -> pl.DataFrame:
     return df
 
 
-def trata_os_dados_demonstracoes_contabeis(dados: list[dict]) -> pl.DataFrame:
-    dataframes = []
+def trata_os_dados_demonstracoes_contabeis(dados: list[dict]) -> pl.LazyFrame:
+    lazyframes = []
     for dado in dados:
-        df: pl.DataFrame = dado["dataframe"].rename(
-            {col: para_lower_case(col) for col in dado["dataframe"].columns}
+        df: pl.LazyFrame = dado["lazyframe"].rename(
+            {col: para_lower_case(col) for col in nomes_das_colunas(dado["lazyframe"])}
         )
 
-        if "data" in df.columns:
+        if "data" in nomes_das_colunas(df):
             df = converter_datas(df, "data")
             df = df.with_columns(
                 pl.col("data")
@@ -130,9 +169,9 @@ def trata_os_dados_demonstracoes_contabeis(dados: list[dict]) -> pl.DataFrame:
         
         df = tratar_descricoes_de_demonstracoes(df)
 
-        dataframes.append(df)
+        lazyframes.append(df)
 
-    return pl.concat(dataframes)
+    return pl.concat(lazyframes)
 
 
 # Funções de carregamento de dados
@@ -145,43 +184,216 @@ def carregar_dados_operadoras_ativas(caminho_do_csv: str) -> pl.DataFrame:
         return pl.DataFrame()
 
 
-def carregar_dados_demonstracoes_contabeis(caminho_base: str) -> list[dict]:
-    dados = []
+def listar_arquivos_demonstracoes_contabeis(caminho_base: str) -> list[dict]:
+    arquivos = []
     for ano in os.listdir(caminho_base):
         caminho_ano = os.path.join(caminho_base, ano)
         if os.path.isdir(caminho_ano):
             for arquivo in os.listdir(caminho_ano):
                 if arquivo.endswith(".csv"):
-                    try:
-                        caminho_arquivo = os.path.join(caminho_ano, arquivo)
-                        df = carrega_csv(caminho_arquivo)
-                        if df is not None:
-                            dados.append(
-                                {"dataframe": df, "ano": ano, "trimestre": arquivo[0]}
-                            )
-                    except Exception as e:
-                        print(f"Erro ao processar {arquivo}: {e}")
+                    arquivos.append(
+                        {
+                            "caminho": os.path.join(caminho_ano, arquivo),
+                            "chave": f"{ano}/{arquivo}",
+                            "ano": ano,
+                            "trimestre": arquivo[0],
+                        }
+                    )
+    return arquivos
+
+
+def carregar_dados_demonstracoes_contabeis(
+    caminho_base: str, particoes: set[tuple[str, str]] = None
+) -> list[dict]:
+    dados = []
+    for arquivo in listar_arquivos_demonstracoes_contabeis(caminho_base):
+        if particoes is not None and (arquivo["ano"], arquivo["trimestre"]) not in particoes:
+            continue
+        try:
+            lf = escaneia_csv(arquivo["caminho"])
+            if lf is not None:
+                dados.append(
+                    {"lazyframe": lf, "ano": arquivo["ano"], "trimestre": arquivo["trimestre"]}
+                )
+        except Exception as e:
+            print(f"Erro ao processar {arquivo['chave']}: {e}")
 
     return dados
 
 
+# Funções do manifesto usado na carga incremental
+def calcular_hash_arquivo(caminho_arquivo: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(caminho_arquivo, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def contar_linhas_csv(caminho_arquivo: str) -> int:
+    return escaneia_csv(caminho_arquivo).select(pl.len()).collect().item()
+
+
+def gerar_manifesto(caminho_operadoras: str, caminho_demonstracoes: str) -> dict:
+    manifesto = {
+        "operadoras": {
+            "hash": calcular_hash_arquivo(caminho_operadoras),
+            "linhas": contar_linhas_csv(caminho_operadoras),
+        },
+        "demonstracoes": {},
+    }
+    for arquivo in listar_arquivos_demonstracoes_contabeis(caminho_demonstracoes):
+        manifesto["demonstracoes"][arquivo["chave"]] = {
+            "ano": arquivo["ano"],
+            "trimestre": arquivo["trimestre"],
+            "hash": calcular_hash_arquivo(arquivo["caminho"]),
+            "linhas": contar_linhas_csv(arquivo["caminho"]),
+        }
+    return manifesto
+
+
+def carregar_manifesto(caminho_manifesto: str) -> dict:
+    try:
+        with open(caminho_manifesto, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Erro ao carregar o manifesto {caminho_manifesto}: {e}")
+        return {}
+
+
+def salvar_manifesto(manifesto: dict, caminho_manifesto: str):
+    try:
+        with open(caminho_manifesto, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, indent=4, ensure_ascii=False)
+    except Exception as e:
+        print(f"Erro ao salvar o manifesto {caminho_manifesto}: {e}")
+
+
+def identificar_particoes_alteradas(
+    manifesto_anterior: dict, manifesto_atual: dict
+) -> set[tuple[str, str]]:
+    anteriores = manifesto_anterior.get("demonstracoes", {})
+    atuais = manifesto_atual["demonstracoes"]
+
+    particoes = set()
+    for chave, arquivo in atuais.items():
+        if anteriores.get(chave, {}).get("hash") != arquivo["hash"]:
+            particoes.add((arquivo["ano"], arquivo["trimestre"]))
+    # Arquivos que sumiram também mudam a partição: ela é recarregada sem eles ou, se ficou sem arquivos, apagada
+    for chave, arquivo in anteriores.items():
+        if chave not in atuais:
+            particoes.add((arquivo["ano"], arquivo["trimestre"]))
+    return particoes
+
+
+def planejar_carga_incremental(manifesto_anterior: dict, manifesto_atual: dict) -> dict:
+    """
+    Compara o manifesto da última carga concluída com os arquivos atuais e devolve:
+    - recarregar_operadoras: o cadastro mudou (ou não há manifesto), então operadoras_ativas é esvaziada e
+      carregada de novo, e todas as partições são refeitas, porque o filtro de operadoras inativas pode
+      mudar qualquer trimestre
+    - particoes: partições (ano, trimestre) a apagar e carregar de novo
+    - particoes_removidas: partições que ficaram sem arquivo e são só apagadas
+    """
+    particoes_atuais = {
+        (arquivo["ano"], arquivo["trimestre"]) for arquivo in manifesto_atual["demonstracoes"].values()
+    }
+    particoes_anteriores = {
+        (arquivo["ano"], arquivo["trimestre"])
+        for arquivo in manifesto_anterior.get("demonstracoes", {}).values()
+    }
+    if manifesto_anterior.get("operadoras", {}).get("hash") != manifesto_atual["operadoras"]["hash"]:
+        return {
+            "recarregar_operadoras": True,
+            "particoes": particoes_atuais,
+            "particoes_removidas": particoes_anteriores - particoes_atuais,
+        }
+
+    alteradas = identificar_particoes_alteradas(manifesto_anterior, manifesto_atual)
+    return {
+        "recarregar_operadoras": False,
+        "particoes": alteradas & particoes_atuais,
+        "particoes_removidas": alteradas - particoes_atuais,
+    }
+
+
+# Funções das partições (ano, trimestre) de demonstracoes_contabeis
+def nome_da_particao(ano, trimestre) -> str:
+    return f"demonstracoes_contabeis_{int(ano)}_{int(trimestre)}"
+
+
+def limites_da_particao(ano, trimestre) -> str:
+    return f"FOR VALUES FROM ({int(ano)}, {int(trimestre)}) TO ({int(ano)}, {int(trimestre) + 1})"
+
+
+# Executado antes das operadoras quando o cadastro muda; o CASCADE esvazia também demonstracoes_contabeis
+# (chave estrangeira fk_operadora), que nesse caso tem todas as partições recarregadas
+COMANDO_RECARGA_OPERADORAS = "TRUNCATE operadoras_ativas CASCADE;\n"
+
+
+def gerar_comandos_remocao_de_particoes(particoes: set[tuple[str, str]]) -> str:
+    return "".join(
+        f"DROP TABLE IF EXISTS {nome_da_particao(ano, trimestre)};\n" for ano, trimestre in sorted(particoes)
+    )
+
+
+def gerar_comandos_particoes(particoes: set[tuple[str, str]], recriar: bool = False) -> str:
+    # Na carga incremental a partição é apagada e recriada, sem DELETE linha a linha
+    comandos = []
+    for ano, trimestre in sorted(particoes):
+        particao = nome_da_particao(ano, trimestre)
+        if recriar:
+            comandos.append(f"DROP TABLE IF EXISTS {particao};\n")
+        comandos.append(
+            f"CREATE TABLE IF NOT EXISTS {particao} PARTITION OF demonstracoes_contabeis "
+            f"{limites_da_particao(ano, trimestre)};\n"
+        )
+    return "".join(comandos)
+
+
+def gerar_comandos_tabelas_de_carga(particoes: set[tuple[str, str]]) -> str:
+    # Tabelas avulsas com o CHECK dos limites, para o ATTACH PARTITION não precisar varrer os dados
+    comandos = []
+    for ano, trimestre in sorted(particoes):
+        tabela_de_carga = f"{nome_da_particao(ano, trimestre)}_carga"
+        comandos.append(
+            f"DROP TABLE IF EXISTS {tabela_de_carga};\n"
+            f"CREATE TABLE {tabela_de_carga} (LIKE demonstracoes_contabeis INCLUDING DEFAULTS, "
+            f"CHECK (ano = {int(ano)} AND trimestre = {int(trimestre)}));\n"
+        )
+    return "".join(comandos)
+
+
+def gerar_comandos_troca_de_particoes(particoes: set[tuple[str, str]]) -> str:
+    comandos = []
+    for ano, trimestre in sorted(particoes):
+        particao = nome_da_particao(ano, trimestre)
+        comandos.append(
+            f"DROP TABLE IF EXISTS {particao};\n"
+            f"ALTER TABLE demonstracoes_contabeis ATTACH PARTITION {particao}_carga "
+            f"{limites_da_particao(ano, trimestre)};\n"
+            f"ALTER TABLE {particao}_carga RENAME TO {particao};\n"
+        )
+    return "".join(comandos)
+
+
 # Função para verificar e tratar as demonstrações contábeis com operadoras inativas
 def verifica_e_trata_demonstracoes_com_operadoras_inativas(
-    df_demonstracoes: pl.DataFrame, df_operadoras: pl.DataFrame
-) -> pl.DataFrame:
-    if "registro_operadora" not in df_demonstracoes.columns:
+    df_demonstracoes: pl.LazyFrame, df_operadoras: pl.DataFrame
+) -> pl.LazyFrame:
+    schema_demonstracoes = df_demonstracoes.collect_schema()
+    if "registro_operadora" not in schema_demonstracoes.names():
         print("Coluna 'registro_operadora' não encontrada nas demonstrações contábeis.")
         return df_demonstracoes
 
-    demonstracoes_sem_operadoras = df_demonstracoes.filter(
-        ~pl.col("registro_operadora").is_in(df_operadoras["registro_operadora"])
+    # O semi join mantém apenas as demonstrações de operadoras ativas sem materializar o resultado
+    registros_ativos = df_operadoras.lazy().select(
+        pl.col("registro_operadora").cast(schema_demonstracoes["registro_operadora"])
     )
-    if demonstracoes_sem_operadoras.is_empty():
-        return df_demonstracoes
-    return df_demonstracoes.filter(
-        ~pl.col("registro_operadora").is_in(
-            demonstracoes_sem_operadoras["registro_operadora"]
-        )
+    return df_demonstracoes.join(
+        registros_ativos, on="registro_operadora", how="semi", maintain_order="left"
     )
 
 
@@ -222,22 +434,53 @@ def gerar_comandos_upload(caminho_dados: str, tabela: str) -> str:
 
 
 # Funções de geração de comandos SQL para inserção
-def gerar_comandos_query_simples(linhas: list[dict], tabela: str) -> str:
-    comandos = [
+def gerar_cabecalho_insert(tabela: str) -> str:
+    return (
         f"INSERT INTO {tabela} (registro_operadora, cnpj, razao_social, nome_fantasia, modalidade, logradouro, numero, complemento, bairro, cidade, uf, cep, ddd, telefone, fax, endereco_eletronico, representante, cargo_representante, regiao_de_comercializacao, data_registro_ans) VALUES\n"
         if tabela == "operadoras_ativas"
         else f"INSERT INTO {tabela} (registro_operadora,cd_conta_contabil,descricao,vl_saldo_inicial,vl_saldo_final,data_demonstracao,trimestre,ano) VALUES\n"
-    ]
-    for linha in linhas:
-        valores = ", ".join(
-            [
-                f"'{str(v).replace("'", "''")}'" if v is not None else "NULL"
-                for v in linha.values()
-            ]
+    )
+
+
+def converter_coluna_para_texto(serie: pl.Series) -> pl.Series:
+    # Reproduz o str() do Python para cada valor, sem percorrer as linhas em Python
+    if serie.dtype == pl.String:
+        return serie
+    if serie.dtype.is_integer():
+        return serie.cast(pl.String)
+    if serie.dtype.is_float():
+        # Float32 vira float do Python (64 bits) no caminho por linha; o cast reproduz o mesmo valor antes de formatar
+        serie = serie.cast(pl.Float64)
+        texto = serie.cast(pl.String)
+        # O Polars formata NaN e números muito pequenos ou muito grandes de forma diferente do Python
+        divergentes = serie.is_nan() | (
+            (serie != 0) & ((serie.abs() < 1e-4) | (serie.abs() >= 1e16))
         )
-        comandos.append(f"({valores}),\n")
-    comandos[-1] = comandos[-1].rstrip(",\n") + ";\n"
-    return "".join(comandos)
+        if divergentes.any():
+            indices = divergentes.arg_true()
+            texto = texto.scatter(indices, [str(v) for v in serie.gather(indices)])
+        return texto
+    return serie.map_elements(str, return_dtype=pl.String)
+
+
+def renderizar_tuplas_values(df: pl.DataFrame) -> pl.Series:
+    literais = [
+        pl.when(texto.is_null())
+        .then(pl.lit("NULL"))
+        .otherwise(pl.lit("'") + texto.str.replace_all("'", "''", literal=True) + pl.lit("'"))
+        for texto in (pl.lit(converter_coluna_para_texto(df[coluna])) for coluna in df.columns)
+    ]
+    return df.select(
+        pl.concat_str([pl.lit("("), pl.concat_str(literais, separator=", "), pl.lit(")")])
+        .alias("tupla")
+    ).to_series()
+
+
+def gerar_comandos_query_simples(df: pl.DataFrame, tabela: str) -> str:
+    cabecalho = gerar_cabecalho_insert(tabela)
+    if df.is_empty():
+        return cabecalho.rstrip(",\n") + ";\n"
+    return cabecalho + renderizar_tuplas_values(df).str.join(",\n").item() + ";\n"
 
 
 def processar_chunk_query_simples(
@@ -246,10 +489,10 @@ def processar_chunk_query_simples(
     idx: int,
     tabela: str,
     ordem_de_insercao: int = 1,
-):
+) -> dict:
+    start_time = time.time()
     print(f"Processando chunk {idx}...")
-    linhas = df.to_dicts()
-    comandos_sql = gerar_comandos_query_simples(linhas, tabela)
+    comandos_sql = gerar_comandos_query_simples(df, tabela)
 
     caminho_arquivo_sql = os.path.join(
         caminho_base, f"{ordem_de_insercao:02d}-{idx:04d}-{tabela}.sql"
@@ -261,6 +504,46 @@ def processar_chunk_query_simples(
     except Exception as e:
         print(f"Erro ao salvar o arquivo SQL para o chunk {idx}: {e}")
 
+    return {"idx": idx, "linhas": df.height, "tempo": time.time() - start_time}
+
+
+def serializar_chunk_ipc(df: pl.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.write_ipc(buffer)
+    return buffer.getvalue()
+
+
+def processar_chunk_query_simples_ipc(
+    chunk_ipc: bytes,
+    caminho_base: str,
+    idx: int,
+    tabela: str,
+    ordem_de_insercao: int = 1,
+) -> dict:
+    # Executado em outro processo: o chunk chega em Arrow IPC, sem passar por dicts serializados com pickle
+    df = pl.read_ipc(io.BytesIO(chunk_ipc))
+    return processar_chunk_query_simples(
+        df, caminho_base, idx, tabela, ordem_de_insercao
+    )
+
+
+def processar_chunk_csv_copy(
+    df: pl.DataFrame,
+    caminho_base: str,
+    idx: int,
+    tabela: str,
+    ordem_de_insercao: int = 1,
+) -> dict:
+    start_time = time.time()
+    print(f"Processando chunk {idx}...")
+    caminho_arquivo_csv = os.path.join(
+        caminho_base, f"{ordem_de_insercao:02d}-{idx:04d}-{tabela}.csv"
+    )
+    if salva_csv(df, caminho_arquivo_csv):
+        print(f"Chunk {idx} processado com sucesso.")
+
+    return {"idx": idx, "linhas": df.height, "tempo": time.time() - start_time}
+
 
 def processar_chunk_bulk_load(
     df: pl.DataFrame,
@@ -303,14 +586,44 @@ def processar_chunk_paralelo(
         print(f"Erro no chunk {idx}: {e}")
 
 
+def submeter_chunks_com_limite(
+    executor: concurrent.futures.Executor,
+    chunks,
+    max_em_andamento: int,
+    funcao,
+) -> list:
+    # Limita os chunks em andamento para que um LazyFrame não seja materializado inteiro na fila do executor
+    futures = set()
+    resultados = []
+
+    def coletar(concluidos):
+        for future in concluidos:
+            if future.exception():
+                print(f"Erro ao processar chunk: {future.exception()}")
+            else:
+                resultados.append(future.result())
+
+    for idx, chunk in enumerate(chunks):
+        if len(futures) >= max_em_andamento:
+            concluidos, futures = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            coletar(concluidos)
+        futures.add(executor.submit(funcao, chunk, idx=idx))
+    concluidos, _ = concurrent.futures.wait(futures)
+    coletar(concluidos)
+    return resultados
+
+
 def gerar_arquivos_bulk_load(
-    df: pl.DataFrame,
+    df: pl.DataFrame | pl.LazyFrame,
     caminho_saida: str,
     tabela: str,
     tamanho_chunk: int,
     num_threads: int,
     colunas_que_podem_ser_nulas: list[str] = None,
     nome_arquivo: str = None,
+    comandos_pre_carga: str = None,
 ):
     start_time = time.time()
     os.makedirs(caminho_saida, exist_ok=True)
@@ -319,7 +632,7 @@ def gerar_arquivos_bulk_load(
     if colunas_que_podem_ser_nulas:
         force_null_clause = f",FORCE_NULL ({', '.join(colunas_que_podem_ser_nulas)})"
 
-    colunas_csv = df.columns
+    colunas_csv = nomes_das_colunas(df)
     colunas_clause = f"({', '.join(colunas_csv)})" if colunas_csv else ""
 
     comandos = [
@@ -342,23 +655,22 @@ def gerar_arquivos_bulk_load(
         END;
         $$ LANGUAGE plpgsql;\n\n"""
     ]
+    if comandos_pre_carga:
+        comandos.append(comandos_pre_carga + "\n")
     print(f"Dividindo o DataFrame em chunks de {tamanho_chunk} linhas...")
-    chunks = [df[i : i + tamanho_chunk] for i in range(0, df.height, tamanho_chunk)]
-    print(f"Total de chunks: {len(chunks)}")
-
     with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [
-            executor.submit(
+        resultados = submeter_chunks_com_limite(
+            executor,
+            iterar_chunks(df, tamanho_chunk),
+            num_threads * 2,
+            functools.partial(
                 processar_chunk_bulk_load,
-                chunk,
-                caminho_saida,
-                idx,
-                tabela,
-                comandos,
-            )
-            for idx, chunk in enumerate(chunks)
-        ]
-        concurrent.futures.wait(futures)
+                caminho_base=caminho_saida,
+                tabela=tabela,
+                comandos=comandos,
+            ),
+        )
+    print(f"Total de chunks: {len(resultados)}")
 
     print(f"Todos os chunks processados em {time.time() - start_time:.2f} segundos.")
 
@@ -368,39 +680,90 @@ def gerar_arquivos_bulk_load(
 
 
 def gerar_arquivos_query_simples(
-    df: pl.DataFrame,
+    df: pl.DataFrame | pl.LazyFrame,
     caminho_saida: str,
     tabela: str,
     tamanho_chunk: int,
     num_threads: int,
     ordem_de_insercao: int = 1,
+    executor_de_chunks: str = "threads",
 ):
     start_time = time.time()
     os.makedirs(caminho_saida, exist_ok=True)
 
     print(f"Dividindo o DataFrame em chunks de {tamanho_chunk} linhas...")
-    chunks = [df[i : i + tamanho_chunk] for i in range(0, df.height, tamanho_chunk)]
-    print(f"Total de chunks: {len(chunks)}")
+    chunks = iterar_chunks(df, tamanho_chunk)
+    if executor_de_chunks == "processos":
+        # A formatação das strings é Python puro e fica presa ao GIL, então usa um processo por núcleo
+        num_workers = os.cpu_count()
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        chunks = (serializar_chunk_ipc(chunk) for chunk in chunks)
+        funcao = processar_chunk_query_simples_ipc
+    elif executor_de_chunks == "threads":
+        num_workers = num_threads
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+        funcao = processar_chunk_query_simples
+    else:
+        raise ValueError(f"Executor desconhecido: {executor_de_chunks}")
+
+    with executor:
+        resultados = submeter_chunks_com_limite(
+            executor,
+            chunks,
+            num_workers * 2,
+            functools.partial(
+                funcao,
+                caminho_base=caminho_saida,
+                tabela=tabela,
+                ordem_de_insercao=ordem_de_insercao,
+            ),
+        )
+    print(f"Total de chunks: {len(resultados)}")
+
+    for resultado in sorted(resultados, key=lambda r: r["idx"]):
+        print(
+            f"Chunk {resultado['idx']}: {resultado['linhas']} linhas em {resultado['tempo']:.2f} segundos."
+        )
+
+    tempo_total = time.time() - start_time
+    total_linhas = sum(resultado["linhas"] for resultado in resultados)
+    print(f"Todos os chunks processados em {tempo_total:.2f} segundos.")
+    print(f"Vazão total: {total_linhas / max(tempo_total, 1e-9):.0f} linhas/s.")
+
+
+def gerar_arquivos_csv_copy(
+    df: pl.DataFrame | pl.LazyFrame,
+    caminho_saida: str,
+    tabela: str,
+    tamanho_chunk: int,
+    num_threads: int,
+    ordem_de_insercao: int = 1,
+):
+    start_time = time.time()
+    os.makedirs(caminho_saida, exist_ok=True)
 
+    print(f"Dividindo o DataFrame em chunks de {tamanho_chunk} linhas...")
     with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [
-            executor.submit(
-                processar_chunk_query_simples,
-                chunk,
-                caminho_saida,
-                idx,
-                tabela,
-                ordem_de_insercao,
-            )
-            for idx, chunk in enumerate(chunks)
-        ]
-        concurrent.futures.wait(futures)
+        resultados = submeter_chunks_com_limite(
+            executor,
+            iterar_chunks(df, tamanho_chunk),
+            num_threads * 2,
+            functools.partial(
+                processar_chunk_csv_copy,
+                caminho_base=caminho_saida,
+                tabela=tabela,
+                ordem_de_insercao=ordem_de_insercao,
+            ),
+        )
+    print(f"Total de chunks: {len(resultados)}")
 
     print(f"Todos os chunks processados em {time.time() - start_time:.2f} segundos.")
 
 
 def gerar_arquivos_de_insercao(
-    df: pl.DataFrame,
+    df: pl.DataFrame | pl.LazyFrame,
     caminho_saida: str,
     tabela: str,
     tamanho_chunk: int = 50_000,
@@ -409,6 +772,8 @@ def gerar_arquivos_de_insercao(
     colunas_que_podem_ser_nulas: list[str] = None,
     nome_arquivo: str = None,
     ordem_de_insercao: int = 1,
+    executor_de_chunks: str = "threads",
+    comandos_pre_carga: str = None,
 ):
     if modo == "bulk_load":
         gerar_arquivos_bulk_load(
@@ -419,15 +784,113 @@ def gerar_arquivos_de_insercao(
             num_threads,
             colunas_que_podem_ser_nulas,
             nome_arquivo,
+            comandos_pre_carga,
         )
     elif modo == "sem_bulk_load":
         gerar_arquivos_query_simples(
+            df,
+            caminho_saida,
+            tabela,
+            tamanho_chunk,
+            num_threads,
+            ordem_de_insercao,
+            executor_de_chunks,
+        )
+    elif modo == "csv_copy":
+        gerar_arquivos_csv_copy(
             df, caminho_saida, tabela, tamanho_chunk, num_threads, ordem_de_insercao
         )
     else:
         raise ValueError(f"Modo desconhecido: {modo}")
 
 
+# Funções de carregamento direto no banco via COPY FROM STDIN
+def gerar_buffer_csv_chunk(df: pl.DataFrame) -> io.BytesIO:
+    buffer = io.BytesIO()
+    df.write_csv(buffer, separator=";", include_header=False)
+    buffer.seek(0)
+    return buffer
+
+
+def carregar_via_copy_direto(
+    df: pl.DataFrame | pl.LazyFrame,
+    conexao,
+    tabela: str,
+    tamanho_chunk: int = 250_000,
+    colunas_que_podem_ser_nulas: list[str] = None,
+    comandos_pre_carga: str = None,
+    comandos_pos_carga: str = None,
+    particionar: bool = False,
+):
+    start_time = time.time()
+
+    force_null_clause = ""
+    if colunas_que_podem_ser_nulas:
+        force_null_clause = f", FORCE_NULL ({', '.join(colunas_que_podem_ser_nulas)})"
+
+    comando_copy = (
+        f"COPY {{tabela}} ({', '.join(nomes_das_colunas(df))}) FROM STDIN "
+        f"WITH (FORMAT CSV, DELIMITER ';', NULL ''{force_null_clause})"
+    )
+
+    print(f"Enviando linhas para {tabela} em chunks de {tamanho_chunk} linhas...")
+    total_linhas = 0
+    cursor = conexao.cursor()
+    try:
+        # Executados na mesma transação do COPY, então a troca das partições é atômica
+        if comandos_pre_carga:
+            cursor.execute(comandos_pre_carga)
+
+        # Cada chunk é serializado em memória e enviado logo em seguida, então só um chunk existe por vez
+        for idx, chunk in enumerate(iterar_chunks(df, tamanho_chunk)):
+            if particionar:
+                # Cada trimestre vai direto para a tabela de carga da sua partição, sem roteamento pela tabela pai
+                for (ano, trimestre), parte in chunk.partition_by(
+                    ["ano", "trimestre"], as_dict=True
+                ).items():
+                    cursor.copy_expert(
+                        comando_copy.format(tabela=f"{nome_da_particao(ano, trimestre)}_carga"),
+                        gerar_buffer_csv_chunk(parte),
+                    )
+            else:
+                cursor.copy_expert(comando_copy.format(tabela=tabela), gerar_buffer_csv_chunk(chunk))
+            total_linhas += chunk.height
+            print(f"Chunk {idx} enviado com sucesso ({chunk.height} linhas).")
+
+        # A tabela pai só é bloqueada aqui, na troca das partições, logo antes do commit
+        if comandos_pos_carga:
+            cursor.execute(comandos_pos_carga)
+        conexao.commit()
+    except Exception as e:
+        conexao.rollback()
+        print(f"Erro ao carregar os dados na tabela {tabela}: {e}")
+        raise
+    finally:
+        cursor.close()
+
+    tempo_total = time.time() - start_time
+    print(
+        f"Tabela {tabela} carregada com {total_linhas} linhas em {tempo_total:.2f} segundos "
+        f"({total_linhas / max(tempo_total, 1e-9):.0f} linhas/s)."
+    )
+
+
+def criar_tabelas_no_banco(caminho_tabelas: str, conexao):
+    with open(caminho_tabelas, "r", encoding="utf-8") as f:
+        sql_tabelas = f.read()
+
+    cursor = conexao.cursor()
+    try:
+        cursor.execute(sql_tabelas)
+        conexao.commit()
+    except Exception as e:
+        conexao.rollback()
+        print(f"Erro ao criar as tabelas a partir de {caminho_tabelas}: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
 def limpar_diretorio_saida(caminho_saida_base: str):
     try:
         if os.path.exists(caminho_saida_base):
@@ -446,6 +909,21 @@ def limpar_diretorio_saida(caminho_saida_base: str):
 
 
 def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) -> dict:
+    if modo_de_geracao == "copy_direto":
+        # Os dados vão direto para o banco, então não há diretórios de saída para preparar
+        return {
+            "modo_de_geracao": modo_de_geracao,
+            "modo_de_utilizacao": modo_de_utilizacao,
+            "caminho_saida_tabelas": None,
+            "caminho_saida_particoes": None,
+            "caminho_saida_pos_carga": None,
+            "caminho_saida_operadoras": None,
+            "caminho_saida_demonstracoes": None,
+            "dado_de_arquivo_operadoras": None,
+            "dado_de_arquivo_demonstracoes": None,
+            "caminho_manifesto_pendente": None,
+        }
+
     if modo_de_utilizacao == "docker":
         caminho_saida_base = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "database/scripts"
@@ -453,6 +931,8 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
         limpar_diretorio_saida(caminho_saida_base)
 
         caminho_saida_tabelas = os.path.join(caminho_saida_base, "01-cria_tabelas.sql")
+        caminho_saida_particoes = os.path.join(caminho_saida_base, "02-particoes.sql")
+        caminho_saida_pos_carga = os.path.join(caminho_saida_base, "04-indices_e_restricoes.sql")
         caminho_saida_operadoras = caminho_saida_base
         caminho_saida_demonstracoes = caminho_saida_base
         if modo_de_geracao == "bulk_load":
@@ -468,6 +948,8 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
         )
         limpar_diretorio_saida(caminho_saida_base)
         caminho_saida_tabelas = os.path.join(caminho_saida_base, "tabelas.sql")
+        caminho_saida_particoes = os.path.join(caminho_saida_base, "particoes.sql")
+        caminho_saida_pos_carga = os.path.join(caminho_saida_base, "indices_e_restricoes.sql")
 
         if modo_de_geracao == "bulk_load":
             caminho_saida_operadoras = os.path.join(
@@ -479,6 +961,16 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
                 caminho_saida_base, "demonstracoes_bulk_load"
             )
             dado_de_arquivo_demonstracoes = "demonstracoes_contabeis.sql"
+        elif modo_de_geracao == "csv_copy":
+            caminho_saida_operadoras = os.path.join(
+                caminho_saida_base, "operadoras_csv_copy"
+            )
+            dado_de_arquivo_operadoras = 2
+
+            caminho_saida_demonstracoes = os.path.join(
+                caminho_saida_base, "demonstracoes_csv_copy"
+            )
+            dado_de_arquivo_demonstracoes = 3
         else:
             caminho_saida_operadoras = os.path.join(
                 caminho_saida_base, "operadoras_sem_bulk_load"
@@ -494,11 +986,64 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
         "modo_de_geracao": modo_de_geracao,
         "modo_de_utilizacao": modo_de_utilizacao,
         "caminho_saida_tabelas": caminho_saida_tabelas,
+        "caminho_saida_particoes": caminho_saida_particoes,
+        "caminho_saida_pos_carga": caminho_saida_pos_carga,
         "caminho_saida_operadoras": caminho_saida_operadoras,
         "caminho_saida_demonstracoes": caminho_saida_demonstracoes,
         "dado_de_arquivo_operadoras": dado_de_arquivo_operadoras,
         "dado_de_arquivo_demonstracoes": dado_de_arquivo_demonstracoes,
+        "caminho_manifesto_pendente": os.path.join(caminho_saida_base, NOME_MANIFESTO_PENDENTE),
+    }
+
+
+def aplicar_remocao_de_particoes(
+    args, configuracoes: dict, comandos_particoes: str, manifesto: dict, caminho_manifesto: str
+):
+    # Carga incremental em que só sumiram arquivos: nada a tratar, só partições a apagar e o resumo a recalcular
+    diretorio_base = os.path.dirname(os.path.abspath(__file__))
+    if args.modo_de_geracao != "copy_direto":
+        copiar_arquivo("tabelas.sql", configuracoes["caminho_saida_tabelas"])
+        copiar_arquivo("indices_e_restricoes.sql", configuracoes["caminho_saida_pos_carga"])
+        with open(configuracoes["caminho_saida_particoes"], "w", encoding="utf-8") as f:
+            f.write(comandos_particoes)
+        salvar_manifesto(manifesto, configuracoes["caminho_manifesto_pendente"])
+        print("Script de remoção das partições gerado.")
+        return
+
+    conexao_params = {
+        "host": args.host,
+        "database": args.database,
+        "user": args.user,
+        "password": args.password,
+        "port": args.port,
     }
+    conexao = psycopg2.connect(**conexao_params)
+    cursor = conexao.cursor()
+    try:
+        cursor.execute(comandos_particoes)
+        conexao.commit()
+    except Exception as e:
+        conexao.rollback()
+        print(f"Erro ao apagar as partições: {e}")
+        return
+    finally:
+        cursor.close()
+        conexao.close()
+
+    pool = ThreadedConnectionPool(1, 4, **conexao_params)
+    try:
+        falhas = executar_pos_carga_paralelo(
+            os.path.join(diretorio_base, "indices_e_restricoes.sql"), pool, max_workers=4
+        )
+    finally:
+        pool.closeall()
+    if falhas:
+        return
+
+    if args.url_invalidacao_cache:
+        invalidar_cache_da_api(args.url_invalidacao_cache, args.token_invalidacao_cache)
+    salvar_manifesto(manifesto, caminho_manifesto)
+    print("Partições removidas com sucesso!")
 
 
 def __main__():
@@ -509,7 +1054,7 @@ def __main__():
         "--modo_de_geracao",
         type=str,
         default="sem_bulk_load",
-        help="Modo de geração: 'bulk_load' ou 'sem_bulk_load'.",
+        help="Modo de geração: 'bulk_load', 'sem_bulk_load', 'csv_copy' ou 'copy_direto'.",
     )
 
     parser.add_argument(
@@ -520,10 +1065,78 @@ def __main__():
         help="Tipos de utilização: 'vizualiacao' ou 'docker'\n Define se os diretórios para salvar o arquivo serão usados de forma para vizualização ou para geração de SQL para carregamento no Docker.\n",
     )
 
+    # Parâmetros de conexão usados apenas no modo copy_direto
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="localhost",
+        help="Host do banco de dados (padrão: localhost).",
+    )
+    parser.add_argument(
+        "--database",
+        type=str,
+        default="testetec-ic",
+        help="Nome do banco de dados (padrão: testetec-ic).",
+    )
+    parser.add_argument(
+        "--user",
+        type=str,
+        default="admin",
+        help="Usuário do banco de dados (padrão: admin).",
+    )
+    parser.add_argument(
+        "--password",
+        type=str,
+        default="senhasegura",
+        help="Senha do banco de dados (padrão: senhasegura).",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=5432,
+        help="Porta do banco de dados (padrão: 5432).",
+    )
+
+    parser.add_argument(
+        "-ex",
+        "--executor",
+        type=str,
+        default="threads",
+        help="Executor usado para gerar os chunks no modo sem_bulk_load: 'threads' (padrão) ou 'processos'.",
+    )
+
+    parser.add_argument(
+        "-inc",
+        "--incremental",
+        action="store_true",
+        help="Gera e carrega apenas as partições (ano, trimestre) cujos arquivos mudaram desde a última execução.",
+    )
+
+    # Usados apenas no modo copy_direto, que carrega os dados no banco
+    parser.add_argument(
+        "--url_invalidacao_cache",
+        type=str,
+        default=None,
+        help="URL do endpoint de invalidação de cache da API, chamada após uma carga bem-sucedida.",
+    )
+    parser.add_argument(
+        "--token_invalidacao_cache",
+        type=str,
+        default=None,
+        help="Token enviado no cabeçalho X-Token-Invalidacao (o CACHE_TOKEN_INVALIDACAO da API).",
+    )
+
     args = parser.parse_args()
 
     modo_de_geracao = args.modo_de_geracao
     modo_de_utilizacao = args.modo_de_utilizacao
+    if modo_de_geracao == "csv_copy" and modo_de_utilizacao == "docker":
+        # O docker-entrypoint-initdb.d só executa arquivos .sql e .sh; os .csv seriam ignorados e as tabelas
+        # ficariam vazias sem nenhum erro. Recusado antes de limpar database/scripts
+        parser.error(
+            "O modo csv_copy não se aplica ao modo docker. Use o modo vizualizacao e carregue os CSVs "
+            "com o inserir_scripts_sql_no_banco.py."
+        )
 
     configuracoes = trata_argumentos_do_script(modo_de_geracao, modo_de_utilizacao)
 
@@ -546,8 +1159,57 @@ def __main__():
         print("Nenhuma operadora ativa encontrada.")
         return
 
+    # Manifesto com hash e quantidade de linhas de cada arquivo de entrada. Só vira o manifesto da última
+    # carga (manifesto_de_carga.json) depois que os dados foram carregados: no copy_direto, ao fim da carga;
+    # nos outros modos, pelo inserir_scripts_sql_no_banco.py, a partir do manifesto pendente
+    caminho_manifesto = os.path.join(diretorio_base, NOME_MANIFESTO)
+    manifesto_atual = gerar_manifesto(caminho_operadoras, caminho_demonstracoes)
+    plano = None
+    if args.incremental:
+        if modo_de_utilizacao == "docker":
+            # Os scripts do Docker só rodam na criação do volume, com o banco vazio
+            print("A carga incremental não se aplica ao modo docker. Use o modo vizualizacao ou copy_direto.")
+            return
+        plano = planejar_carga_incremental(carregar_manifesto(caminho_manifesto), manifesto_atual)
+        if plano["recarregar_operadoras"]:
+            print("Cadastro de operadoras novo ou alterado, recarregando as operadoras e todas as partições.")
+        elif not plano["particoes"] and not plano["particoes_removidas"]:
+            print("Nenhuma partição alterada desde a última carga.")
+            return
+        elif plano["particoes"]:
+            print(
+                "Partições alteradas: "
+                + ", ".join(f"{trimestre}T{ano}" for ano, trimestre in sorted(plano["particoes"]))
+            )
+        if plano["particoes_removidas"]:
+            print(
+                "Partições sem arquivo, que serão apagadas: "
+                + ", ".join(f"{trimestre}T{ano}" for ano, trimestre in sorted(plano["particoes_removidas"]))
+            )
+
+    # Partições (ano, trimestre) carregadas nesta execução; na incremental, elas são apagadas e recriadas
+    particoes_carregadas = plano["particoes"] if plano else {
+        (arquivo["ano"], arquivo["trimestre"])
+        for arquivo in manifesto_atual["demonstracoes"].values()
+    }
+    particoes_removidas = plano["particoes_removidas"] if plano else set()
+    carregar_operadoras = plano is None or plano["recarregar_operadoras"]
+    comandos_recarga_operadoras = (
+        COMANDO_RECARGA_OPERADORAS if plano and plano["recarregar_operadoras"] else ""
+    )
+    comandos_particoes = gerar_comandos_remocao_de_particoes(particoes_removidas) + gerar_comandos_particoes(
+        particoes_carregadas, recriar=plano is not None
+    )
+
+    if not particoes_carregadas:
+        # Só há partições a apagar
+        aplicar_remocao_de_particoes(args, configuracoes, comandos_particoes, manifesto_atual, caminho_manifesto)
+        return
+
     print("Carregando dados das demonstrações contábeis...")
-    dfs_demonstracoes = carregar_dados_demonstracoes_contabeis(caminho_demonstracoes)
+    dfs_demonstracoes = carregar_dados_demonstracoes_contabeis(
+        caminho_demonstracoes, particoes_carregadas if plano else None
+    )
 
     if not dfs_demonstracoes:
         print("Nenhuma demonstração contábil encontrada.")
@@ -561,8 +1223,9 @@ def __main__():
         print("Nenhuma operadora ativa encontrada após o tratamento.")
         return
 
+    # Plano lazy: nada é lido por completo até o CSV tratado ser gravado em modo streaming
     df_demonstracoes_final = trata_os_dados_demonstracoes_contabeis(dfs_demonstracoes)
-    if df_demonstracoes_final.is_empty():
+    if df_demonstracoes_final.head(1).collect().is_empty():
         print("Nenhuma demonstração contábil encontrada após o tratamento.")
         return
 
@@ -581,20 +1244,94 @@ def __main__():
         ),
     )
 
-    salva_csv(
-        df_demonstracoes_final,
-        os.path.join(
-            diretorio_base,
-            "demonstracoes_contabeis_tratado.csv",
-        ),
+    caminho_demonstracoes_tratado = os.path.join(
+        diretorio_base,
+        "demonstracoes_contabeis_tratado.csv",
     )
+    if not salva_csv(df_demonstracoes_final, caminho_demonstracoes_tratado):
+        return
+
+    # As etapas seguintes leem o CSV tratado em chunks em vez de reexecutar o plano inteiro
+    df_demonstracoes_final = escaneia_csv(caminho_demonstracoes_tratado)
+
+    print("Dados tratados com sucesso.")
+
+    if modo_de_geracao == "copy_direto":
+        print("Modo de geração: copy_direto\n\n")
+        conexao_params = {
+            "host": args.host,
+            "database": args.database,
+            "user": args.user,
+            "password": args.password,
+            "port": args.port,
+        }
+        conexao = psycopg2.connect(**conexao_params)
+        try:
+            criar_tabelas_no_banco(
+                os.path.join(diretorio_base, "tabelas.sql"), conexao
+            )
+
+            if carregar_operadoras:
+                print("Enviando operadoras para o banco...\n\n")
+                carregar_via_copy_direto(
+                    df_operadoras_final,
+                    conexao,
+                    "operadoras_ativas",
+                    tamanho_chunk=250_000,
+                    colunas_que_podem_ser_nulas=["regiao_de_comercializacao"],
+                    comandos_pre_carga=comandos_recarga_operadoras,
+                )
+
+            print("Enviando demonstrações contábeis para o banco...\n\n")
+            carregar_via_copy_direto(
+                df_demonstracoes_final,
+                conexao,
+                "demonstracoes_contabeis",
+                tamanho_chunk=250_000,
+                comandos_pre_carga=gerar_comandos_tabelas_de_carga(particoes_carregadas),
+                comandos_pos_carga=gerar_comandos_troca_de_particoes(particoes_carregadas)
+                + gerar_comandos_remocao_de_particoes(particoes_removidas),
+                particionar=True,
+            )
+        except Exception as e:
+            print(f"Erro ao carregar os dados via COPY: {e}")
+            return
+        finally:
+            conexao.close()
+
+        # Com as tabelas já carregadas, índices e chave estrangeira são construídos em paralelo
+        pool = ThreadedConnectionPool(1, 4, **conexao_params)
+        try:
+            falhas = executar_pos_carga_paralelo(
+                os.path.join(diretorio_base, "indices_e_restricoes.sql"), pool, max_workers=4
+            )
+        finally:
+            pool.closeall()
+        if falhas:
+            return
+
+        if args.url_invalidacao_cache:
+            invalidar_cache_da_api(args.url_invalidacao_cache, args.token_invalidacao_cache)
+
+        salvar_manifesto(manifesto_atual, caminho_manifesto)
+        print("Processo concluído com sucesso!")
+        print(f"Tempo total: {time.time() - start_time:.2f} segundos.")
+        return
 
     copiar_arquivo(
         "tabelas.sql",
         configuracoes["caminho_saida_tabelas"],
     )
+    # Executado depois dos scripts de inserção (no Docker, pela ordem do prefixo 04-)
+    copiar_arquivo(
+        "indices_e_restricoes.sql",
+        configuracoes["caminho_saida_pos_carga"],
+    )
+
+    # Executado pelo script de inserção antes das operadoras e das demonstrações, que rodam em paralelo
+    with open(configuracoes["caminho_saida_particoes"], "w", encoding="utf-8") as f:
+        f.write(comandos_recarga_operadoras + comandos_particoes)
 
-    print("Dados tratados com sucesso.")
     print("Gerando arquivos de inserção...\n\n")
     # Escolha do modo de geração
     if modo_de_geracao == "bulk_load":
@@ -613,18 +1350,18 @@ def __main__():
             return
 
         print("Modo de geração: bulk_load\n\n")
-        print("Gerando arquivos de upload para operadoras...\n\n")
-
-        gerar_arquivos_de_insercao(
-            df_operadoras_final,
-            configuracoes["caminho_saida_operadoras"],
-            "operadoras_ativas",
-            tamanho_chunk=250_000,
-            num_threads=os.cpu_count() * 2,
-            modo="bulk_load",
-            colunas_que_podem_ser_nulas=["regiao_de_comercializacao"],
-            nome_arquivo=configuracoes["dado_de_arquivo_operadoras"],
-        )
+        if carregar_operadoras:
+            print("Gerando arquivos de upload para operadoras...\n\n")
+            gerar_arquivos_de_insercao(
+                df_operadoras_final,
+                configuracoes["caminho_saida_operadoras"],
+                "operadoras_ativas",
+                tamanho_chunk=250_000,
+                num_threads=os.cpu_count() * 2,
+                modo="bulk_load",
+                colunas_que_podem_ser_nulas=["regiao_de_comercializacao"],
+                nome_arquivo=configuracoes["dado_de_arquivo_operadoras"],
+            )
 
         print("Gerando arquivos de upload para demonstrações contábeis...\n\n")
         gerar_arquivos_de_insercao(
@@ -635,19 +1372,22 @@ def __main__():
             num_threads=os.cpu_count() * 2,
             modo="bulk_load",
             nome_arquivo=configuracoes["dado_de_arquivo_demonstracoes"],
+            comandos_pre_carga=comandos_particoes,
         )
     else:
-        print("Modo de geração: sem_bulk_load\n\n")
-        print("Gerando arquivos de inserção para operadoras...\n\n")
-        gerar_arquivos_de_insercao(
-            df_operadoras_final,
-            configuracoes["caminho_saida_operadoras"],
-            "operadoras_ativas",
-            tamanho_chunk=50_000,
-            num_threads=os.cpu_count() * 2,
-            modo="sem_bulk_load",
-            ordem_de_insercao=configuracoes["dado_de_arquivo_operadoras"],
-        )
+        print(f"Modo de geração: {modo_de_geracao}\n\n")
+        if carregar_operadoras:
+            print("Gerando arquivos de inserção para operadoras...\n\n")
+            gerar_arquivos_de_insercao(
+                df_operadoras_final,
+                configuracoes["caminho_saida_operadoras"],
+                "operadoras_ativas",
+                tamanho_chunk=50_000,
+                num_threads=os.cpu_count() * 2,
+                modo=modo_de_geracao,
+                ordem_de_insercao=configuracoes["dado_de_arquivo_operadoras"],
+                executor_de_chunks=args.executor,
+            )
 
         print("Gerando arquivos de inserção para demonstrações contábeis...\n\n")
         gerar_arquivos_de_insercao(
@@ -656,10 +1396,13 @@ def __main__():
             "demonstracoes_contabeis",
             tamanho_chunk=50_000,
             num_threads=os.cpu_count() * 2,
-            modo="sem_bulk_load",
+            modo=modo_de_geracao,
             ordem_de_insercao=configuracoes["dado_de_arquivo_demonstracoes"],
+            executor_de_chunks=args.executor,
         )
 
+    # Confirmado pelo script de inserção só depois de uma carga sem falhas
+    salvar_manifesto(manifesto_atual, configuracoes["caminho_manifesto_pendente"])
     print("Processo concluído com sucesso!")
     print(f"Tempo total: {time.time() - start_time:.2f} segundos.")
 
@@ -0,0 +1,26 @@
+-- Executado depois da carga dos dados, para que os INSERTs/COPYs não paguem a manutenção de índices e a checagem de chave estrangeira linha a linha.
+-- Cada etapa começa com um comentário "-- Etapa"; os comandos de uma mesma etapa são independentes e o script de inserção os executa em paralelo.
+-- Mantenha um comando por linha.
+
+-- Etapa 1: criação dos índices
+CREATE UNIQUE INDEX IF NOT EXISTS idx_operadoras_cnpj ON public.operadoras_ativas (cnpj);
+CREATE INDEX IF NOT EXISTS idx_operadoras_uf ON public.operadoras_ativas (uf);
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_social_trgm ON public.operadoras_ativas USING gin (unaccent_imutavel(razao_social) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_nome_fantasia_trgm ON public.operadoras_ativas USING gin (unaccent_imutavel(nome_fantasia) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_cidade_trgm ON public.operadoras_ativas USING gin (unaccent_imutavel(cidade) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_demonstracoes_descricao_trgm ON public.demonstracoes_contabeis USING gin (unaccent_imutavel(descricao) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_demonstracoes_periodo ON public.demonstracoes_contabeis (ano, trimestre, id);
+CREATE INDEX IF NOT EXISTS idx_demonstracoes_operadora_id ON public.demonstracoes_contabeis (registro_operadora, id);
+
+-- Etapa 2: chave estrangeira, verificada uma única vez sobre todas as partições
+-- (o PostgreSQL 17 não aceita NOT VALID em chave estrangeira de tabela particionada)
+DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_operadora' AND conrelid = 'demonstracoes_contabeis'::regclass) THEN ALTER TABLE demonstracoes_contabeis ADD CONSTRAINT fk_operadora FOREIGN KEY (registro_operadora) REFERENCES operadoras_ativas (registro_operadora) ON DELETE CASCADE ON UPDATE CASCADE; END IF; END $$;
+
+-- Etapa 3: resumo das maiores despesas recalculado e estatísticas atualizadas para o planejador
+-- (na primeira carga a view ainda está vazia e não aceita o REFRESH CONCURRENTLY)
+DO $$ BEGIN IF (SELECT ispopulated FROM pg_matviews WHERE matviewname = 'resumo_despesas_operadoras') THEN REFRESH MATERIALIZED VIEW CONCURRENTLY resumo_despesas_operadoras; ELSE REFRESH MATERIALIZED VIEW resumo_despesas_operadoras; END IF; END $$;
+ANALYZE operadoras_ativas;
+ANALYZE demonstracoes_contabeis;
+
+-- Etapa 4: estatísticas do resumo recalculado
+ANALYZE resumo_despesas_operadoras;
@@ -1,65 +1,248 @@
 import os
+import time
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import psycopg2  # Biblioteca para conexão com PostgreSQL
+from psycopg2.pool import ThreadedConnectionPool
 
 
-def executar_script_sql(caminho_arquivo, conexao):
+# Manifesto da última carga concluída, usado pela carga incremental do gerador_de_sql.py
+NOME_MANIFESTO = "manifesto_de_carga.json"
+# Manifesto dos scripts gerados e ainda não carregados, gravado junto deles no diretório de saída
+NOME_MANIFESTO_PENDENTE = "manifesto_de_carga_pendente.json"
+
+
+def executar_script_sql(caminho_arquivo, conexao) -> bool:
+    cursor = conexao.cursor()
     try:
-        cursor = conexao.cursor()
         with open(caminho_arquivo, "r", encoding="utf-8") as f:
             sql_script = f.read()
             print(f"Executando script: {os.path.basename(caminho_arquivo)}")
             cursor.execute(sql_script)
         conexao.commit()
         print(f"Script {os.path.basename(caminho_arquivo)} executado com sucesso.")
+        return True
     except Exception as e:
         print(f"Erro ao executar o script {os.path.basename(caminho_arquivo)}: {e}")
         conexao.rollback()
+        return False
     finally:
         cursor.close()
 
 
-def executar_scripts_sql_paralelo(diretorio_sql, conexao_params, max_workers=4):
+def executar_scripts_sql_paralelo(diretorio_sql, pool, max_workers=4) -> list:
     if not os.path.exists(diretorio_sql):
         print(f"Diretório {diretorio_sql} não encontrado. Pulando...")
-        return
+        return []
 
     arquivos_sql = [
         os.path.join(diretorio_sql, arquivo)
         for arquivo in os.listdir(diretorio_sql)
-        if arquivo.endswith(".sql") and not arquivo.startswith("queriesRelatorio")
+        if arquivo.endswith(".sql")
+        and not arquivo.startswith("queriesRelatorio")
+        and not arquivo.endswith("particoes.sql")
+        and "indices_e_restricoes" not in arquivo
     ]
 
     if not arquivos_sql:
         print(f"Nenhum arquivo SQL encontrado no diretório {diretorio_sql}.")
-        return
-
-    falhas = []
+        return []
 
     def worker(caminho_arquivo):
-        conexao = psycopg2.connect(**conexao_params)
+        conexao = pool.getconn()
         try:
-            executar_script_sql(caminho_arquivo, conexao)
-        except Exception as e:
-            falhas.append(caminho_arquivo)
-            print(f"Erro ao executar o script {caminho_arquivo}: {e}")
+            return executar_script_sql(caminho_arquivo, conexao)
         finally:
-            conexao.close()
+            pool.putconn(conexao)
 
+    # As falhas são coletadas pelos futures, sem lista compartilhada entre as threads
+    falhas = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(worker, arquivos_sql)
+        futures = {executor.submit(worker, arquivo): arquivo for arquivo in arquivos_sql}
+        for future in as_completed(futures):
+            if future.exception() or not future.result():
+                falhas.append(futures[future])
 
     if falhas:
         print("Os seguintes scripts falharam:")
         for falha in falhas:
             print(f"- {falha}")
+    return falhas
+
+
+def carregar_csv_via_copy(caminho_arquivo, tabela, pool) -> dict:
+    nome_arquivo = os.path.basename(caminho_arquivo)
+    resultado = {
+        "arquivo": nome_arquivo,
+        "linhas": 0,
+        "bytes": os.path.getsize(caminho_arquivo),
+        "tempo": 0.0,
+        "erro": None,
+    }
+
+    start_time = time.time()
+    conexao = pool.getconn()
+    try:
+        with open(caminho_arquivo, "r", encoding="utf-8") as f:
+            colunas = f.readline().strip().split(";")
+            f.seek(0)
+            with conexao.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN "
+                    "WITH (FORMAT CSV, DELIMITER ';', HEADER, NULL '')",
+                    f,
+                )
+                resultado["linhas"] = cursor.rowcount
+        conexao.commit()
+    except Exception as e:
+        conexao.rollback()
+        resultado["erro"] = str(e)
+    finally:
+        pool.putconn(conexao)
+
+    resultado["tempo"] = time.time() - start_time
+    return resultado
+
+
+def carregar_csvs_via_copy_paralelo(diretorio_csv, tabela, pool, max_workers=4) -> list:
+    if not os.path.exists(diretorio_csv):
+        print(f"Diretório {diretorio_csv} não encontrado. Pulando...")
+        return []
+
+    arquivos_csv = sorted(
+        os.path.join(diretorio_csv, arquivo)
+        for arquivo in os.listdir(diretorio_csv)
+        if arquivo.endswith(f"-{tabela}.csv")
+    )
+
+    if not arquivos_csv:
+        print(f"Nenhum arquivo CSV de {tabela} encontrado no diretório {diretorio_csv}.")
+        return []
+
+    start_time = time.time()
+    resultados = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(carregar_csv_via_copy, arquivo, tabela, pool)
+            for arquivo in arquivos_csv
+        ]
+        for future in as_completed(futures):
+            resultado = future.result()
+            resultados.append(resultado)
+            if resultado["erro"]:
+                print(f"Erro ao carregar {resultado['arquivo']}: {resultado['erro']}")
+            else:
+                print(
+                    f"Arquivo {resultado['arquivo']} carregado: {resultado['linhas']} linhas, "
+                    f"{resultado['bytes']} bytes em {resultado['tempo']:.2f} segundos."
+                )
+
+    tempo_total = time.time() - start_time
+    falhas = [resultado for resultado in resultados if resultado["erro"]]
+    total_linhas = sum(resultado["linhas"] for resultado in resultados)
+    total_bytes = sum(resultado["bytes"] for resultado in resultados)
+    print(
+        f"Tabela {tabela}: {len(resultados) - len(falhas)}/{len(resultados)} arquivos carregados, "
+        f"{total_linhas} linhas e {total_bytes} bytes em {tempo_total:.2f} segundos "
+        f"({total_linhas / max(tempo_total, 1e-9):.0f} linhas/s)."
+    )
+
+    if falhas:
+        print("Os seguintes arquivos falharam:")
+        for falha in falhas:
+            print(f"- {falha['arquivo']}: {falha['erro']}")
+    return [falha["arquivo"] for falha in falhas]
+
+
+def ler_etapas_pos_carga(caminho_arquivo) -> list:
+    # Cada etapa começa com "-- Etapa" e tem um comando por linha
+    etapas = []
+    with open(caminho_arquivo, "r", encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if linha.startswith("-- Etapa"):
+                etapas.append([])
+            elif linha and not linha.startswith("--") and etapas:
+                etapas[-1].append(linha)
+    return [etapa for etapa in etapas if etapa]
+
+
+def executar_comando_sql(comando, pool) -> dict:
+    resultado = {"comando": comando, "tempo": 0.0, "erro": None}
+
+    start_time = time.time()
+    conexao = pool.getconn()
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute(comando)
+        conexao.commit()
+    except Exception as e:
+        conexao.rollback()
+        resultado["erro"] = str(e)
+    finally:
+        pool.putconn(conexao)
+
+    resultado["tempo"] = time.time() - start_time
+    return resultado
+
+
+def executar_pos_carga_paralelo(caminho_arquivo, pool, max_workers=4) -> list:
+    if not os.path.exists(caminho_arquivo):
+        print(f"Arquivo {caminho_arquivo} não encontrado. Pulando...")
+        return []
+
+    print(f"Criando índices e restrições a partir de {os.path.basename(caminho_arquivo)}...")
+    start_time = time.time()
+    for numero, etapa in enumerate(ler_etapas_pos_carga(caminho_arquivo), start=1):
+        # Os comandos de uma etapa são independentes; a próxima etapa só começa quando todos terminam
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(lambda comando: executar_comando_sql(comando, pool), etapa))
+
+        for resultado in resultados:
+            if resultado["erro"]:
+                print(f"Erro ao executar '{resultado['comando'][:80]}': {resultado['erro']}")
+            else:
+                print(f"Etapa {numero}: '{resultado['comando'][:80]}' executado em {resultado['tempo']:.2f} segundos.")
+
+        falhas = [resultado["comando"] for resultado in resultados if resultado["erro"]]
+        if falhas:
+            # As etapas seguintes dependem desta (ex.: a validação da chave estrangeira)
+            print(f"Etapa {numero} falhou, interrompendo a criação de índices e restrições.")
+            return falhas
+
+    print(f"Índices e restrições criados em {time.time() - start_time:.2f} segundos.")
+    return []
+
+
+def invalidar_cache_da_api(url_invalidacao, token=None) -> bool:
+    # Avisa a API que os dados mudaram, para as listas de seleção não ficarem desatualizadas
+    requisicao = urllib.request.Request(url_invalidacao, method="POST")
+    if token:
+        requisicao.add_header("X-Token-Invalidacao", token)
+    try:
+        with urllib.request.urlopen(requisicao, timeout=10) as resposta:
+            print(f"Cache da API invalidado ({resposta.status}).")
+        return True
+    except Exception as e:
+        print(f"Erro ao invalidar o cache da API em {url_invalidacao}: {e}")
+        return False
+
+
+def confirmar_manifesto_pendente(caminho_manifesto_pendente, caminho_manifesto) -> bool:
+    # Só depois de uma carga sem falhas os arquivos do manifesto pendente passam a contar como carregados
+    if not os.path.exists(caminho_manifesto_pendente):
+        print(f"Manifesto pendente {caminho_manifesto_pendente} não encontrado, a próxima carga incremental será completa.")
+        return False
+    os.replace(caminho_manifesto_pendente, caminho_manifesto)
+    print(f"Manifesto da carga atualizado em {caminho_manifesto}.")
+    return True
 
 
 def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) -> dict:
-    if modo_de_geracao not in ["bulk_load", "sem_bulk_load"]:
+    if modo_de_geracao not in ["bulk_load", "sem_bulk_load", "csv_copy"]:
         raise ValueError(
-            "Modo de geração inválido. Use 'bulk_load' ou 'sem_bulk_load'."
+            "Modo de geração inválido. Use 'bulk_load', 'sem_bulk_load' ou 'csv_copy'."
         )
 
     if modo_de_utilizacao not in ["vizualizacao", "docker"]:
@@ -70,11 +253,15 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
             os.path.dirname(os.path.abspath(__file__)), "database/scripts"
         )
         caminho_tabela = os.path.join( os.path.dirname(os.path.abspath(__file__)), "database/scripts/01-cria_tabelas.sql")
+        caminho_particoes = os.path.join(caminho_saida_base, "02-particoes.sql")
+        caminho_pos_carga = os.path.join(caminho_saida_base, "04-indices_e_restricoes.sql")
     else:
         caminho_saida_base = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "arquivos_sql_gerados"
         )
         caminho_tabela = os.path.join( os.path.dirname(os.path.abspath(__file__)), "arquivos_sql_gerados/tabelas.sql")
+        caminho_particoes = os.path.join(caminho_saida_base, "particoes.sql")
+        caminho_pos_carga = os.path.join(caminho_saida_base, "indices_e_restricoes.sql")
 
     if modo_de_geracao == "bulk_load":
         caminho_operadoras = (
@@ -87,6 +274,17 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
             if modo_de_utilizacao == "vizualizacao"
             else caminho_saida_base
         )
+    elif modo_de_geracao == "csv_copy":
+        caminho_operadoras = (
+            os.path.join(caminho_saida_base, "operadoras_csv_copy")
+            if modo_de_utilizacao == "vizualizacao"
+            else caminho_saida_base
+        )
+        caminho_demonstracoes = (
+            os.path.join(caminho_saida_base, "demonstracoes_csv_copy")
+            if modo_de_utilizacao == "vizualizacao"
+            else caminho_saida_base
+        )
     else:
         caminho_operadoras = (
             os.path.join(caminho_saida_base, "operadoras_sem_bulk_load")
@@ -103,6 +301,10 @@ def trata_argumentos_do_script(modo_de_geracao: str, modo_de_utilizacao: str) ->
         "caminho_operadoras": caminho_operadoras,
         "caminho_demonstracoes": caminho_demonstracoes,
         "caminho_tabela": caminho_tabela,
+        "caminho_particoes": caminho_particoes,
+        "caminho_pos_carga": caminho_pos_carga,
+        "caminho_manifesto_pendente": os.path.join(caminho_saida_base, NOME_MANIFESTO_PENDENTE),
+        "caminho_manifesto": os.path.join(os.path.dirname(os.path.abspath(__file__)), NOME_MANIFESTO),
     }
 
 
@@ -112,7 +314,7 @@ def configurar_argumentos(parser: argparse.ArgumentParser) -> argparse.Namespace
         "--modo_de_geracao",
         type=str,
         default="sem_bulk_load",
-        help="Modo de geração: 'bulk_load' ou 'sem_bulk_load'.",
+        help="Modo de geração: 'bulk_load', 'sem_bulk_load' ou 'csv_copy'.",
     )
     parser.add_argument(
         "-mu",
@@ -151,6 +353,25 @@ def configurar_argumentos(parser: argparse.ArgumentParser) -> argparse.Namespace
         default=5432,
         help="Porta do banco de dados (padrão: 5432).",
     )
+    parser.add_argument(
+        "-p",
+        "--paralelismo",
+        type=int,
+        default=4,
+        help="Quantidade de conexões e arquivos carregados em paralelo (padrão: 4).",
+    )
+    parser.add_argument(
+        "--url_invalidacao_cache",
+        type=str,
+        default=None,
+        help="URL do endpoint de invalidação de cache da API, chamada após uma carga bem-sucedida (ex.: http://localhost:8080/internal/cache/invalidar).",
+    )
+    parser.add_argument(
+        "--token_invalidacao_cache",
+        type=str,
+        default=None,
+        help="Token enviado no cabeçalho X-Token-Invalidacao (o CACHE_TOKEN_INVALIDACAO da API).",
+    )
     return parser.parse_args()
 
 
@@ -177,18 +398,55 @@ def __main__():
     }
 
     print("Iniciando a execução dos scripts SQL...")
-    
-    executar_script_sql(configuracoes["caminho_tabela"], psycopg2.connect(**conexao_params))
 
-    # Executa os scripts SQL nos diretórios configurados
-    executar_scripts_sql_paralelo(
-        configuracoes["caminho_operadoras"], conexao_params, max_workers=4
-    )
-    executar_scripts_sql_paralelo(
-        configuracoes["caminho_demonstracoes"], conexao_params, max_workers=4
-    )
+    # As conexões são abertas uma vez e reaproveitadas por todos os arquivos
+    pool = ThreadedConnectionPool(1, args.paralelismo, **conexao_params)
+    try:
+        conexao = pool.getconn()
+        try:
+            executar_script_sql(configuracoes["caminho_tabela"], conexao)
+
+            # Cria as partições de cada trimestre; na carga incremental, as alteradas são recriadas vazias
+            if os.path.exists(configuracoes["caminho_particoes"]):
+                executar_script_sql(configuracoes["caminho_particoes"], conexao)
+        finally:
+            pool.putconn(conexao)
+
+        # Executa os scripts SQL nos diretórios configurados
+        if args.modo_de_geracao == "csv_copy":
+            falhas = carregar_csvs_via_copy_paralelo(
+                configuracoes["caminho_operadoras"], "operadoras_ativas", pool, args.paralelismo
+            )
+            falhas += carregar_csvs_via_copy_paralelo(
+                configuracoes["caminho_demonstracoes"], "demonstracoes_contabeis", pool, args.paralelismo
+            )
+        else:
+            falhas = executar_scripts_sql_paralelo(
+                configuracoes["caminho_operadoras"], pool, max_workers=args.paralelismo
+            )
+            falhas += executar_scripts_sql_paralelo(
+                configuracoes["caminho_demonstracoes"], pool, max_workers=args.paralelismo
+            )
 
-    print("Todos os scripts foram executados com sucesso.")
+        # Índices e chave estrangeira são criados só depois da carga, e apenas se ela foi completa
+        if falhas:
+            print("Carga com falhas, índices e restrições não foram criados.")
+        else:
+            falhas = executar_pos_carga_paralelo(
+                configuracoes["caminho_pos_carga"], pool, max_workers=args.paralelismo
+            )
+    finally:
+        pool.closeall()
+
+    if falhas:
+        print(f"{len(falhas)} arquivo(s) falharam durante a execução.")
+    else:
+        print("Todos os scripts foram executados com sucesso.")
+        confirmar_manifesto_pendente(
+            configuracoes["caminho_manifesto_pendente"], configuracoes["caminho_manifesto"]
+        )
+        if args.url_invalidacao_cache:
+            invalidar_cache_da_api(args.url_invalidacao_cache, args.token_invalidacao_cache)
 
 
 if __name__ == "__main__":
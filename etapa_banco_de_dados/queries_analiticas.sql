@@ -30,27 +30,38 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
-SELECT sum(dc.vl_saldo_final) as total_de_despesa,oi.*
-FROM operadoras_ativas oi 
-JOIN demonstracoes_contabeis dc 
-    ON oi.registro_operadora = dc.registro_operadora
-WHERE 
-    unaccent(dc.descricao) ILIKE unaccent('%EVENTOS/SINISTROS CONHECIDOS OU AVISADOS DE ASSISTÊNCIA A SAÚDE MÉDICO HOSPITALAR%')
-    AND dc.vl_saldo_final < 0
-    AND dc.trimestre = (SELECT trimestre FROM obter_trimestre_anterior())
-    AND dc.ano = (SELECT ano FROM obter_trimestre_anterior())
-GROUP BY oi.registro_operadora, dc.vl_saldo_final
-ORDER BY dc.vl_saldo_final
-LIMIT 10;
+-- As 10 operadoras com as maiores despesas em eventos/sinistros no último trimestre: filtra o resumo, soma por
+-- operadora e só então junta com operadoras_ativas, como o endpoint de maiores despesas da API
+WITH ranking AS (
+    SELECT rd.registro_operadora, sum(rd.total_de_despesa) AS total_de_despesa
+    FROM resumo_despesas_operadoras rd
+    WHERE 
+        rd.descricao_normalizada ILIKE unaccent_imutavel('%EVENTOS/SINISTROS CONHECIDOS OU AVISADOS DE ASSISTÊNCIA A SAÚDE MÉDICO HOSPITALAR%')
+        AND rd.trimestre = (SELECT trimestre FROM obter_trimestre_anterior())
+        AND rd.ano = (SELECT ano FROM obter_trimestre_anterior())
+    GROUP BY rd.registro_operadora
+    ORDER BY sum(rd.total_de_despesa) ASC
+    LIMIT 10
+)
+SELECT r.total_de_despesa, oi.*
+FROM ranking r
+JOIN operadoras_ativas oi 
+    ON oi.registro_operadora = r.registro_operadora
+ORDER BY r.total_de_despesa ASC;
 
-SELECT sum(dc.vl_saldo_final) as total_de_despesa,oi.*
-FROM operadoras_ativas oi 
-JOIN demonstracoes_contabeis dc 
-    ON oi.registro_operadora = dc.registro_operadora
-WHERE 
-    unaccent(dc.descricao) ILIKE unaccent('%EVENTOS/SINISTROS CONHECIDOS OU AVISADOS DE ASSISTÊNCIA A SAÚDE MÉDICO HOSPITALAR%')
-    AND dc.vl_saldo_final < 0
-    AND dc.ano = (SELECT ano FROM obter_trimestre_anterior())
-GROUP BY oi.registro_operadora, dc.vl_saldo_final
-ORDER BY dc.vl_saldo_final
-LIMIT 10;
\ No newline at end of file
+-- O mesmo ranking somando os quatro trimestres do ano
+WITH ranking AS (
+    SELECT rd.registro_operadora, sum(rd.total_de_despesa) AS total_de_despesa
+    FROM resumo_despesas_operadoras rd
+    WHERE 
+        rd.descricao_normalizada ILIKE unaccent_imutavel('%EVENTOS/SINISTROS CONHECIDOS OU AVISADOS DE ASSISTÊNCIA A SAÚDE MÉDICO HOSPITALAR%')
+        AND rd.ano = (SELECT ano FROM obter_trimestre_anterior())
+    GROUP BY rd.registro_operadora
+    ORDER BY sum(rd.total_de_despesa) ASC
+    LIMIT 10
+)
+SELECT r.total_de_despesa, oi.*
+FROM ranking r
+JOIN operadoras_ativas oi 
+    ON oi.registro_operadora = r.registro_operadora
+ORDER BY r.total_de_despesa ASC;
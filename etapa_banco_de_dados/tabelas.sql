@@ -2,7 +2,7 @@ SET datestyle = 'ISO, YMD';
 
 CREATE TABLE IF NOT EXISTS operadoras_ativas (
     registro_operadora VARCHAR(6) NOT NULL PRIMARY KEY,
-    cnpj VARCHAR(14) NOT NULL UNIQUE, -- CNPJ da operadora
+    cnpj VARCHAR(14) NOT NULL, -- CNPJ da operadora (único, índice criado após a carga)
     razao_social VARCHAR(140), -- Razão social da operadora
     nome_fantasia VARCHAR(140), -- Nome fantasia da operadora
     modalidade VARCHAR(40), -- Modalidade da operadora
@@ -23,12 +23,12 @@ CREATE TABLE IF NOT EXISTS operadoras_ativas (
     data_registro_ans DATE -- Data do Registro da Operadora na ANS (formato AAAA-MM-DD)
 );
 
-CREATE UNIQUE INDEX IF NOT EXISTS idx_operadoras_cnpj ON public.operadoras_ativas (cnpj);
-CREATE INDEX IF NOT EXISTS idx_operadoras_uf ON public.operadoras_ativas (uf);
-
+-- Índices secundários e a chave estrangeira são criados depois da carga, em indices_e_restricoes.sql
 
+-- Particionada por (ano, trimestre): cada trimestre fica em uma partição demonstracoes_contabeis_<ano>_<trimestre>,
+-- criada pelos scripts de carga, e as consultas filtradas por ano/trimestre leem só as partições necessárias
 CREATE TABLE IF NOT EXISTS demonstracoes_contabeis (
-    id BIGSERIAL PRIMARY KEY, -- ID auto-incrementável
+    id BIGSERIAL, -- ID auto-incrementável
     data_demonstracao DATE NOT NULL, -- Data da demonstração
     trimestre INT NOT NULL, -- Trimestre da demonstração
     ano INT NOT NULL, -- Ano da demonstração
@@ -37,10 +37,17 @@ CREATE TABLE IF NOT EXISTS demonstracoes_contabeis (
     descricao VARCHAR(255), -- Descrição da conta contábil
     vl_saldo_inicial NUMERIC(15, 2), -- Valor do saldo inicial (em reais)
     vl_saldo_final NUMERIC(15, 2), -- Valor do saldo final (em reais)
-    CONSTRAINT fk_operadora FOREIGN KEY (registro_operadora) REFERENCES operadoras_ativas (registro_operadora) ON DELETE CASCADE ON UPDATE CASCADE
-);
+    PRIMARY KEY (id, ano, trimestre) -- A chave primária de uma tabela particionada precisa conter a chave de partição
+) PARTITION BY RANGE (ano, trimestre);
 
 CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() é STABLE e não pode ser usada em índices; com o dicionário fixo, o resultado só depende do texto
+CREATE OR REPLACE FUNCTION unaccent_imutavel(TEXT)
+RETURNS TEXT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
 
 CREATE OR REPLACE FUNCTION obter_trimestre_anterior() 
 RETURNS TABLE (trimestre INT, ano INT) AS $$
@@ -72,4 +79,23 @@ RETURNS INT AS $$
 BEGIN
     RETURN EXTRACT(YEAR FROM CURRENT_DATE) - 1;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+
+-- Despesas (saldos finais negativos) somadas por descrição, trimestre e operadora, usadas nos rankings de maiores despesas.
+-- Criada vazia; o script de índices e restrições a atualiza depois de cada carga.
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumo_despesas_operadoras AS
+SELECT
+    unaccent_imutavel(descricao) AS descricao_normalizada,
+    ano,
+    trimestre,
+    registro_operadora,
+    sum(vl_saldo_final) AS total_de_despesa
+FROM demonstracoes_contabeis
+WHERE vl_saldo_final < 0
+GROUP BY unaccent_imutavel(descricao), ano, trimestre, registro_operadora
+WITH NO DATA;
+
+-- O índice único permite o REFRESH ... CONCURRENTLY, sem bloquear as leituras da API
+CREATE UNIQUE INDEX IF NOT EXISTS idx_resumo_despesas_chave ON resumo_despesas_operadoras (ano, trimestre, descricao_normalizada, registro_operadora);
+CREATE INDEX IF NOT EXISTS idx_resumo_despesas_descricao_trgm ON resumo_despesas_operadoras USING gin (descricao_normalizada gin_trgm_ops);
\ No newline at end of file
@@ -0,0 +1,13 @@
+import pytest
+
+import gerador_de_sql
+
+
+def test_csv_copy_no_modo_docker_e_recusado_antes_de_limpar_os_scripts(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["gerador_de_sql.py", "-mg", "csv_copy", "-mu", "docker"])
+    monkeypatch.setattr(gerador_de_sql, "limpar_diretorio_saida", lambda caminho: pytest.fail("diretório limpo"))
+
+    with pytest.raises(SystemExit) as erro:
+        gerador_de_sql.__main__()
+
+    assert erro.value.code == 2
@@ -0,0 +1,67 @@
+import json
+import os
+
+import gerador_de_sql
+import inserir_scripts_sql_no_banco
+
+
+def criar_manifesto(hash_operadoras, demonstracoes):
+    return {
+        "operadoras": {"hash": hash_operadoras, "linhas": 10},
+        "demonstracoes": {
+            chave: {"ano": chave[:4], "trimestre": chave[5], "hash": hash_arquivo, "linhas": 100}
+            for chave, hash_arquivo in demonstracoes.items()
+        },
+    }
+
+
+def test_cadastro_alterado_recarrega_operadoras_e_todas_as_particoes():
+    anterior = criar_manifesto("a", {"2023/1T2023.csv": "x", "2023/2T2023.csv": "y", "2022/4T2022.csv": "z"})
+    atual = criar_manifesto("b", {"2023/1T2023.csv": "x", "2023/2T2023.csv": "y"})
+
+    plano = gerador_de_sql.planejar_carga_incremental(anterior, atual)
+
+    assert plano["recarregar_operadoras"]
+    assert plano["particoes"] == {("2023", "1"), ("2023", "2")}
+    assert plano["particoes_removidas"] == {("2022", "4")}
+
+    # Com o cadastro alterado, todas as partições são apagadas antes de carregar de novo
+    comandos = gerador_de_sql.gerar_comandos_remocao_de_particoes(plano["particoes_removidas"]) + \
+        gerador_de_sql.gerar_comandos_particoes(plano["particoes"], recriar=True)
+    for particao in ("demonstracoes_contabeis_2023_1", "demonstracoes_contabeis_2023_2", "demonstracoes_contabeis_2022_4"):
+        assert f"DROP TABLE IF EXISTS {particao};" in comandos
+    assert "CREATE TABLE IF NOT EXISTS demonstracoes_contabeis_2022_4" not in comandos
+    assert "TRUNCATE operadoras_ativas" in gerador_de_sql.COMANDO_RECARGA_OPERADORAS
+
+
+def test_sem_manifesto_recarrega_tudo():
+    atual = criar_manifesto("a", {"2023/1T2023.csv": "x"})
+
+    plano = gerador_de_sql.planejar_carga_incremental({}, atual)
+
+    assert plano["recarregar_operadoras"]
+    assert plano["particoes"] == {("2023", "1")}
+
+
+def test_cadastro_igual_recarrega_so_as_particoes_alteradas_e_apaga_as_removidas():
+    anterior = criar_manifesto("a", {"2023/1T2023.csv": "x", "2023/2T2023.csv": "y", "2022/4T2022.csv": "z"})
+    atual = criar_manifesto("a", {"2023/1T2023.csv": "x", "2023/2T2023.csv": "novo", "2024/1T2024.csv": "w"})
+
+    plano = gerador_de_sql.planejar_carga_incremental(anterior, atual)
+
+    assert not plano["recarregar_operadoras"]
+    assert plano["particoes"] == {("2023", "2"), ("2024", "1")}
+    assert plano["particoes_removidas"] == {("2022", "4")}
+
+
+def test_manifesto_so_e_confirmado_depois_da_carga(tmp_path):
+    pendente = tmp_path / inserir_scripts_sql_no_banco.NOME_MANIFESTO_PENDENTE
+    confirmado = tmp_path / inserir_scripts_sql_no_banco.NOME_MANIFESTO
+
+    assert not inserir_scripts_sql_no_banco.confirmar_manifesto_pendente(str(pendente), str(confirmado))
+    assert not os.path.exists(confirmado)
+
+    pendente.write_text(json.dumps(criar_manifesto("a", {})))
+    assert inserir_scripts_sql_no_banco.confirmar_manifesto_pendente(str(pendente), str(confirmado))
+    assert json.loads(confirmado.read_text())["operadoras"]["hash"] == "a"
+    assert not os.path.exists(pendente)
@@ -0,0 +1,111 @@
+"""
+Compara linhas/s das listagens de operadoras e demonstrações no caminho antigo (entidades do ORM,
+model_validate por linha e o response_model serializado pelo Pydantic) e no caminho atual
+(colunas como tuplas, dicts e orjson).
+
+Uso, a partir de etapa_sistema_e_api/backend, com a DATABASE_URL apontando para um banco carregado:
+    python -m benchmarks.benchmark_listagens --repeticoes 20
+"""
+from sqlalchemy import select
+from database import SessionLocal, encerrar_banco, inicializar_banco
+from models import DemonstracaoContabil, OperadoraAtiva
+from paginacao import aplicar_cursor
+from respostas import resposta_json
+from schemas import DemonstracaoContabilListagemDTO, OperadoraAtivaListagemDTO
+from services.demonstracoes_service import DemonstracoesResponse, filtrar_demonstracoes, get_demonstracoes
+from services.operadoras_service import OperadorasResponse, filtrar_operadoras, get_operadoras
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+
+async def operadoras_antes(session, limit):
+    query = aplicar_cursor(filtrar_operadoras(*[None] * 8), [OperadoraAtiva.registro_operadora], None)
+    if limit > 0:
+        query = query.limit(limit)
+    operadoras = (await session.execute(query)).scalars().all()
+    resposta = OperadorasResponse(
+        operadoras=[OperadoraAtivaListagemDTO.model_validate(op) for op in operadoras],
+        next_cursor=operadoras[-1].registro_operadora if operadoras else None,
+        total_elementos=None,
+    )
+    # A rota antiga montava uma segunda resposta, que o FastAPI validava e serializava
+    resposta = OperadorasResponse(**dict(resposta))
+    return len(operadoras), OperadorasResponse.model_validate(resposta).model_dump_json().encode()
+
+
+async def operadoras_depois(session, limit):
+    resposta = await get_operadoras(session, limit, *[None] * 9, contagem="nenhuma")
+    return len(resposta.operadoras), resposta_json(resposta).body
+
+
+async def demonstracoes_antes(session, limit):
+    query = aplicar_cursor(filtrar_demonstracoes(None, None, None, None), [DemonstracaoContabil.id], None)
+    if limit > 0:
+        query = query.limit(limit)
+    demonstracoes = (await session.execute(query)).scalars().all()
+    resposta = DemonstracoesResponse(
+        demonstracoes=[DemonstracaoContabilListagemDTO.model_validate(demo) for demo in demonstracoes],
+        next_cursor=demonstracoes[-1].id if demonstracoes else None,
+        total_elementos=None,
+    )
+    resposta = DemonstracoesResponse(**dict(resposta))
+    return len(demonstracoes), DemonstracoesResponse.model_validate(resposta).model_dump_json().encode()
+
+
+async def demonstracoes_depois(session, limit):
+    resposta = await get_demonstracoes(session, limit, None, None, None, None, None, contagem="nenhuma")
+    return len(resposta.demonstracoes), resposta_json(resposta).body
+
+
+async def medir(funcao, limit, repeticoes):
+    linhas_total, inicio = 0, time.perf_counter()
+    for _ in range(repeticoes):
+        async with SessionLocal() as session:
+            linhas, _ = await funcao(session, limit)
+        linhas_total += linhas
+    return linhas_total / (time.perf_counter() - inicio)
+
+
+async def conferir_respostas(antes, depois, limit):
+    # Os dois caminhos precisam gerar o mesmo JSON (o next_cursor antigo vinha mesmo com página incompleta)
+    async with SessionLocal() as session:
+        _, corpo_antes = await antes(session, limit)
+        _, corpo_depois = await depois(session, limit)
+    lista_antes, lista_depois = (
+        next(valor for chave, valor in json.loads(corpo).items() if isinstance(valor, list))
+        for corpo in (corpo_antes, corpo_depois)
+    )
+    return lista_antes == lista_depois
+
+
+async def main(limites, repeticoes):
+    await inicializar_banco()
+    try:
+        print(f"{'listagem':<14} {'limit':>6} {'antes (linhas/s)':>18} {'depois (linhas/s)':>18} {'ganho':>7}  mesmo JSON")
+        for nome, antes, depois in [
+            ("operadoras", operadoras_antes, operadoras_depois),
+            ("demonstracoes", demonstracoes_antes, demonstracoes_depois),
+        ]:
+            for limit in limites:
+                # limit=0 traz a tabela inteira; menos repetições para o teste não demorar demais
+                n = max(1, repeticoes // 10) if limit == 0 else repeticoes
+                await medir(depois, limit, 1)  # aquece o pool e os caches de compilação
+                taxa_antes = await medir(antes, limit, n)
+                taxa_depois = await medir(depois, limit, n)
+                iguais = await conferir_respostas(antes, depois, limit)
+                print(f"{nome:<14} {limit:>6} {taxa_antes:>18,.0f} {taxa_depois:>18,.0f} {taxa_depois / taxa_antes:>6.1f}x  {iguais}")
+    finally:
+        await encerrar_banco()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das listagens paginadas da API")
+    parser.add_argument("--limites", type=int, nargs="+", default=[10, 1000, 0], help="Valores de limit medidos")
+    parser.add_argument("--repeticoes", type=int, default=20, help="Requisições por medição")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(main(args.limites, args.repeticoes))
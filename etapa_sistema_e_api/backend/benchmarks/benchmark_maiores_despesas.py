@@ -0,0 +1,172 @@
+"""
+Compara o ranking anual de maiores despesas de antes (junta demonstracoes_contabeis com operadoras_ativas e agrupa
+por operadora e por vl_saldo_final, devolvendo linhas soltas em vez do total de cada operadora) com o atual (soma
+o resumo por operadora numa CTE e junta só as top_n) sobre uma massa sintética. As duas consultas leem as mesmas
+demonstrações: o resumo é calculado a partir delas, com a mesma consulta da view materializada. A massa é criada em
+tabelas temporárias com os mesmos nomes, que têm precedência sobre as tabelas reais na sessão, então nada é gravado
+no banco. As colunas "correta" conferem cada top 10 com a soma por operadora feita direto nas demonstrações.
+
+Uso, a partir de etapa_sistema_e_api/backend, com a DATABASE_URL apontando para um banco com o schema criado:
+    python -m benchmarks.benchmark_maiores_despesas --operadoras 1500 --descricoes 300 --anos 3
+"""
+from sqlalchemy import text
+from database import SessionLocal, encerrar_banco, inicializar_banco
+from services.operadoras_service import get_maiores_despesas_ano
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+
+# A consulta de antes desta mudança, sem alterações
+CONSULTA_ANTIGA = text("""
+    SELECT sum(dc.vl_saldo_final) as total_de_despesa, oi.*
+    FROM operadoras_ativas oi 
+    JOIN demonstracoes_contabeis dc 
+        ON oi.registro_operadora = dc.registro_operadora
+    WHERE 
+        unaccent(dc.descricao) ILIKE unaccent(:descricao)
+        AND dc.vl_saldo_final < 0
+        AND dc.ano = :ano
+    GROUP BY oi.registro_operadora, dc.vl_saldo_final
+    ORDER BY dc.vl_saldo_final
+    LIMIT 10;
+""")
+
+# O ranking esperado: a soma anual das despesas de cada operadora, direto nas demonstrações
+CONSULTA_DE_REFERENCIA = text("""
+    SELECT registro_operadora, sum(vl_saldo_final) AS total_de_despesa
+    FROM demonstracoes_contabeis
+    WHERE
+        unaccent_imutavel(descricao) ILIKE unaccent_imutavel(:descricao)
+        AND vl_saldo_final < 0
+        AND ano = :ano
+    GROUP BY registro_operadora
+    ORDER BY total_de_despesa ASC
+    LIMIT 10;
+""")
+
+
+async def criar_massa_sintetica(session, operadoras: int, descricoes: int, anos: int, cobertura: float):
+    # Perto da distribuição real: cada operadora lança em parte das contas, com valores de ordens de grandeza variadas
+    await session.execute(text("CREATE TEMP TABLE operadoras_ativas (LIKE public.operadoras_ativas INCLUDING ALL)"))
+    await session.execute(text("""
+        INSERT INTO operadoras_ativas (registro_operadora, cnpj, razao_social, nome_fantasia, modalidade, cidade, uf)
+        SELECT lpad(i::text, 6, '0'), lpad(i::text, 14, '0'), 'OPERADORA ' || i, 'FANTASIA ' || i,
+               (ARRAY['Medicina de Grupo', 'Cooperativa Médica', 'Odontologia de Grupo', 'Autogestão'])[1 + i % 4],
+               'CIDADE ' || (i % 500), (ARRAY['SP', 'RJ', 'MG', 'RS', 'PR', 'BA'])[1 + i % 6]
+        FROM generate_series(1, :operadoras) i
+    """), {"operadoras": operadoras})
+    await session.execute(text(
+        "CREATE TEMP TABLE demonstracoes_contabeis (LIKE public.demonstracoes_contabeis INCLUDING DEFAULTS)"
+    ))
+    await session.execute(text("""
+        INSERT INTO demonstracoes_contabeis (
+            data_demonstracao, trimestre, ano, registro_operadora, cd_conta_contabil, descricao,
+            vl_saldo_inicial, vl_saldo_final
+        )
+        SELECT
+            make_date(a, 3 * t - 2, 1), t, a, lpad(o::text, 6, '0'), 400000 + d,
+            CASE WHEN d % 10 = 0 THEN 'EVENTOS/ SINISTROS CONHECIDOS OU AVISADOS DE ASSISTÊNCIA A SAÚDE ' || d
+                 ELSE 'CONTA CONTÁBIL DE DESPESA ' || d END,
+            0,
+            -- A maioria dos saldos é de despesa (negativa), como nas contas de despesa reais
+            round(((random() - 0.9) * power(10, 3 + random() * 5))::numeric, 2)
+        FROM generate_series(1, :operadoras) o,
+             generate_series(1, :descricoes) d,
+             generate_series(2024 - :anos + 1, 2024) a,
+             generate_series(1, 4) t
+        WHERE random() < :cobertura
+    """), {"operadoras": operadoras, "descricoes": descricoes, "anos": anos, "cobertura": cobertura})
+    await session.execute(text("CREATE INDEX ON demonstracoes_contabeis (ano, trimestre, id)"))
+    await session.execute(text("CREATE INDEX ON demonstracoes_contabeis (registro_operadora, id)"))
+    # Mesma consulta da view materializada resumo_despesas_operadoras, sobre as demonstrações sintéticas
+    await session.execute(text("""
+        CREATE TEMP TABLE resumo_despesas_operadoras AS
+        SELECT
+            unaccent_imutavel(descricao) AS descricao_normalizada,
+            ano,
+            trimestre,
+            registro_operadora,
+            sum(vl_saldo_final) AS total_de_despesa
+        FROM demonstracoes_contabeis
+        WHERE vl_saldo_final < 0
+        GROUP BY unaccent_imutavel(descricao), ano, trimestre, registro_operadora
+    """))
+    await session.execute(text(
+        "CREATE UNIQUE INDEX ON resumo_despesas_operadoras (ano, trimestre, descricao_normalizada, registro_operadora)"
+    ))
+    if (await session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))).scalar():
+        await session.execute(text(
+            "CREATE INDEX ON demonstracoes_contabeis USING gin (unaccent_imutavel(descricao) gin_trgm_ops)"
+        ))
+        await session.execute(text(
+            "CREATE INDEX ON resumo_despesas_operadoras USING gin (descricao_normalizada gin_trgm_ops)"
+        ))
+    await session.execute(text("ANALYZE operadoras_ativas"))
+    await session.execute(text("ANALYZE demonstracoes_contabeis"))
+    await session.execute(text("ANALYZE resumo_despesas_operadoras"))
+    return (
+        (await session.execute(text("SELECT count(*) FROM demonstracoes_contabeis"))).scalar(),
+        (await session.execute(text("SELECT count(*) FROM resumo_despesas_operadoras"))).scalar(),
+    )
+
+
+async def medir(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+async def main(args):
+    await inicializar_banco()
+    try:
+        async with SessionLocal() as session:
+            demonstracoes, resumo = await criar_massa_sintetica(
+                session, args.operadoras, args.descricoes, args.anos, args.cobertura
+            )
+            print(f"Massa sintética: {args.operadoras} operadoras, {demonstracoes:,} demonstrações, {resumo:,} linhas no resumo")
+
+            print(f"{'descrição':<12} {'antiga (ms)':>12} {'atual (ms)':>11} {'atual + trimestres (ms)':>24}  {'antiga correta':>14}  {'atual correta':>13}")
+            for descricao in args.descricoes_buscadas:
+                parametros = {"descricao": f"%{descricao}%", "ano": 2024}
+                antiga = lambda: session.execute(CONSULTA_ANTIGA, parametros)
+                atual = lambda: get_maiores_despesas_ano(session, descricao, 2024)
+                com_trimestres = lambda: get_maiores_despesas_ano(session, descricao, 2024, 10, True)
+
+                await antiga()
+                await atual()
+                tempo_antigo = await medir(antiga, args.repeticoes)
+                tempo_atual = await medir(atual, args.repeticoes)
+                tempo_com_trimestres = await medir(com_trimestres, args.repeticoes)
+
+                referencia = [
+                    (linha.registro_operadora, float(linha.total_de_despesa))
+                    for linha in (await session.execute(CONSULTA_DE_REFERENCIA, parametros)).fetchall()
+                ]
+                top_antigo = [(linha.registro_operadora, float(linha.total_de_despesa)) for linha in (await antiga()).fetchall()]
+                top_atual = [(operadora.registro_operadora, operadora.total_de_despesa) for operadora in await atual()]
+                print(
+                    f"{descricao:<12} {tempo_antigo:>12.1f} {tempo_atual:>11.1f} {tempo_com_trimestres:>24.1f}  "
+                    f"{str(top_antigo == referencia):>14}  {str(top_atual == referencia):>13}"
+                )
+            await session.rollback()
+    finally:
+        await encerrar_banco()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do ranking anual de maiores despesas")
+    parser.add_argument("--operadoras", type=int, default=1500)
+    parser.add_argument("--descricoes", type=int, default=300, help="Contas de despesa distintas")
+    parser.add_argument("--anos", type=int, default=3)
+    parser.add_argument("--cobertura", type=float, default=0.6, help="Fração das contas em que cada operadora lança")
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--descricoes_buscadas", nargs="+", default=["EVENTOS", "DESPESA", "CONTA"])
+    logging.disable(logging.INFO)
+    asyncio.run(main(parser.parse_args()))
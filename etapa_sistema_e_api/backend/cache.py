@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Awaitable, Callable, Optional
+
+import hashlib
+import json
+import os
+import time
+
+
+CACHE_TTL_SEGUNDOS = int(os.getenv("CACHE_TTL_SEGUNDOS", "3600"))
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "256"))
+# Curto para o navegador revalidar logo após uma carga; a revalidação com ETag custa um 304 sem consulta ao banco
+CACHE_MAX_AGE_NAVEGADOR = int(os.getenv("CACHE_MAX_AGE_NAVEGADOR", "60"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+
+class ArmazenamentoEmMemoria:
+    """
+    Cache local do processo, com expiração por TTL e descarte do item menos usado (LRU).
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict()
+
+    async def obter(self, chave: str) -> Optional[dict]:
+        entrada = self.entradas.get(chave)
+        if entrada is None:
+            return None
+        expira_em, valor = entrada
+        if expira_em < time.monotonic():
+            del self.entradas[chave]
+            return None
+        self.entradas.move_to_end(chave)
+        return valor
+
+    async def definir(self, chave: str, valor: dict, ttl: int):
+        self.entradas[chave] = (time.monotonic() + ttl, valor)
+        self.entradas.move_to_end(chave)
+        while len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+
+    async def limpar(self):
+        self.entradas.clear()
+
+
+class ArmazenamentoRedis:
+    """
+    Cache compartilhado entre workers e instâncias. A invalidação troca a versão das chaves,
+    e as entradas antigas expiram pelo TTL.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # Dependência opcional, só usada com CACHE_REDIS_URL
+
+        self.cliente = redis.from_url(url)
+
+    async def _prefixo(self) -> str:
+        versao = await self.cliente.get("cache_api:versao") or b"0"
+        return f"cache_api:{versao.decode()}:"
+
+    async def obter(self, chave: str) -> Optional[dict]:
+        valor = await self.cliente.get(await self._prefixo() + chave)
+        return json.loads(valor) if valor else None
+
+    async def definir(self, chave: str, valor: dict, ttl: int):
+        await self.cliente.set(await self._prefixo() + chave, json.dumps(valor), ex=ttl)
+
+    async def limpar(self):
+        await self.cliente.incr("cache_api:versao")
+
+
+armazenamento = (
+    ArmazenamentoRedis(CACHE_REDIS_URL) if CACHE_REDIS_URL else ArmazenamentoEmMemoria(CACHE_MAX_ENTRADAS)
+)
+
+
+async def obter_ou_calcular(chave: str, calcular: Callable[[], Awaitable]) -> dict:
+    entrada = await armazenamento.obter(chave)
+    if entrada is None:
+        corpo = json.dumps(jsonable_encoder(await calcular()), ensure_ascii=False)
+        entrada = {"corpo": corpo, "etag": f'"{hashlib.sha256(corpo.encode()).hexdigest()[:32]}"'}
+        await armazenamento.definir(chave, entrada, CACHE_TTL_SEGUNDOS)
+    return entrada
+
+
+async def responder_com_cache(request: Request, chave: str, calcular: Callable[[], Awaitable]) -> Response:
+    entrada = await obter_ou_calcular(chave, calcular)
+    cabecalhos = {"ETag": entrada["etag"], "Cache-Control": f"public, max-age={CACHE_MAX_AGE_NAVEGADOR}"}
+
+    # O navegador revalida com If-None-Match e recebe 304 sem corpo enquanto os dados não mudarem
+    if request.headers.get("if-none-match") == entrada["etag"]:
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=entrada["corpo"], media_type="application/json", headers=cabecalhos)
+
+
+async def invalidar_cache():
+    await armazenamento.limpar()
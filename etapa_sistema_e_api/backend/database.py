@@ -1,10 +1,16 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from google.cloud.sql.connector import Connector
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import event, exc, text
+from google.cloud.sql.connector import create_async_connector
 from dotenv import load_dotenv
+from collections import deque
+from contextlib import asynccontextmanager
 
+import asyncio
 import os
+import time
 
 
 load_dotenv()
@@ -15,56 +21,285 @@ USERNAME = os.getenv("USER_NAME", "postgres")
 PASSWORD = os.getenv("PASSWORD", "senha")
 DB_NAME = os.getenv("DB_NAME", "nome_do_banco")
 
-# Inicializa o conector do Google Cloud SQL
-connector = Connector()
+# Configuração do pool de conexões, usada tanto pela DATABASE_URL quanto pelo Cloud SQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Loga todo SQL executado (síncrono e volumoso); para produção, prefira o log de consultas lentas de metricas.py
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
 
-def get_connection():
+# Réplica de leitura opcional para os endpoints analíticos (rankings e exportação)
+READ_REPLICA_URL = os.getenv("READ_REPLICA_URL")
+# Com a réplica fora do ar, as leituras vão para o primário e a réplica é testada de novo depois desse intervalo
+REPLICA_INTERVALO_DE_VERIFICACAO = float(os.getenv("REPLICA_INTERVALO_DE_VERIFICACAO", "30"))
+REPLICA_TIMEOUT_DE_CONEXAO = float(os.getenv("REPLICA_TIMEOUT_DE_CONEXAO", "3"))
+
+# O conector do Google Cloud SQL é criado só se a DATABASE_URL falhar, já dentro do event loop
+connector = None
+
+
+def converter_url_para_asyncpg(url: str) -> str:
+    """
+    Troca o driver da URL (ex.: postgresql:// ou postgresql+psycopg2://) pelo asyncpg.
+    """
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+async def get_connection():
     """
     Retorna uma conexão com o banco de dados usando o conector do Google Cloud SQL.
     """
+    global connector
     print("Conectando ao banco de dados usando o conector do Google Cloud SQL...")
     print(f"Conexão: {INSTANCE_CONNECTION_NAME_GCLOUD}")
     print(f"Usuário: {USERNAME}")
     print(f"Banco de dados: {DB_NAME}")
     print(f"Senha: {PASSWORD}")
-    conn = connector.connect(
+    if connector is None:
+        connector = await create_async_connector()
+    conn = await connector.connect_async(
         INSTANCE_CONNECTION_NAME_GCLOUD,  # Substitua pelo nome da conexão do Cloud SQL
-        "pg8000",  # Driver para PostgreSQL
+        "asyncpg",  # Driver assíncrono para PostgreSQL
         user=f"{USERNAME}",  # Substitua pelo nome de usuário do banco
         password=f"{PASSWORD}",  # Substitua pela senha do banco
         db=f"{DB_NAME}",  # Substitua pelo nome do banco de dados
+        server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
     )
     return conn
 
-# Tenta criar o engine usando a URL de conexão
-try:
-    engine = create_engine(DATABASE_URL, echo=True)
-    # Testa a conexão
-    with engine.connect() as conn:
-        print("Conexão com o banco de dados via DATABASE_URL bem-sucedida.")
-except Exception as e:
-    print(f"Falha ao conectar usando DATABASE_URL: {e}")
-    print("Tentando conectar usando o conector do Google Cloud SQL...")
-    try:
-        engine = create_engine(
-            "postgresql+pg8000://",  # Driver para PostgreSQL com pg8000
-            creator=get_connection,  # Função para criar a conexão
-            echo=True
-        )
-        # Testa a conexão
-        with engine.connect() as conn:
-            print("Conexão com o banco de dados via Google Cloud SQL bem-sucedida.")
-    except Exception as e:
-        print(f"Falha ao conectar usando o conector do Google Cloud SQL: {e}")
-        raise
+
+class MetricasDoPool:
+    """
+    Contadores do pool de conexões, servidos pelo endpoint interno /internal/pool.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.tempo_total_de_espera = 0.0
+        self.maior_tempo_de_espera = 0.0
+        self.timeouts = 0
+        self.eventos_de_overflow = 0
+        self.conexoes_criadas = 0
+        self.conexoes_invalidadas = 0
+        self.criacoes_recentes = deque()
+
+    def registrar_espera(self, segundos: float):
+        self.checkouts += 1
+        self.tempo_total_de_espera += segundos
+        self.maior_tempo_de_espera = max(self.maior_tempo_de_espera, segundos)
+
+    def registrar_conexao_criada(self):
+        self.conexoes_criadas += 1
+        self.criacoes_recentes.append(time.monotonic())
+
+    def conexoes_criadas_no_ultimo_minuto(self) -> int:
+        limite = time.monotonic() - 60
+        while self.criacoes_recentes and self.criacoes_recentes[0] < limite:
+            self.criacoes_recentes.popleft()
+        return len(self.criacoes_recentes)
+
+
+metricas_do_pool = MetricasDoPool()
+
+
+class PoolInstrumentado(AsyncAdaptedQueuePool):
+    # Mede quanto tempo cada checkout esperou por uma conexão livre (ou pela criação de uma nova). Só o connect
+    # público é sobrescrito, e não os métodos internos do QueuePool, que mudam entre versões do SQLAlchemy
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            metricas_do_pool.timeouts += 1
+            raise
+        finally:
+            metricas_do_pool.registrar_espera(time.perf_counter() - inicio)
+
+
+def instrumentar_pool(engine):
+    # Os eventos passam para o pool novo quando o engine é descartado (dispose), por isso o pool é lido a cada evento
+    @event.listens_for(engine.sync_engine.pool, "connect")
+    def ao_criar_conexao(dbapi_connection, connection_record):
+        metricas_do_pool.registrar_conexao_criada()
+        # O overflow já conta a conexão nova; acima de zero, ela excede o pool_size
+        if engine.sync_engine.pool.overflow() > 0:
+            metricas_do_pool.eventos_de_overflow += 1
+
+    @event.listens_for(engine.sync_engine.pool, "invalidate")
+    def ao_invalidar_conexao(dbapi_connection, connection_record, exception):
+        metricas_do_pool.conexoes_invalidadas += 1
+
+    return engine
+
+
+def criar_engine(url: str, instrumentado: bool = True, **kwargs):
+    engine_criado = create_async_engine(
+        url,
+        echo=DB_ECHO,
+        # As métricas de /internal/pool são só do primário
+        poolclass=PoolInstrumentado if instrumentado else AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        **kwargs
+    )
+    return instrumentar_pool(engine_criado) if instrumentado else engine_criado
+
+
+def obter_metricas_do_pool() -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "conexoes_em_uso": pool.checkedout(),
+        "conexoes_livres": pool.checkedin(),
+        "overflow_atual": max(pool.overflow(), 0),
+        "checkouts": metricas_do_pool.checkouts,
+        "tempo_medio_de_espera_ms": (
+            metricas_do_pool.tempo_total_de_espera / metricas_do_pool.checkouts * 1000
+            if metricas_do_pool.checkouts else 0.0
+        ),
+        "maior_tempo_de_espera_ms": metricas_do_pool.maior_tempo_de_espera * 1000,
+        "timeouts": metricas_do_pool.timeouts,
+        "eventos_de_overflow": metricas_do_pool.eventos_de_overflow,
+        "conexoes_criadas": metricas_do_pool.conexoes_criadas,
+        "conexoes_criadas_no_ultimo_minuto": metricas_do_pool.conexoes_criadas_no_ultimo_minuto(),
+        "conexoes_invalidadas": metricas_do_pool.conexoes_invalidadas,
+    }
+
+
+# O engine não abre conexões ao ser criado; a conexão é testada na inicialização da aplicação
+engine = criar_engine(
+    converter_url_para_asyncpg(DATABASE_URL),
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+)
+
+engine_replica = criar_engine(
+    converter_url_para_asyncpg(READ_REPLICA_URL),
+    instrumentado=False,
+    connect_args={
+        "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+        "timeout": REPLICA_TIMEOUT_DE_CONEXAO,
+    },
+) if READ_REPLICA_URL else None
 
 # Configuração do SQLAlchemy
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+SessionReplica = async_sessionmaker(
+    bind=engine_replica or engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+
+class EstadoDaReplica:
+    """
+    Saúde da réplica de leitura. Depois de uma falha, a réplica só é testada de novo após
+    REPLICA_INTERVALO_DE_VERIFICACAO segundos, para as leituras não pagarem o timeout a cada requisição.
+    """
+
+    def __init__(self):
+        self.saudavel = True
+        self.ultima_falha = 0.0
+        self.falhas = 0
+
+    def disponivel(self) -> bool:
+        return self.saudavel or time.monotonic() - self.ultima_falha >= REPLICA_INTERVALO_DE_VERIFICACAO
+
+    def registrar_falha(self, erro: Exception):
+        if self.saudavel:
+            print(f"Réplica de leitura indisponível, usando o primário: {erro}")
+        self.saudavel = False
+        self.ultima_falha = time.monotonic()
+        self.falhas += 1
+
+    def registrar_sucesso(self):
+        if not self.saudavel:
+            print("Réplica de leitura disponível novamente.")
+        self.saudavel = True
+
+
+estado_da_replica = EstadoDaReplica()
+
+
+async def inicializar_banco():
+    """
+    Testa a conexão via DATABASE_URL e, se falhar, passa a usar o conector do Google Cloud SQL.
+    """
+    global engine
     try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        print("Conexão com o banco de dados via DATABASE_URL bem-sucedida.")
+    except Exception as e:
+        print(f"Falha ao conectar usando DATABASE_URL: {e}")
+        print("Tentando conectar usando o conector do Google Cloud SQL...")
+        try:
+            await engine.dispose()
+            engine = criar_engine(
+                "postgresql+asyncpg://",  # Driver assíncrono para PostgreSQL
+                async_creator=get_connection,  # Função para criar a conexão
+            )
+            # Testa a conexão
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            SessionLocal.configure(bind=engine)
+            if engine_replica is None:
+                SessionReplica.configure(bind=engine)
+            print("Conexão com o banco de dados via Google Cloud SQL bem-sucedida.")
+        except Exception as e:
+            print(f"Falha ao conectar usando o conector do Google Cloud SQL: {e}")
+            raise
+
+    if engine_replica is not None:
+        try:
+            async with engine_replica.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            print("Conexão com a réplica de leitura bem-sucedida.")
+        except Exception as e:
+            estado_da_replica.registrar_falha(e)
+
+
+async def encerrar_banco():
+    await engine.dispose()
+    if engine_replica is not None:
+        await engine_replica.dispose()
+    if connector is not None:
+        await connector.close_async()
+
+
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+
+@asynccontextmanager
+async def abrir_sessao_de_leitura():
+    """
+    Sessão para consultas só de leitura: na réplica, se configurada e saudável; senão, no primário.
+    A conexão é aberta já aqui para que uma réplica fora do ar caia no primário antes da consulta.
+    """
+    if engine_replica is not None and estado_da_replica.disponivel():
+        session = SessionReplica()
+        try:
+            await asyncio.wait_for(session.connection(), timeout=REPLICA_TIMEOUT_DE_CONEXAO)
+            estado_da_replica.registrar_sucesso()
+        except Exception as e:
+            await session.close()
+            estado_da_replica.registrar_falha(e)
+        else:
+            async with session:
+                yield session
+            return
+
+    async with SessionLocal() as session:
+        yield session
+
+
+async def get_db_leitura():
+    async with abrir_sessao_de_leitura() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
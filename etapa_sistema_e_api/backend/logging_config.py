@@ -1,95 +1,126 @@
-from fastapi import Request
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import atexit
+import json
 import logging
-import logging.config
 import os
-from fastapi.responses import JSONResponse
-from error_response import ErrorResponse
+import queue
+import random
+
+
+# Atributos padrão do LogRecord; o que vier fora deles (passado em extra=) vira campo no JSON
+ATRIBUTOS_DO_LOG_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Listener que escreve os logs numa thread separada; parado em encerrar_logging()
+listener = None
+
 
 class IgnoreWatchfilesFilter(logging.Filter):
     def filter(self, record):
         return "watchfiles.main" not in record.name
 
-def setup_logging():
+
+class FiltroDeAmostragem(logging.Filter):
+    """
+    Deixa passar só uma fração dos registros abaixo de WARNING; avisos e erros passam sempre.
+    """
+
+    def __init__(self, taxa: float):
+        super().__init__()
+        self.taxa = taxa
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.taxa
+
+
+class FormatadorJson(logging.Formatter):
+    def format(self, record):
+        registro = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        registro.update({
+            chave: valor for chave, valor in vars(record).items() if chave not in ATRIBUTOS_DO_LOG_RECORD
+        })
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            registro["exception"] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class QueueHandlerEstruturado(QueueHandler):
+    # O QueueHandler padrão formata a mensagem aqui e descarta os campos extras; este só resolve a mensagem
+    # e o traceback, e deixa a formatação (JSON ou texto) para o listener
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def criar_formatador():
+    if os.getenv("LOGGING_JSON", "true").lower() == "true":
+        return FormatadorJson()
+    return logging.Formatter(os.getenv('LOGGING_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+
+def criar_handlers():
     # Verifica se o logging em arquivo está habilitado via variável de ambiente
     enable_file_logging = os.getenv("ENABLE_FILE_LOGGING", "true").lower() == "true"
 
-    try:
-        handlers = {
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'default',
-                'filters': ['ignore_watchfiles'],
-            }
-        }
+    handlers = [logging.StreamHandler()]
+    if enable_file_logging:
+        try:
+            handlers.append(logging.FileHandler(os.getenv('LOGGING_FILE', '/workspace/logs.log')))
+        except OSError as e:
+            # Fallback para stdout caso o FileHandler falhe
+            print(f"Erro ao configurar o FileHandler: {e}. Usando apenas o ConsoleHandler.")
 
-        if enable_file_logging:
-            handlers['file'] = {
-                'class': 'logging.FileHandler',
-                'formatter': 'default',
-                'filename': os.getenv('LOGGING_FILE', '/workspace/logs.log'),
-                'filters': ['ignore_watchfiles'],
-            }
-
-        logging_config = {
-            'version': 1,
-            'formatters': {
-                'default': {
-                    'format': os.getenv('LOGGING_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'),
-                },
-            },
-            'filters': {
-                'ignore_watchfiles': {
-                    '()': IgnoreWatchfilesFilter,
-                },
-            },
-            'handlers': handlers,
-            'root': {
-                'level': os.getenv('LOGGING_LEVEL', 'INFO'),
-                'handlers': list(handlers.keys()),
-            },
-        }
-        logging.config.dictConfig(logging_config)
-    except OSError as e:
-        # Fallback para stdout caso o FileHandler falhe
-        print(f"Erro ao configurar o FileHandler: {e}. Usando apenas o ConsoleHandler.")
-        logging_config = {
-            'version': 1,
-            'formatters': {
-                'default': {
-                    'format': os.getenv('LOGGING_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'),
-                },
-            },
-            'filters': {
-                'ignore_watchfiles': {
-                    '()': IgnoreWatchfilesFilter,
-                },
-            },
-            'handlers': {
-                'console': {
-                    'class': 'logging.StreamHandler',
-                    'formatter': 'default',
-                    'filters': ['ignore_watchfiles'],
-                },
-            },
-            'root': {
-                'level': os.getenv('LOGGING_LEVEL', 'INFO'),
-                'handlers': ['console'],
-            },
-        }
-        logging.config.dictConfig(logging_config)
-
-async def log_exceptions_middleware(request: Request, call_next):
-    try:
-        logging.info(f"Request {request.method} {request.url} received, body: {await request.body()}")
-        response = await call_next(request)
-        logging.info(f"Request {request.method} {request.url} processed: {response.status_code}")
-        return response
-    except Exception as exc:
-        if not isinstance(exc, ErrorResponse):
-            logging.error(f"Unhandled error: {exc}", exc_info=True)
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "Erro Interno do Servidor - Tente Novamente", "error": str(exc)}
-            )
-        exc = ErrorResponse(exc.status_code, exc.message)
-        return exc.to_json_response()
\ No newline at end of file
+    formatador = criar_formatador()
+    for handler in handlers:
+        handler.setFormatter(formatador)
+        handler.addFilter(IgnoreWatchfilesFilter())
+    return handlers
+
+
+def setup_logging():
+    """
+    Os loggers só colocam os registros numa fila; um QueueListener, em outra thread, formata e escreve no
+    console e no arquivo. Assim a escrita em disco não entra no tempo das requisições.
+    """
+    global listener
+    encerrar_logging()
+
+    fila = queue.SimpleQueue()
+    listener = QueueListener(fila, *criar_handlers(), respect_handler_level=True)
+    listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandlerEstruturado(fila))
+    root.setLevel(os.getenv('LOGGING_LEVEL', 'INFO'))
+
+    # Logs por requisição (ver metricas.py) são os de maior volume; só uma fração é escrita
+    logger_de_requisicoes = logging.getLogger("api.requisicoes")
+    for filtro in list(logger_de_requisicoes.filters):
+        logger_de_requisicoes.removeFilter(filtro)
+    logger_de_requisicoes.addFilter(FiltroDeAmostragem(float(os.getenv("LOGGING_AMOSTRAGEM_REQUISICOES", "0.1"))))
+
+
+def encerrar_logging():
+    # Esvazia a fila antes de parar, para não perder os últimos registros
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+atexit.register(encerrar_logging)
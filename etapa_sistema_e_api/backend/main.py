@@ -1,6 +1,7 @@
 import os
 import platform
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -9,36 +10,62 @@ if os.getenv("ENVIRONMENT") != "production":
     load_dotenv()
 
 # Importa configurações de logging e banco de dados
-from logging_config import log_exceptions_middleware, setup_logging
-from database import engine, Base
-from routes import demonstracoes_routes, operadoras_routes
+from logging_config import encerrar_logging, setup_logging
+from metricas import MiddlewareDeDesempenho, gerar_metricas_prometheus
+from error_response import ErrorResponse
+from database import engine, Base, inicializar_banco, encerrar_banco
+from routes import demonstracoes_routes, operadoras_routes, interno_routes
+from routes.interno_routes import exigir_token_interno
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A conexão com o banco é testada (e o fallback para o Cloud SQL escolhido) dentro do event loop
+    await inicializar_banco()
+    yield
+    await encerrar_banco()
+    encerrar_logging()
 
 
 # Cria a aplicação FastAPI
-fastapi_app = FastAPI(title="Backend FastAPI com PostgreSQL")
+fastapi_app = FastAPI(title="Backend FastAPI com PostgreSQL", lifespan=lifespan)
 
 # Configura o logging
 setup_logging()
 
 # Adiciona middlewares
-fastapi_app.middleware("http")(log_exceptions_middleware)
 fastapi_app.add_middleware(
     CORSMiddleware,
     allow_origins=os.getenv("CORS_ORIGIN_WHITELIST", "*").split(","),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Adicionado por último para ficar por fora e medir a requisição inteira, inclusive o CORS
+fastapi_app.add_middleware(MiddlewareDeDesempenho)
+
+
+@fastapi_app.exception_handler(ErrorResponse)
+async def tratar_error_response(request: Request, exc: ErrorResponse):
+    return ErrorResponse(exc.status_code, exc.message).to_json_response()
 
 # Inclui as rotas
 fastapi_app.include_router(operadoras_routes.router)
 fastapi_app.include_router(demonstracoes_routes.router)
+fastapi_app.include_router(interno_routes.router)
 
 # Rota raiz
 @fastapi_app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Bem-vindo ao backend FastAPI com PostgreSQL!"}
 
+# Métricas no formato de texto do Prometheus, com o mesmo token das rotas internas
+@fastapi_app.get("/metrics", include_in_schema=False, dependencies=[Depends(exigir_token_interno)])
+async def read_metrics():
+    conteudo, tipo = gerar_metricas_prometheus()
+    return Response(content=conteudo, media_type=tipo)
+
 # Para compatibilidade com o App Engine Standard
 application = fastapi_app  # <--- Nome obrigatório
 
@@ -0,0 +1,156 @@
+from contextvars import ContextVar
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Optional
+
+import logging
+import os
+import time
+
+
+logger = logging.getLogger("api.requisicoes")
+logger_de_consultas_lentas = logging.getLogger("api.consultas_lentas")
+
+# Consultas mais lentas que o limite são registradas em api.consultas_lentas; 0 desativa
+DB_LIMITE_CONSULTA_LENTA_MS = float(os.getenv("DB_LIMITE_CONSULTA_LENTA_MS", "0"))
+
+DURACAO_DA_REQUISICAO = Histogram(
+    "api_requisicao_duracao_segundos",
+    "Tempo total da requisição, do recebimento ao último byte da resposta",
+    ["metodo", "rota", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+TEMPO_NO_BANCO = Histogram(
+    "api_requisicao_banco_segundos",
+    "Soma do tempo de execução das consultas SQL da requisição",
+    ["metodo", "rota"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CONSULTAS_POR_REQUISICAO = Histogram(
+    "api_requisicao_consultas",
+    "Quantidade de consultas SQL executadas na requisição",
+    ["metodo", "rota"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+TAMANHO_DA_RESPOSTA = Histogram(
+    "api_resposta_bytes",
+    "Tamanho do corpo da resposta",
+    ["metodo", "rota"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+)
+
+
+class MetricasDaRequisicao:
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_no_banco = 0.0
+
+
+metricas_da_requisicao: ContextVar[Optional[MetricasDaRequisicao]] = ContextVar("metricas_da_requisicao", default=None)
+
+
+# Os eventos são registrados na classe Engine, então valem para o primário, a réplica e o engine do Cloud SQL.
+# O início fica no contexto da execução, e não em conn.info: uma consulta que falha não chega ao
+# after_cursor_execute, e o início dela ficaria preso na conexão do pool enquanto ela existisse
+@event.listens_for(Engine, "before_cursor_execute")
+def antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.inicio_da_consulta = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "inicio_da_consulta", None)
+    if inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    metricas = metricas_da_requisicao.get()
+    if metricas is not None:
+        metricas.consultas += 1
+        metricas.tempo_no_banco += duracao
+    if DB_LIMITE_CONSULTA_LENTA_MS and duracao * 1000 >= DB_LIMITE_CONSULTA_LENTA_MS:
+        logger_de_consultas_lentas.warning(
+            "Consulta lenta",
+            extra={"duracao_ms": round(duracao * 1000, 1), "sql": statement[:2000]},
+        )
+
+
+def rota_da_requisicao(scope) -> str:
+    # O molde da rota (ex.: /api/operadoras/{registro_operadora}) mantém poucas séries no Prometheus
+    rota = scope.get("route")
+    return getattr(rota, "path", None) or "nao_encontrada"
+
+
+class MiddlewareDeDesempenho:
+    """
+    Middleware ASGI que mede a duração, o tempo no banco, as consultas e o tamanho da resposta de cada requisição,
+    adiciona o cabeçalho Server-Timing e transforma erros não tratados em resposta 500.
+    Não lê o corpo da requisição nem acumula o da resposta, então uploads e exportações continuam em streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metricas = MetricasDaRequisicao()
+        token = metricas_da_requisicao.set(metricas)
+        inicio = time.perf_counter()
+        estado = {"status": 500, "bytes": 0, "iniciada": False}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                estado["status"] = mensagem["status"]
+                estado["iniciada"] = True
+                # Em respostas em streaming, os tempos cobrem só o que aconteceu antes do primeiro byte
+                duracao_ms = (time.perf_counter() - inicio) * 1000
+                server_timing = (
+                    f'app;dur={duracao_ms:.1f}, '
+                    f'db;dur={metricas.tempo_no_banco * 1000:.1f};desc="{metricas.consultas} consultas"'
+                )
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"server-timing", server_timing.encode())]
+            elif mensagem["type"] == "http.response.body":
+                estado["bytes"] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception as exc:
+            logging.error(f"Unhandled error: {exc}", exc_info=True)
+            if estado["iniciada"]:
+                raise
+            resposta = JSONResponse(
+                status_code=500,
+                content={"detail": "Erro Interno do Servidor - Tente Novamente", "error": str(exc)}
+            )
+            await resposta(scope, receive, enviar)
+        finally:
+            metricas_da_requisicao.reset(token)
+            duracao = time.perf_counter() - inicio
+            metodo, rota = scope["method"], rota_da_requisicao(scope)
+            DURACAO_DA_REQUISICAO.labels(metodo, rota, str(estado["status"])).observe(duracao)
+            TEMPO_NO_BANCO.labels(metodo, rota).observe(metricas.tempo_no_banco)
+            CONSULTAS_POR_REQUISICAO.labels(metodo, rota).observe(metricas.consultas)
+            TAMANHO_DA_RESPOSTA.labels(metodo, rota).observe(estado["bytes"])
+            # Amostrado em logging_config (LOGGING_AMOSTRAGEM_REQUISICOES); só o molde da rota, sem query string
+            logger.info(
+                f"{metodo} {rota} {estado['status']}",
+                extra={
+                    "metodo": metodo,
+                    "rota": rota,
+                    "status": estado["status"],
+                    "duracao_ms": round(duracao * 1000, 1),
+                    "banco_ms": round(metricas.tempo_no_banco * 1000, 1),
+                    "consultas": metricas.consultas,
+                    "bytes": estado["bytes"],
+                },
+            )
+
+
+def gerar_metricas_prometheus():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,111 @@
+from sqlalchemy import Float, Numeric, cast, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from typing import Dict, List, Optional, Sequence
+
+import base64
+import json
+
+
+# Modos de contagem aceitos pelas listagens paginadas:
+# - primeira_pagina: conta exatamente só na primeira página (sem start_cursor); nas seguintes, total_elementos vem nulo
+# - exata: conta em toda página, como antes (um COUNT(*) extra por requisição)
+# - estimada: usa a estimativa de linhas do planejador (EXPLAIN), sem percorrer a tabela
+# - nenhuma: não conta; o total pode ser pedido depois no endpoint /contagem
+MODOS_DE_CONTAGEM = ("primeira_pagina", "exata", "estimada", "nenhuma")
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class Explicar(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) de uma consulta, com os parâmetros enviados normalmente ao driver.
+    """
+    inherit_cache = False
+
+    def __init__(self, consulta):
+        self.consulta = consulta
+
+
+@compiles(Explicar)
+def compilar_explicar(elemento, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(elemento.consulta, **kw)
+
+
+async def contar_exato(session: AsyncSession, base_query) -> int:
+    return (await session.execute(
+        select(func.count()).select_from(base_query.subquery())
+    )).scalar_one()
+
+
+async def contar_estimado(session: AsyncSession, base_query) -> int:
+    plano = (await session.execute(Explicar(base_query))).scalar_one()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]["Plan"]["Plan Rows"])
+
+
+async def contar(session: AsyncSession, base_query, contagem: str, primeira_pagina: bool) -> Optional[int]:
+    if contagem not in MODOS_DE_CONTAGEM:
+        raise ValueError(f"Modo de contagem inválido: {contagem}. Use um de {', '.join(MODOS_DE_CONTAGEM)}.")
+    if contagem == "exata" or (contagem == "primeira_pagina" and primeira_pagina):
+        return await contar_exato(session, base_query)
+    if contagem == "estimada":
+        return await contar_estimado(session, base_query)
+    return None
+
+
+def codificar_cursor(valores: Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(valores)).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, quantidade_de_colunas: int) -> List:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise CursorInvalido(f"Cursor inválido: {cursor}")
+    if not isinstance(valores, list) or len(valores) != quantidade_de_colunas:
+        raise CursorInvalido(f"Cursor inválido: {cursor}")
+    return valores
+
+
+def aplicar_cursor(query, colunas: Sequence, valores: Optional[Sequence], descendente: bool = False):
+    """
+    Ordena pelas colunas (a última precisa ser única) e, se houver cursor, continua logo após ele.
+    A comparação de linha (a, b, c) > (x, y, z) vira uma única faixa no índice com as mesmas colunas.
+    """
+    if valores is not None:
+        chave = tuple_(*colunas) if len(colunas) > 1 else colunas[0]
+        valor = tuple_(*valores) if len(colunas) > 1 else valores[0]
+        query = query.where(chave < valor if descendente else chave > valor)
+    return query.order_by(*[coluna.desc() if descendente else coluna for coluna in colunas])
+
+
+def proximo_cursor(ultimo: Dict, atributos: Sequence[str]):
+    """
+    Cursor da próxima página. Com uma coluna só, é o próprio valor (compatível com os clientes atuais);
+    com mais de uma, é a lista de valores codificada em base64.
+    """
+    valores = [ultimo[atributo] for atributo in atributos]
+    return valores[0] if len(valores) == 1 else codificar_cursor(valores)
+
+
+def colunas_da_listagem(modelo, dto) -> List:
+    """
+    Colunas do modelo com os campos do DTO de listagem, na mesma ordem. Os NUMERIC vêm como float,
+    como o DTO os serializaria, para a linha ir direto para o JSON sem passar pelo ORM nem pelo Pydantic.
+    """
+    colunas = []
+    for campo in dto.model_fields:
+        coluna = getattr(modelo, campo)
+        colunas.append(cast(coluna, Float).label(campo) if isinstance(coluna.type, Numeric) else coluna)
+    return colunas
+
+
+def linhas_como_dicts(resultado) -> List[Dict]:
+    chaves = list(resultado.keys())
+    return [dict(zip(chaves, linha)) for linha in resultado.all()]
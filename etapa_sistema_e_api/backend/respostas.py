@@ -0,0 +1,23 @@
+from fastapi import Response
+from pydantic import BaseModel
+from decimal import Decimal
+
+import orjson
+
+
+def converter_para_json(valor):
+    # Só é chamado para tipos que o orjson não serializa sozinho
+    if isinstance(valor, BaseModel):
+        return valor.model_dump(mode="json")
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor)}")
+
+
+def resposta_json(resposta: BaseModel) -> Response:
+    """
+    Serializa a resposta com o orjson direto dos campos, sem revalidar pelo response_model da rota.
+    O response_model continua na rota e define o schema do OpenAPI.
+    """
+    conteudo = {campo: getattr(resposta, campo) for campo in type(resposta).model_fields}
+    return Response(content=orjson.dumps(conteudo, default=converter_para_json), media_type="application/json")
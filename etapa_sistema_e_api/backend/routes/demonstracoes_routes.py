@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import abrir_sessao_de_leitura, get_db
 from schemas import DemonstracaoContabilDTO
 from services.demonstracoes_service import (
     get_demonstracoes,
+    contar_demonstracoes,
     get_descricoes,
     get_demonstracao_by_id,
     get_trimestres_e_anos,
     DemonstracoesResponse
 )
+from services.exportacao_service import exportar_demonstracoes, tipo_e_nome_do_arquivo, validar_exportacao
 from error_response import ErrorResponse
+from respostas import resposta_json
+from cache import responder_com_cache
 from typing import Optional, List
 
 router = APIRouter(
@@ -18,52 +23,96 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=DemonstracoesResponse)
-def read_demonstracoes(
-    session: Session = Depends(get_db),
+async def read_demonstracoes(
+    session: AsyncSession = Depends(get_db),
     limit: int = Query(10, ge=0),
-    start_cursor: Optional[int] = Query(None),
+    start_cursor: Optional[str] = Query(None),
     trimestre: Optional[int] = Query(None),
     ano: Optional[int] = Query(None),
     descricao: Optional[str] = Query(None),
     registro_operadora: Optional[str] = Query(None),
+    ordenacao: str = Query("id", description="id, periodo ou periodo_desc"),
+    contagem: str = Query("primeira_pagina", description="primeira_pagina, exata, estimada ou nenhuma"),
 ):
     try:
-        demonstracoes_response = get_demonstracoes(
-            session, limit, start_cursor, trimestre, ano, descricao, registro_operadora
-        )
-        next_cursor = demonstracoes_response.demonstracoes[-1].id if demonstracoes_response.demonstracoes else None
-        return DemonstracoesResponse(
-            demonstracoes=demonstracoes_response.demonstracoes,
-            next_cursor=next_cursor,
-            total_elementos=demonstracoes_response.total_elementos,
-        )
+        return resposta_json(await get_demonstracoes(
+            session, limit, start_cursor, trimestre, ano, descricao, registro_operadora, ordenacao, contagem
+        ))
+    except ValueError as e:
+        raise ErrorResponse(400, str(e))
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao listar demonstrações contábeis: {str(e)}")
 
 
+@router.get("/contagem", response_model=dict)
+async def read_contagem_demonstracoes(
+    session: AsyncSession = Depends(get_db),
+    trimestre: Optional[int] = Query(None),
+    ano: Optional[int] = Query(None),
+    descricao: Optional[str] = Query(None),
+    registro_operadora: Optional[str] = Query(None),
+    estimada: bool = Query(False),
+):
+    try:
+        total_elementos = await contar_demonstracoes(session, trimestre, ano, descricao, registro_operadora, estimada)
+        return {"total_elementos": total_elementos, "estimada": estimada}
+    except Exception as e:
+        raise ErrorResponse(500, f"Erro ao contar demonstrações contábeis: {str(e)}")
+
+
+@router.get("/export")
+async def export_demonstracoes(
+    formato: str = Query("csv", description="csv, ndjson ou parquet"),
+    compressao: Optional[str] = Query(None, description="gzip ou zstd"),
+    trimestre: Optional[int] = Query(None),
+    ano: Optional[int] = Query(None),
+    descricao: Optional[str] = Query(None),
+    registro_operadora: Optional[str] = Query(None),
+):
+    try:
+        validar_exportacao(formato, compressao)
+    except ValueError as e:
+        raise ErrorResponse(400, str(e))
+
+    # A sessão (na réplica de leitura, se houver) é aberta dentro do gerador para continuar viva enquanto a resposta é enviada
+    async def gerar_arquivo():
+        async with abrir_sessao_de_leitura() as session:
+            async for pedaco in exportar_demonstracoes(
+                session, formato, compressao, trimestre, ano, descricao, registro_operadora
+            ):
+                yield pedaco
+
+    tipo, nome_do_arquivo = tipo_e_nome_do_arquivo(formato, compressao)
+    return StreamingResponse(
+        gerar_arquivo(),
+        media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="{nome_do_arquivo}"'},
+    )
+
+
 @router.get("/select_descricoes", response_model=List[str])
-def select_descricoes(session: Session = Depends(get_db)):
+async def select_descricoes(request: Request, session: AsyncSession = Depends(get_db)):
     try:
-        return get_descricoes(session)
+        return await responder_com_cache(request, "descricoes", lambda: get_descricoes(session))
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao buscar descrições: {str(e)}")
 
 
 @router.get("/select_trimestres_e_anos", response_model=List[dict])
-def select_trimestres_e_anos(session: Session = Depends(get_db)):
+async def select_trimestres_e_anos(request: Request, session: AsyncSession = Depends(get_db)):
     try:
-        return get_trimestres_e_anos(session)
+        return await responder_com_cache(request, "trimestres_e_anos", lambda: get_trimestres_e_anos(session))
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao buscar trimestres e anos: {str(e)}")
 
 
 @router.get("/{id}", response_model=DemonstracaoContabilDTO)
-def read_demonstracao(
+async def read_demonstracao(
     id: int,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
 ):
     try:
-        demonstracao = get_demonstracao_by_id(session, id)
+        demonstracao = await get_demonstracao_by_id(session, id)
         if not demonstracao:
             raise ErrorResponse(404, f"Demonstração contábil com ID {id} não encontrada.")
         return demonstracao
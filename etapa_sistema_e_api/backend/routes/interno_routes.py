@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Header
+from database import obter_metricas_do_pool
+from cache import invalidar_cache
+from error_response import ErrorResponse
+from typing import Optional
+
+import hmac
+import os
+
+# As rotas internas exigem o mesmo valor no cabeçalho X-Token-Invalidacao; sem ele definido, recusam tudo
+CACHE_TOKEN_INVALIDACAO = os.getenv("CACHE_TOKEN_INVALIDACAO")
+
+
+def exigir_token_interno(x_token_invalidacao: Optional[str] = Header(None)):
+    if not CACHE_TOKEN_INVALIDACAO:
+        raise ErrorResponse(403, "Rotas internas desativadas: CACHE_TOKEN_INVALIDACAO não definido.")
+    # Comparação em tempo constante, para o tempo da resposta não revelar o token aos poucos
+    if x_token_invalidacao is None or not hmac.compare_digest(
+        x_token_invalidacao.encode(), CACHE_TOKEN_INVALIDACAO.encode()
+    ):
+        raise ErrorResponse(403, "Token interno inválido.")
+
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Interno"],
+    include_in_schema=False,
+    dependencies=[Depends(exigir_token_interno)],
+)
+
+
+@router.get("/pool")
+async def read_metricas_do_pool():
+    return obter_metricas_do_pool()
+
+
+@router.post("/cache/invalidar")
+async def invalidar():
+    await invalidar_cache()
+    return {"message": "Cache invalidado."}
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from database import get_db
-from schemas import OperadoraAtivaDTO, OperadoraAtivaDespesaDTO
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_db_leitura
+from schemas import OperadoraAtivaDTO, OperadoraAtivaDespesaDTO, OperadoraAtivaDespesaAnualDTO
 from services.operadoras_service import (
     get_operadoras,
+    contar_operadoras,
     get_operadora_by_registro,
     get_maiores_despesas_trimestre,
     get_maiores_despesas_ano,
@@ -13,6 +14,8 @@ from services.operadoras_service import (
     OperadorasResponse
 )
 from error_response import ErrorResponse
+from respostas import resposta_json
+from cache import responder_com_cache
 from typing import Optional, List
 
 router = APIRouter(
@@ -22,8 +25,8 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=OperadorasResponse)
-def read_operadoras(
-    session: Session = Depends(get_db),
+async def read_operadoras(
+    session: AsyncSession = Depends(get_db),
     limit: int = Query(10, ge=0),
     start_cursor: Optional[str] = Query(None),
     registro_operadora: Optional[str] = Query(None),
@@ -34,9 +37,10 @@ def read_operadoras(
     regiao_de_comercializacao: Optional[int] = Query(None),
     cidade: Optional[str] = Query(None),
     uf: Optional[str] = Query(None),
+    contagem: str = Query("primeira_pagina", description="primeira_pagina, exata, estimada ou nenhuma"),
 ):
     try:
-        operadoras_response = get_operadoras(
+        return resposta_json(await get_operadoras(
             session=session,
             limit=limit,
             start_cursor=start_cursor,
@@ -48,44 +52,74 @@ def read_operadoras(
             regiao_de_comercializacao=regiao_de_comercializacao,
             cidade=cidade,
             uf=uf,
-        )
-        next_cursor = operadoras_response.operadoras[-1].registro_operadora if operadoras_response.operadoras else None
-        return OperadorasResponse(
-            operadoras=operadoras_response.operadoras,
-            next_cursor=next_cursor,
-            total_elementos=operadoras_response.total_elementos,
-        )
+            contagem=contagem,
+        ))
+    except ValueError as e:
+        raise ErrorResponse(400, str(e))
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao listar operadoras: {str(e)}")
 
 
+@router.get("/contagem", response_model=dict)
+async def read_contagem_operadoras(
+    session: AsyncSession = Depends(get_db),
+    registro_operadora: Optional[str] = Query(None),
+    cnpj: Optional[str] = Query(None),
+    razao_social: Optional[str] = Query(None),
+    nome_fantasia: Optional[str] = Query(None),
+    modalidade: Optional[str] = Query(None),
+    regiao_de_comercializacao: Optional[int] = Query(None),
+    cidade: Optional[str] = Query(None),
+    uf: Optional[str] = Query(None),
+    estimada: bool = Query(False),
+):
+    try:
+        total_elementos = await contar_operadoras(
+            session=session,
+            registro_operadora=registro_operadora,
+            cnpj=cnpj,
+            razao_social=razao_social,
+            nome_fantasia=nome_fantasia,
+            modalidade=modalidade,
+            regiao_de_comercializacao=regiao_de_comercializacao,
+            cidade=cidade,
+            uf=uf,
+            estimada=estimada,
+        )
+        return {"total_elementos": total_elementos, "estimada": estimada}
+    except Exception as e:
+        raise ErrorResponse(500, f"Erro ao contar operadoras: {str(e)}")
+
+
 @router.get("/maiores_despesas_trimestre", response_model=List[OperadoraAtivaDespesaDTO])
-def maiores_despesas_trimestre(
+async def maiores_despesas_trimestre(
     descricao: Optional[str] = None,
     trimestre: Optional[int] = None,
     ano: Optional[int] = None,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db_leitura),
 ):
     try:
         if not descricao:
             raise ErrorResponse(400, "O parâmetro 'descricao' é obrigatório.")
-        return get_maiores_despesas_trimestre(session, descricao, trimestre, ano)
+        return await get_maiores_despesas_trimestre(session, descricao, trimestre, ano)
     except ErrorResponse as e:
         raise e
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao buscar maiores despesas no trimestre: {str(e)}")
 
 
-@router.get("/maiores_despesas_ano", response_model=List[OperadoraAtivaDespesaDTO])
-def maiores_despesas_ano(
+@router.get("/maiores_despesas_ano", response_model=List[OperadoraAtivaDespesaAnualDTO])
+async def maiores_despesas_ano(
     descricao: Optional[str] = None,
     ano: Optional[int] = None,
-    session: Session = Depends(get_db),
+    top_n: int = Query(10, ge=1, le=100),
+    por_trimestre: bool = Query(False, description="Inclui o total de cada trimestre do ano"),
+    session: AsyncSession = Depends(get_db_leitura),
 ):
     try:
         if not descricao:
             raise ErrorResponse(400, "O parâmetro 'descricao' é obrigatório.")
-        return get_maiores_despesas_ano(session, descricao, ano)
+        return await get_maiores_despesas_ano(session, descricao, ano, top_n, por_trimestre)
     except ErrorResponse as e:
         raise e
     except Exception as e:
@@ -93,25 +127,33 @@ def maiores_despesas_ano(
 
 
 @router.get("/select_ufs", response_model=List[str])
-def select_ufs(session: Session = Depends(get_db)):
+async def select_ufs(request: Request, session: AsyncSession = Depends(get_db)):
     try:
-        return get_ufs(session)
+        return await responder_com_cache(request, "ufs", lambda: get_ufs(session))
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao buscar UFs: {str(e)}")
 
 
 @router.get("/select_modalidades", response_model=List[str])
-def select_modalidades(session: Session = Depends(get_db)):
+async def select_modalidades(request: Request, session: AsyncSession = Depends(get_db)):
     try:
-        return get_modalidades(session)
+        return await responder_com_cache(request, "modalidades", lambda: get_modalidades(session))
     except Exception as e:
         raise ErrorResponse(500, f"Erro ao buscar modalidades: {str(e)}")
 
 
 @router.get("/{registro_operadora}", response_model=OperadoraAtivaDTO)
-def read_operadora(registro_operadora: str, session: Session = Depends(get_db)):
+async def read_operadora(
+    registro_operadora: str,
+    session: AsyncSession = Depends(get_db),
+    limite_demonstracoes: int = Query(0, ge=0, description="Quantidade de ids de demonstrações; 0 retorna todos"),
+    cursor_demonstracoes: Optional[int] = Query(None),
+    apenas_contagem: bool = Query(False, description="Retorna só o total de demonstrações, sem os ids"),
+):
     try:
-        operadora = get_operadora_by_registro(session, registro_operadora)
+        operadora = await get_operadora_by_registro(
+            session, registro_operadora, limite_demonstracoes, cursor_demonstracoes, apenas_contagem
+        )
         if not operadora:
             raise ErrorResponse(404, f"Operadora com registro {registro_operadora} não encontrada.")
         return OperadoraAtivaDTO.model_validate(operadora)
@@ -61,8 +61,19 @@ class OperadoraAtivaDespesaDTO(OperadoraAtivaBase):
     class Config:
         from_attributes = True
 
+class DespesaPorTrimestreDTO(BaseModel):
+    trimestre: int
+    total_de_despesa: float
+
+class OperadoraAtivaDespesaAnualDTO(OperadoraAtivaDespesaDTO):
+    despesas_por_trimestre: Optional[List[DespesaPorTrimestreDTO]] = None
+    class Config:
+        from_attributes = True
+
 class OperadoraAtivaDTO(OperadoraAtivaBase):
     demonstracoes_contabeis: List[int] = []
+    total_demonstracoes: Optional[int] = None
+    next_cursor_demonstracoes: Optional[int] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -1,75 +1,134 @@
 from pydantic import BaseModel
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from sqlalchemy.sql import func
 from models import DemonstracaoContabil
+from paginacao import (
+    CursorInvalido, aplicar_cursor, colunas_da_listagem, contar, contar_estimado, contar_exato, decodificar_cursor,
+    linhas_como_dicts, proximo_cursor
+)
 from schemas import DemonstracaoContabilListagemDTO, DemonstracaoContabilDTO
-from typing import List, Optional
+from typing import List, Optional, Union
 
 
 class DemonstracoesResponse(BaseModel):
     demonstracoes: List[DemonstracaoContabilListagemDTO]
-    next_cursor: Optional[int]
-    total_elementos: int
+    next_cursor: Optional[Union[int, str]]
+    total_elementos: Optional[int]
 
-def get_demonstracoes(
-    session: Session,
-    limit: int,
-    start_cursor: Optional[int],
+
+# Ordenações da listagem: colunas do cursor (a última é única) e direção
+ORDENACOES_DEMONSTRACOES = {
+    "id": (("id",), False),
+    "periodo": (("ano", "trimestre", "id"), False),
+    "periodo_desc": (("ano", "trimestre", "id"), True),
+}
+
+
+def filtrar_demonstracoes(
     trimestre: Optional[int],
     ano: Optional[int],
     descricao: Optional[str],
     registro_operadora: Optional[str],
-) -> DemonstracoesResponse:
-    base_query = session.query(DemonstracaoContabil)
+):
+    base_query = select(DemonstracaoContabil)
 
     if trimestre:
-        base_query = base_query.filter(DemonstracaoContabil.trimestre == trimestre)
+        base_query = base_query.where(DemonstracaoContabil.trimestre == trimestre)
     if ano:
-        base_query = base_query.filter(DemonstracaoContabil.ano == ano)
+        base_query = base_query.where(DemonstracaoContabil.ano == ano)
     if descricao:
-        base_query = base_query.filter(func.unaccent(DemonstracaoContabil.descricao).ilike(func.unaccent(f"%{descricao}%")))
+        base_query = base_query.where(func.unaccent_imutavel(DemonstracaoContabil.descricao).ilike(func.unaccent_imutavel(f"%{descricao}%")))
     if registro_operadora:
-        base_query = base_query.filter(DemonstracaoContabil.registro_operadora == registro_operadora)
+        base_query = base_query.where(DemonstracaoContabil.registro_operadora == registro_operadora)
+    return base_query
+
 
-    total_elementos = base_query.count()
-    if start_cursor:
-        base_query = base_query.filter(DemonstracaoContabil.id > start_cursor)
+def ler_cursor_demonstracoes(start_cursor: Optional[Union[int, str]], atributos) -> Optional[list]:
+    if start_cursor is None or start_cursor == "":
+        return None
+    if len(atributos) > 1:
+        return decodificar_cursor(str(start_cursor), len(atributos))
+    try:
+        return [int(start_cursor)]
+    except ValueError:
+        raise CursorInvalido(f"Cursor inválido: {start_cursor}")
 
-    query = base_query.order_by(DemonstracaoContabil.id)
+
+async def get_demonstracoes(
+    session: AsyncSession,
+    limit: int,
+    start_cursor: Optional[Union[int, str]],
+    trimestre: Optional[int],
+    ano: Optional[int],
+    descricao: Optional[str],
+    registro_operadora: Optional[str],
+    ordenacao: str = "id",
+    contagem: str = "primeira_pagina",
+) -> DemonstracoesResponse:
+    if ordenacao not in ORDENACOES_DEMONSTRACOES:
+        raise ValueError(f"Ordenação inválida: {ordenacao}. Use uma de {', '.join(ORDENACOES_DEMONSTRACOES)}.")
+    atributos, descendente = ORDENACOES_DEMONSTRACOES[ordenacao]
+    cursor = ler_cursor_demonstracoes(start_cursor, atributos)
+
+    base_query = filtrar_demonstracoes(trimestre, ano, descricao, registro_operadora)
+    total_elementos = await contar(session, base_query, contagem, primeira_pagina=cursor is None)
+
+    colunas = [getattr(DemonstracaoContabil, atributo) for atributo in atributos]
+    query = aplicar_cursor(base_query, colunas, cursor, descendente)
     if limit > 0:
         query = query.limit(limit)
 
-    demonstracoes = query.all()
+    query = query.with_only_columns(*colunas_da_listagem(DemonstracaoContabil, DemonstracaoContabilListagemDTO))
+    demonstracoes = linhas_como_dicts(await session.execute(query))
 
-    next_cursor = demonstracoes[-1].id if len(demonstracoes) == limit else None
+    next_cursor = proximo_cursor(demonstracoes[-1], atributos) if demonstracoes and len(demonstracoes) == limit else None
 
-    return DemonstracoesResponse(
-        demonstracoes=[DemonstracaoContabilListagemDTO.model_validate(demo) for demo in demonstracoes],
+    # As linhas já têm os campos e tipos do DTO; model_construct evita validar cada uma de novo
+    return DemonstracoesResponse.model_construct(
+        demonstracoes=demonstracoes,
         next_cursor=next_cursor,
         total_elementos=total_elementos
     )
 
-def get_demonstracao_by_id(session: Session, id: int) -> Optional[DemonstracaoContabilDTO]:
-    demonstracao = session.query(DemonstracaoContabil).options(
-        joinedload(DemonstracaoContabil.operadora)
-    ).filter(DemonstracaoContabil.id == id).first()
+
+async def contar_demonstracoes(
+    session: AsyncSession,
+    trimestre: Optional[int],
+    ano: Optional[int],
+    descricao: Optional[str],
+    registro_operadora: Optional[str],
+    estimada: bool = False,
+) -> int:
+    base_query = filtrar_demonstracoes(trimestre, ano, descricao, registro_operadora)
+    if estimada:
+        return await contar_estimado(session, base_query)
+    return await contar_exato(session, base_query)
+
+async def get_demonstracao_by_id(session: AsyncSession, id: int) -> Optional[DemonstracaoContabilDTO]:
+    demonstracao = (await session.execute(
+        select(DemonstracaoContabil).options(
+            joinedload(DemonstracaoContabil.operadora)
+        ).where(DemonstracaoContabil.id == id)
+    )).scalars().first()
 
     if demonstracao:
         return DemonstracaoContabilDTO.model_validate(demonstracao)
     return None
 
 
-def get_descricoes(session: Session) -> List[str]:
-    query = session.query(DemonstracaoContabil.descricao).distinct().order_by(DemonstracaoContabil.descricao)
-    return [descricao for descricao, in query.all()]
+async def get_descricoes(session: AsyncSession) -> List[str]:
+    query = select(DemonstracaoContabil.descricao).distinct().order_by(DemonstracaoContabil.descricao)
+    return [descricao for descricao, in (await session.execute(query)).all()]
 
 
-def get_trimestres_e_anos(session: Session) -> List[dict]:
-    query = session.query(
+async def get_trimestres_e_anos(session: AsyncSession) -> List[dict]:
+    query = select(
         DemonstracaoContabil.trimestre,
         DemonstracaoContabil.ano
     ).distinct().order_by(
         DemonstracaoContabil.ano,
         DemonstracaoContabil.trimestre
     )
-    return [{"trimestre": trimestre, "ano": ano} for trimestre, ano in query.all()]
\ No newline at end of file
+    return [{"trimestre": trimestre, "ano": ano} for trimestre, ano in (await session.execute(query)).all()]
\ No newline at end of file
@@ -0,0 +1,228 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import DemonstracaoContabil
+from services.demonstracoes_service import filtrar_demonstracoes
+from datetime import date
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional
+
+import csv
+import io
+import json
+import zlib
+
+
+FORMATOS_DE_EXPORTACAO = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+COMPRESSOES_DE_EXPORTACAO = {
+    None: (None, ""),
+    "gzip": ("application/gzip", ".gz"),
+    "zstd": ("application/zstd", ".zst"),
+}
+# Linhas buscadas por vez no cursor do servidor; cada lote vira um pedaço da resposta (ou um row group no Parquet)
+LINHAS_POR_LOTE = 10000
+
+COLUNAS_EXPORTADAS = [coluna.name for coluna in DemonstracaoContabil.__table__.columns]
+
+
+def validar_exportacao(formato: str, compressao: Optional[str]):
+    if formato not in FORMATOS_DE_EXPORTACAO:
+        raise ValueError(f"Formato inválido: {formato}. Use um de {', '.join(FORMATOS_DE_EXPORTACAO)}.")
+    if compressao not in COMPRESSOES_DE_EXPORTACAO:
+        raise ValueError(f"Compressão inválida: {compressao}. Use gzip ou zstd.")
+
+
+def tipo_e_nome_do_arquivo(formato: str, compressao: Optional[str]):
+    """
+    Retorna o media type e o nome do arquivo baixado. No Parquet a compressão é feita dentro do arquivo,
+    nas colunas, e o arquivo continua sendo um .parquet.
+    """
+    tipo, extensao = FORMATOS_DE_EXPORTACAO[formato]
+    if formato == "parquet" or compressao is None:
+        return tipo, f"demonstracoes.{extensao}"
+    tipo_comprimido, sufixo = COMPRESSOES_DE_EXPORTACAO[compressao]
+    return tipo_comprimido, f"demonstracoes.{extensao}{sufixo}"
+
+
+def converter_valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor)}")
+
+
+class CodificadorCsv:
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.escritor = csv.writer(self.buffer, lineterminator="\n")
+        self.escritor.writerow(COLUNAS_EXPORTADAS)
+
+    def _esvaziar(self) -> bytes:
+        dados = self.buffer.getvalue().encode("utf-8")
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return dados
+
+    def codificar(self, linhas: List) -> bytes:
+        self.escritor.writerows(linhas)
+        return self._esvaziar()
+
+    def finalizar(self) -> bytes:
+        return self._esvaziar()
+
+
+class CodificadorNdjson:
+    def codificar(self, linhas: List) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(COLUNAS_EXPORTADAS, linha)), default=converter_valor_json, ensure_ascii=False) + "\n"
+            for linha in linhas
+        ).encode("utf-8")
+
+    def finalizar(self) -> bytes:
+        return b""
+
+
+class SaidaEmPedacos:
+    """
+    Arquivo só de escrita que guarda os bytes até o próximo esvaziar(), para o ParquetWriter escrever direto na resposta.
+    """
+
+    def __init__(self):
+        self.pedacos = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados) -> int:
+        dados = bytes(dados)
+        self.pedacos.append(dados)
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def esvaziar(self) -> bytes:
+        dados = b"".join(self.pedacos)
+        self.pedacos = []
+        return dados
+
+
+class CodificadorParquet:
+    def __init__(self, compressao: Optional[str]):
+        # Importado só aqui para o pyarrow não pesar na inicialização das outras rotas
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.esquema = pa.schema([
+            ("id", pa.int64()),
+            ("data_demonstracao", pa.date32()),
+            ("trimestre", pa.int32()),
+            ("ano", pa.int32()),
+            ("registro_operadora", pa.string()),
+            ("cd_conta_contabil", pa.int32()),
+            ("descricao", pa.string()),
+            ("vl_saldo_inicial", pa.decimal128(15, 2)),
+            ("vl_saldo_final", pa.decimal128(15, 2)),
+        ])
+        self.saida = SaidaEmPedacos()
+        self.escritor = pq.ParquetWriter(self.saida, self.esquema, compression=compressao or "snappy")
+
+    def codificar(self, linhas: List) -> bytes:
+        colunas = list(zip(*linhas))
+        tabela = self.pa.Table.from_arrays(
+            [self.pa.array(colunas[i], type=campo.type) for i, campo in enumerate(self.esquema)],
+            schema=self.esquema,
+        )
+        self.escritor.write_table(tabela)  # Cada lote é um row group completo
+        return self.saida.esvaziar()
+
+    def finalizar(self) -> bytes:
+        self.escritor.close()
+        return self.saida.esvaziar()
+
+
+class CompressorNulo:
+    def comprimir(self, dados: bytes) -> bytes:
+        return dados
+
+    def finalizar(self) -> bytes:
+        return b""
+
+
+class CompressorGzip:
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabeçalho e rodapé gzip
+
+    def comprimir(self, dados: bytes) -> bytes:
+        return self.compressor.compress(dados)
+
+    def finalizar(self) -> bytes:
+        return self.compressor.flush()
+
+
+class CompressorZstd:
+    def __init__(self):
+        import zstandard
+
+        self.compressor = zstandard.ZstdCompressor().compressobj()
+
+    def comprimir(self, dados: bytes) -> bytes:
+        return self.compressor.compress(dados)
+
+    def finalizar(self) -> bytes:
+        return self.compressor.flush()
+
+
+def criar_codificador(formato: str, compressao: Optional[str]):
+    if formato == "parquet":
+        return CodificadorParquet(compressao), CompressorNulo()
+    codificador = CodificadorCsv() if formato == "csv" else CodificadorNdjson()
+    compressor = {None: CompressorNulo, "gzip": CompressorGzip, "zstd": CompressorZstd}[compressao]()
+    return codificador, compressor
+
+
+async def exportar_demonstracoes(
+    session: AsyncSession,
+    formato: str,
+    compressao: Optional[str],
+    trimestre: Optional[int],
+    ano: Optional[int],
+    descricao: Optional[str],
+    registro_operadora: Optional[str],
+    linhas_por_lote: int = LINHAS_POR_LOTE,
+) -> AsyncIterator[bytes]:
+    """
+    Gera o arquivo de exportação em pedaços. As linhas vêm de um cursor no servidor, lote a lote,
+    como tuplas (sem objetos do ORM nem DTOs), então a memória usada não depende do tamanho do resultado.
+    """
+    validar_exportacao(formato, compressao)
+    codificador, compressor = criar_codificador(formato, compressao)
+
+    colunas = [getattr(DemonstracaoContabil, coluna) for coluna in COLUNAS_EXPORTADAS]
+    query = (
+        filtrar_demonstracoes(trimestre, ano, descricao, registro_operadora)
+        .with_only_columns(*colunas)
+        # Segue o índice (ano, trimestre, id) partição por partição, sem ordenar o resultado inteiro
+        .order_by(DemonstracaoContabil.ano, DemonstracaoContabil.trimestre, DemonstracaoContabil.id)
+        .execution_options(yield_per=linhas_por_lote)
+    )
+
+    resultado = await session.stream(query)
+    async for lote in resultado.partitions(linhas_por_lote):
+        dados = compressor.comprimir(codificador.codificar(lote))
+        if dados:
+            yield dados
+
+    dados = compressor.comprimir(codificador.finalizar()) + compressor.finalizar()
+    if dados:
+        yield dados
@@ -1,147 +1,239 @@
 from pydantic import BaseModel
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import ARRAY, BigInteger, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func, text
-from models import OperadoraAtiva
-from schemas import OperadoraAtivaListagemDTO, OperadoraAtivaDespesaDTO, OperadoraAtivaDTO
+from models import DemonstracaoContabil, OperadoraAtiva
+from paginacao import aplicar_cursor, colunas_da_listagem, contar, contar_estimado, contar_exato, linhas_como_dicts
+from schemas import (
+    OperadoraAtivaBase, OperadoraAtivaListagemDTO, OperadoraAtivaDespesaDTO, OperadoraAtivaDespesaAnualDTO, OperadoraAtivaDTO
+)
 from typing import List, Optional
 
 
 class OperadorasResponse(BaseModel):
     operadoras: List[OperadoraAtivaListagemDTO]
     next_cursor: Optional[str]
-    total_elementos: int
+    total_elementos: Optional[int]
 
-def get_operadoras(
-    session: Session,
-    limit: int,
+
+def filtrar_operadoras(
     registro_operadora: Optional[str],
     cnpj: Optional[str],
     razao_social: Optional[str],
     nome_fantasia: Optional[str],
     modalidade: Optional[str],
     regiao_de_comercializacao: Optional[int],
-    start_cursor: Optional[str],
     cidade: Optional[str],
     uf: Optional[str]
-) -> OperadorasResponse:
-    base_query = session.query(OperadoraAtiva)
+):
+    base_query = select(OperadoraAtiva)
 
     if registro_operadora:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.registro_operadora).ilike(func.unaccent(f"%{registro_operadora}%")))
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.registro_operadora).ilike(func.unaccent_imutavel(f"%{registro_operadora}%")))
     if cnpj:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.cnpj).ilike(func.unaccent(f"%{cnpj}%")))
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.cnpj).ilike(func.unaccent_imutavel(f"%{cnpj}%")))
     if razao_social:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.razao_social).ilike(func.unaccent(f"%{razao_social}%")))
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.razao_social).ilike(func.unaccent_imutavel(f"%{razao_social}%")))
     if nome_fantasia:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.nome_fantasia).ilike(func.unaccent(f"%{nome_fantasia}%")))
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.nome_fantasia).ilike(func.unaccent_imutavel(f"%{nome_fantasia}%")))
     if modalidade:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.modalidade).ilike(func.unaccent(f"%{modalidade}%")))
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.modalidade).ilike(func.unaccent_imutavel(f"%{modalidade}%")))
     if regiao_de_comercializacao:
-        base_query = base_query.filter(OperadoraAtiva.regiao_de_comercializacao == regiao_de_comercializacao)
+        base_query = base_query.where(OperadoraAtiva.regiao_de_comercializacao == regiao_de_comercializacao)
     if cidade:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.cidade).ilike(func.unaccent(f"%{cidade}%")))
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.cidade).ilike(func.unaccent_imutavel(f"%{cidade}%")))
     if uf:
-        base_query = base_query.filter(func.unaccent(OperadoraAtiva.uf).ilike(func.unaccent(f"%{uf}%")))
-    
-    total_elementos = base_query.count()
+        base_query = base_query.where(func.unaccent_imutavel(OperadoraAtiva.uf).ilike(func.unaccent_imutavel(f"%{uf}%")))
+    return base_query
 
-    if start_cursor:
-        base_query = base_query.filter(OperadoraAtiva.registro_operadora > start_cursor)
 
-    query = base_query.order_by(OperadoraAtiva.registro_operadora)
+async def get_operadoras(
+    session: AsyncSession,
+    limit: int,
+    registro_operadora: Optional[str],
+    cnpj: Optional[str],
+    razao_social: Optional[str],
+    nome_fantasia: Optional[str],
+    modalidade: Optional[str],
+    regiao_de_comercializacao: Optional[int],
+    start_cursor: Optional[str],
+    cidade: Optional[str],
+    uf: Optional[str],
+    contagem: str = "primeira_pagina",
+) -> OperadorasResponse:
+    base_query = filtrar_operadoras(
+        registro_operadora, cnpj, razao_social, nome_fantasia, modalidade, regiao_de_comercializacao, cidade, uf
+    )
+    total_elementos = await contar(session, base_query, contagem, primeira_pagina=not start_cursor)
+
+    query = aplicar_cursor(base_query, [OperadoraAtiva.registro_operadora], [start_cursor] if start_cursor else None)
     if limit > 0:
         query = query.limit(limit)
 
-    operadoras = query.all()
+    query = query.with_only_columns(*colunas_da_listagem(OperadoraAtiva, OperadoraAtivaListagemDTO))
+    operadoras = linhas_como_dicts(await session.execute(query))
 
-    next_cursor = operadoras[-1].registro_operadora if len(operadoras) == limit else None
+    next_cursor = operadoras[-1]["registro_operadora"] if operadoras and len(operadoras) == limit else None
 
-    return OperadorasResponse(
-        operadoras=[OperadoraAtivaListagemDTO.model_validate(op) for op in operadoras],
+    # As linhas já têm os campos e tipos do DTO; model_construct evita validar cada uma de novo
+    return OperadorasResponse.model_construct(
+        operadoras=operadoras,
         next_cursor=next_cursor,
         total_elementos=total_elementos
     )
 
 
-def get_operadora_by_registro(session: Session, registro_operadora: str):
-    operadora = session.query(OperadoraAtiva).options(
-        joinedload(OperadoraAtiva.demonstracoes_contabeis)
-    ).filter(OperadoraAtiva.registro_operadora == registro_operadora).first()
-
-    if operadora:
-        demonstracoes_ids = [demonstracao.id for demonstracao in operadora.demonstracoes_contabeis]
-        
-        operadora_data = operadora.__dict__.copy()
-        operadora_data["demonstracoes_contabeis"] = demonstracoes_ids
-        
-        return OperadoraAtivaDTO(**operadora_data)
-
-    return None
-
-
-def get_maiores_despesas_trimestre(
-    session: Session,
+async def contar_operadoras(
+    session: AsyncSession,
+    registro_operadora: Optional[str],
+    cnpj: Optional[str],
+    razao_social: Optional[str],
+    nome_fantasia: Optional[str],
+    modalidade: Optional[str],
+    regiao_de_comercializacao: Optional[int],
+    cidade: Optional[str],
+    uf: Optional[str],
+    estimada: bool = False,
+) -> int:
+    base_query = filtrar_operadoras(
+        registro_operadora, cnpj, razao_social, nome_fantasia, modalidade, regiao_de_comercializacao, cidade, uf
+    )
+    if estimada:
+        return await contar_estimado(session, base_query)
+    return await contar_exato(session, base_query)
+
+
+async def get_operadora_by_registro(
+    session: AsyncSession,
+    registro_operadora: str,
+    limite_demonstracoes: int = 0,
+    cursor_demonstracoes: Optional[int] = None,
+    apenas_contagem: bool = False,
+) -> Optional[OperadoraAtivaDTO]:
+    """
+    Busca a operadora com os ids das suas demonstrações numa única consulta. Os ids vêm de um array_agg
+    sobre o índice (registro_operadora, id), sem carregar as demonstrações inteiras.
+    Com limite_demonstracoes, os ids são paginados a partir de cursor_demonstracoes;
+    com apenas_contagem, só o total é retornado.
+    """
+    colunas = [getattr(OperadoraAtiva, campo) for campo in OperadoraAtivaBase.model_fields]
+    da_operadora = DemonstracaoContabil.registro_operadora == registro_operadora
+
+    paginar = limite_demonstracoes > 0 or cursor_demonstracoes is not None
+    if apenas_contagem or paginar:
+        colunas.append(
+            select(func.count()).where(da_operadora).scalar_subquery().label("total_demonstracoes")
+        )
+    if not apenas_contagem:
+        ids = select(DemonstracaoContabil.id).where(da_operadora)
+        if cursor_demonstracoes is not None:
+            ids = ids.where(DemonstracaoContabil.id > cursor_demonstracoes)
+        ids = ids.order_by(DemonstracaoContabil.id)
+        if limite_demonstracoes > 0:
+            ids = ids.limit(limite_demonstracoes)
+        ids = ids.subquery()
+        colunas.append(
+            select(func.coalesce(func.array_agg(aggregate_order_by(ids.c.id, ids.c.id)), literal([], ARRAY(BigInteger))))
+            .scalar_subquery().label("demonstracoes_contabeis")
+        )
+
+    linha = (await session.execute(
+        select(*colunas).where(OperadoraAtiva.registro_operadora == registro_operadora)
+    )).mappings().first()
+
+    if linha is None:
+        return None
+
+    operadora_data = dict(linha)
+    operadora_data.setdefault("demonstracoes_contabeis", [])
+    if limite_demonstracoes > 0 and len(operadora_data["demonstracoes_contabeis"]) == limite_demonstracoes:
+        operadora_data["next_cursor_demonstracoes"] = operadora_data["demonstracoes_contabeis"][-1]
+    return OperadoraAtivaDTO(**operadora_data)
+
+
+async def get_maiores_despesas_trimestre(
+    session: AsyncSession,
     descricao: str,
     trimestre: Optional[int],
     ano: Optional[int],
 ) -> List[OperadoraAtivaDespesaDTO]:
     if not trimestre or not ano:
-        trimestre_ano_query = session.execute(text("SELECT * FROM obter_trimestre_anterior()")).fetchone()
+        trimestre_ano_query = (await session.execute(text("SELECT * FROM obter_trimestre_anterior()"))).fetchone()
         trimestre = trimestre or trimestre_ano_query[0]
         ano = ano or trimestre_ano_query[1]
 
+    # Lê o resumo pré-agregado por descrição, trimestre e operadora em vez de agregar demonstracoes_contabeis
     query = text("""
-        SELECT sum(dc.vl_saldo_final) as total_de_despesa, oi.*
-        FROM operadoras_ativas oi 
-        JOIN demonstracoes_contabeis dc 
-            ON oi.registro_operadora = dc.registro_operadora
+        SELECT sum(rd.total_de_despesa) as total_de_despesa, oi.*
+        FROM resumo_despesas_operadoras rd
+        JOIN operadoras_ativas oi
+            ON oi.registro_operadora = rd.registro_operadora
         WHERE 
-            unaccent(dc.descricao) ILIKE unaccent(:descricao)
-            AND dc.vl_saldo_final < 0
-            AND dc.trimestre = :trimestre
-            AND dc.ano = :ano
+            rd.descricao_normalizada ILIKE unaccent_imutavel(:descricao)
+            AND rd.trimestre = :trimestre
+            AND rd.ano = :ano
         GROUP BY oi.registro_operadora
         ORDER BY total_de_despesa ASC
         LIMIT 10;
     """)
-    result = session.execute(query, {"descricao": f"%{descricao}%", "trimestre": trimestre, "ano": ano}).fetchall()
+    result = (await session.execute(query, {"descricao": f"%{descricao}%", "trimestre": trimestre, "ano": ano})).fetchall()
 
     return [OperadoraAtivaDespesaDTO.model_validate(row) for row in result]
 
 
-def get_maiores_despesas_ano(
-    session: Session,
+async def get_maiores_despesas_ano(
+    session: AsyncSession,
     descricao: str,
     ano: Optional[int],
-) -> List[OperadoraAtivaDespesaDTO]:
+    top_n: int = 10,
+    por_trimestre: bool = False,
+) -> List[OperadoraAtivaDespesaAnualDTO]:
     if not ano:
-        ano = session.execute(text("SELECT obter_ano_anterior()")).scalar()
-
-    query = text("""
-        SELECT sum(dc.vl_saldo_final) as total_de_despesa, oi.*
-        FROM operadoras_ativas oi 
-        JOIN demonstracoes_contabeis dc 
-            ON oi.registro_operadora = dc.registro_operadora
-        WHERE 
-            unaccent(dc.descricao) ILIKE unaccent(:descricao)
-            AND dc.vl_saldo_final < 0
-            AND dc.ano = :ano
-        GROUP BY oi.registro_operadora, dc.vl_saldo_final
-        ORDER BY dc.vl_saldo_final
-        LIMIT 10;
+        ano = (await session.execute(text("SELECT obter_ano_anterior()"))).scalar()
+
+    # Filtra o resumo pelo ano e pela descrição, soma por operadora e só então junta as top_n vencedoras
+    # com operadoras_ativas, em vez de juntar todas as linhas e agrupar pelas colunas da operadora
+    despesas_por_trimestre = """
+            (
+                SELECT json_agg(json_build_object('trimestre', d.trimestre, 'total_de_despesa', d.total_de_despesa) ORDER BY d.trimestre)
+                FROM despesas d
+                WHERE d.registro_operadora = r.registro_operadora
+            )""" if por_trimestre else "NULL"
+    query = text(f"""
+        WITH despesas AS MATERIALIZED (
+            SELECT rd.registro_operadora, rd.trimestre, sum(rd.total_de_despesa) AS total_de_despesa
+            FROM resumo_despesas_operadoras rd
+            WHERE
+                rd.ano = :ano
+                AND rd.descricao_normalizada ILIKE unaccent_imutavel(:descricao)
+            GROUP BY rd.registro_operadora, rd.trimestre
+        ),
+        ranking AS (
+            SELECT registro_operadora, sum(total_de_despesa) AS total_de_despesa
+            FROM despesas
+            GROUP BY registro_operadora
+            ORDER BY total_de_despesa ASC
+            LIMIT :top_n
+        )
+        SELECT r.total_de_despesa, {despesas_por_trimestre} AS despesas_por_trimestre, oi.*
+        FROM ranking r
+        JOIN operadoras_ativas oi
+            ON oi.registro_operadora = r.registro_operadora
+        ORDER BY r.total_de_despesa ASC;
     """)
-    result = session.execute(query, {"descricao": f"%{descricao}%", "ano": ano}).fetchall()
-    return [OperadoraAtivaDespesaDTO.model_validate(row) for row in result]
+    result = (await session.execute(query, {"descricao": f"%{descricao}%", "ano": ano, "top_n": top_n})).fetchall()
+    return [OperadoraAtivaDespesaAnualDTO.model_validate(row) for row in result]
 
 
-def get_ufs(session: Session) -> List[str]:
-    query = session.query(OperadoraAtiva.uf).distinct().order_by(OperadoraAtiva.uf)
-    return [uf for uf, in query.all()]
+async def get_ufs(session: AsyncSession) -> List[str]:
+    query = select(OperadoraAtiva.uf).distinct().order_by(OperadoraAtiva.uf)
+    return [uf for uf, in (await session.execute(query)).all()]
 
-def get_modalidades(session: Session) -> List[str]:
-    query = session.query(OperadoraAtiva.modalidade).distinct().order_by(OperadoraAtiva.modalidade)
-    return [modalidade for modalidade, in query.all()]
+async def get_modalidades(session: AsyncSession) -> List[str]:
+    query = select(OperadoraAtiva.modalidade).distinct().order_by(OperadoraAtiva.modalidade)
+    return [modalidade for modalidade, in (await session.execute(query)).all()]
 
-def get_regioes_de_comercializacao(session: Session) -> List[int]:
-    query = session.query(OperadoraAtiva.regiao_de_comercializacao).distinct().order_by(OperadoraAtiva.regiao_de_comercializacao)
-    return [regiao for regiao, in query.all()]
\ No newline at end of file
+async def get_regioes_de_comercializacao(session: AsyncSession) -> List[int]:
+    query = select(OperadoraAtiva.regiao_de_comercializacao).distinct().order_by(OperadoraAtiva.regiao_de_comercializacao)
+    return [regiao for regiao, in (await session.execute(query)).all()]
\ No newline at end of file
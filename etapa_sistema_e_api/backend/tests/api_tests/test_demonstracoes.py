@@ -29,4 +29,19 @@ def test_select_trimestres_e_anos(mock_get_trimestres_e_anos):
     mock_get_trimestres_e_anos.return_value = [{"trimestre": 1, "ano": 2023}, {"trimestre": 2, "ano": 2023}]
     response = client.get("/api/demonstracoes/select_trimestres_e_anos")
     assert response.status_code == 200
-    assert response.json() == [{"trimestre": 1, "ano": 2023}, {"trimestre": 2, "ano": 2023}]
\ No newline at end of file
+    assert response.json() == [{"trimestre": 1, "ano": 2023}, {"trimestre": 2, "ano": 2023}]
+
+@patch("routes.demonstracoes_routes.contar_demonstracoes")
+def test_read_contagem_demonstracoes(mock_contar_demonstracoes):
+    mock_contar_demonstracoes.return_value = 1234
+    response = client.get("/api/demonstracoes/contagem?ano=2023&estimada=true")
+    assert response.status_code == 200
+    assert response.json() == {"total_elementos": 1234, "estimada": True}
+
+def test_read_demonstracoes_ordenacao_invalida():
+    response = client.get("/api/demonstracoes/?ordenacao=valor")
+    assert response.status_code == 400
+
+def test_export_demonstracoes_formato_invalido():
+    response = client.get("/api/demonstracoes/export?formato=xml")
+    assert response.status_code == 400
@@ -0,0 +1,46 @@
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import fastapi_app
+
+client = TestClient(fastapi_app)
+TOKEN = {"X-Token-Invalidacao": "segredo"}
+
+@patch("routes.interno_routes.CACHE_TOKEN_INVALIDACAO", "segredo")
+def test_read_metricas_do_pool():
+    assert client.get("/internal/pool").status_code == 403
+    response = client.get("/internal/pool", headers=TOKEN)
+    assert response.status_code == 200
+    metricas = response.json()
+    assert metricas["conexoes_em_uso"] == 0
+    for chave in ["tempo_medio_de_espera_ms", "eventos_de_overflow", "conexoes_criadas_no_ultimo_minuto", "timeouts"]:
+        assert chave in metricas
+
+@patch("routes.interno_routes.CACHE_TOKEN_INVALIDACAO", None)
+def test_invalidar_sem_token_configurado_e_recusado():
+    assert client.post("/internal/cache/invalidar").status_code == 403
+    assert client.post("/internal/cache/invalidar", headers={"X-Token-Invalidacao": ""}).status_code == 403
+
+@patch("routes.interno_routes.CACHE_TOKEN_INVALIDACAO", "segredo")
+def test_invalidar_com_token_errado_e_recusado():
+    assert client.post("/internal/cache/invalidar").status_code == 403
+    assert client.post("/internal/cache/invalidar", headers={"X-Token-Invalidacao": "outro"}).status_code == 403
+
+@patch("routes.interno_routes.CACHE_TOKEN_INVALIDACAO", "segredo")
+@patch("routes.operadoras_routes.get_ufs")
+def test_select_ufs_usa_cache_ate_a_invalidacao(mock_get_ufs):
+    client.post("/internal/cache/invalidar", headers=TOKEN)
+    mock_get_ufs.return_value = ["SP", "RJ"]
+    primeira = client.get("/api/operadoras/select_ufs")
+    assert primeira.headers["Cache-Control"].startswith("public")
+    revalidacao = client.get("/api/operadoras/select_ufs", headers={"If-None-Match": primeira.headers["ETag"]})
+    assert revalidacao.status_code == 304
+    assert mock_get_ufs.call_count == 1
+
+    mock_get_ufs.return_value = ["SP", "RJ", "MG"]
+    assert client.post("/internal/cache/invalidar", headers=TOKEN).status_code == 200
+    depois_da_carga = client.get("/api/operadoras/select_ufs", headers={"If-None-Match": primeira.headers["ETag"]})
+    assert depois_da_carga.status_code == 200
+    assert depois_da_carga.json() == ["SP", "RJ", "MG"]
+    assert mock_get_ufs.call_count == 2
+    client.post("/internal/cache/invalidar", headers=TOKEN)
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from main import fastapi_app
+from metricas import MiddlewareDeDesempenho
+
+client = TestClient(fastapi_app)
+
+@patch("routes.interno_routes.CACHE_TOKEN_INVALIDACAO", "segredo")
+@patch("routes.operadoras_routes.get_operadoras")
+def test_server_timing_e_metricas_por_rota(mock_get_operadoras):
+    from services.operadoras_service import OperadorasResponse
+    mock_get_operadoras.return_value = OperadorasResponse(operadoras=[], next_cursor=None, total_elementos=0)
+    response = client.get("/api/operadoras/?limit=5")
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("app;dur=")
+    assert 'db;dur=' in response.headers["server-timing"]
+
+    assert client.get("/metrics").status_code == 403
+    metricas = client.get("/metrics", headers={"X-Token-Invalidacao": "segredo"})
+    assert metricas.status_code == 200
+    assert 'api_requisicao_duracao_segundos_count{metodo="GET",rota="/api/operadoras/",status="200"}' in metricas.text
+    assert 'api_resposta_bytes_count{metodo="GET",rota="/api/operadoras/"}' in metricas.text
+
+def test_erro_nao_tratado_vira_500():
+    app = FastAPI()
+    app.add_middleware(MiddlewareDeDesempenho)
+
+    @app.get("/falha")
+    async def falha():
+        raise RuntimeError("falhou")
+
+    response = TestClient(app).get("/falha")
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Erro Interno do Servidor - Tente Novamente", "error": "falhou"}
+
+def test_consulta_com_erro_nao_conta_nem_deixa_inicio_para_a_proxima():
+    import re
+    import time
+    from prometheus_client import REGISTRY
+    from sqlalchemy import create_engine, event, text
+
+    # Os eventos de metricas valem para qualquer Engine; um sqlite em memória basta para passar por eles
+    engine = create_engine("sqlite://")
+    contextos = []
+    event.listen(engine, "before_cursor_execute", lambda *args: contextos.append(args[4]))
+    app = FastAPI()
+    app.add_middleware(MiddlewareDeDesempenho)
+
+    @app.get("/consultas")
+    async def consultas():
+        with engine.connect() as conn:
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM tabela_que_nao_existe"))
+            # Se o início da consulta que falhou ficasse para a próxima, a pausa entraria no tempo de banco
+            time.sleep(0.2)
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+            return {"info": sorted(conn.info)}
+
+    antes = REGISTRY.get_sample_value("api_requisicao_consultas_sum", {"metodo": "GET", "rota": "/consultas"}) or 0
+    response = TestClient(app).get("/consultas")
+
+    assert response.status_code == 200
+    assert response.json() == {"info": []}
+    server_timing = response.headers["server-timing"]
+    assert 'desc="1 consultas"' in server_timing
+    assert float(re.search(r"db;dur=([\d.]+)", server_timing).group(1)) < 200
+    assert REGISTRY.get_sample_value("api_requisicao_consultas_sum", {"metodo": "GET", "rota": "/consultas"}) == antes + 1
+    # Cada execução tem o próprio contexto: o início da que falhou fica no contexto dela, descartado com ela
+    assert len(contextos) == 2 and contextos[0] is not contextos[1]
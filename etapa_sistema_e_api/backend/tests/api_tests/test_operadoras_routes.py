@@ -1,4 +1,5 @@
 import pytest
+from datetime import date
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from services.operadoras_service import OperadorasResponse
@@ -44,4 +45,20 @@ def test_select_modalidades(mock_get_modalidades):
     mock_get_modalidades.return_value = ["Medicina de Grupo", "Odontologia"]
     response = client.get("/api/operadoras/select_modalidades")
     assert response.status_code == 200
-    assert response.json() == ["Medicina de Grupo", "Odontologia"]
\ No newline at end of file
+    assert response.json() == ["Medicina de Grupo", "Odontologia"]
+
+@patch("routes.operadoras_routes.get_operadoras")
+def test_read_operadoras_serializa_linhas_sem_revalidar(mock_get_operadoras):
+    linha = {"registro_operadora": "123456", "cnpj": "12345678000199", "data_registro_ans": date(2020, 1, 31)}
+    mock_get_operadoras.return_value = OperadorasResponse.model_construct(
+        operadoras=[linha],
+        next_cursor="123456",
+        total_elementos=None
+    )
+    response = client.get("/api/operadoras/?limit=1")
+    assert response.status_code == 200
+    assert response.json() == {
+        "operadoras": [{"registro_operadora": "123456", "cnpj": "12345678000199", "data_registro_ans": "2020-01-31"}],
+        "next_cursor": "123456",
+        "total_elementos": None
+    }
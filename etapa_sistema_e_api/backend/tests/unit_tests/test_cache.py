@@ -0,0 +1,23 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from cache import ArmazenamentoEmMemoria
+
+def test_armazenamento_descarta_o_menos_usado():
+    armazenamento = ArmazenamentoEmMemoria(max_entradas=2)
+    async def cenario():
+        await armazenamento.definir("a", {"corpo": "1"}, ttl=60)
+        await armazenamento.definir("b", {"corpo": "2"}, ttl=60)
+        await armazenamento.obter("a")
+        await armazenamento.definir("c", {"corpo": "3"}, ttl=60)
+        return [await armazenamento.obter(chave) for chave in ["a", "b", "c"]]
+    assert asyncio.run(cenario()) == [{"corpo": "1"}, None, {"corpo": "3"}]
+
+def test_armazenamento_expira_pelo_ttl():
+    armazenamento = ArmazenamentoEmMemoria(max_entradas=2)
+    with patch("cache.time.monotonic", return_value=100.0):
+        asyncio.run(armazenamento.definir("a", {"corpo": "1"}, ttl=10))
+    with patch("cache.time.monotonic", return_value=105.0):
+        assert asyncio.run(armazenamento.obter("a")) == {"corpo": "1"}
+    with patch("cache.time.monotonic", return_value=111.0):
+        assert asyncio.run(armazenamento.obter("a")) is None
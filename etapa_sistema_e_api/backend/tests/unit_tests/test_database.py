@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+import database
+
+
+def criar_sessao(falha=None):
+    session = MagicMock()
+    session.connection = AsyncMock(side_effect=falha)
+    session.close = AsyncMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    return session
+
+
+def abrir_sessao():
+    async def abrir():
+        async with database.abrir_sessao_de_leitura() as session:
+            return session
+    return asyncio.run(abrir())
+
+
+def test_leitura_usa_a_replica_saudavel():
+    replica, primario = criar_sessao(), criar_sessao()
+    estado = database.EstadoDaReplica()
+    with patch.object(database, "engine_replica", MagicMock()), \
+            patch.object(database, "SessionReplica", MagicMock(return_value=replica)), \
+            patch.object(database, "SessionLocal", MagicMock(return_value=primario)), \
+            patch.object(database, "estado_da_replica", estado):
+        assert abrir_sessao() is replica
+    assert estado.saudavel
+
+
+def test_leitura_cai_no_primario_e_espera_para_testar_a_replica_de_novo():
+    replica, primario = criar_sessao(falha=ConnectionRefusedError("réplica fora")), criar_sessao()
+    session_replica = MagicMock(return_value=replica)
+    estado = database.EstadoDaReplica()
+    with patch.object(database, "engine_replica", MagicMock()), \
+            patch.object(database, "SessionReplica", session_replica), \
+            patch.object(database, "SessionLocal", MagicMock(return_value=primario)), \
+            patch.object(database, "estado_da_replica", estado):
+        assert abrir_sessao() is primario
+        assert abrir_sessao() is primario
+    replica.close.assert_awaited_once()
+    assert session_replica.call_count == 1
+    assert not estado.saudavel and estado.falhas == 1
+
+
+def test_pool_mede_espera_timeouts_e_overflow():
+    # O pool assíncrono precisa de um greenlet, como dentro de uma sessão do SQLAlchemy
+    pool = database.PoolInstrumentado(creator=MagicMock, pool_size=1, max_overflow=1, timeout=0.01)
+    metricas = database.MetricasDoPool()
+
+    def usar_o_pool():
+        primeira, segunda = pool.connect(), pool.connect()
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+        primeira.close()
+        segunda.close()
+
+    with patch.object(database, "metricas_do_pool", metricas):
+        database.instrumentar_pool(MagicMock(sync_engine=MagicMock(pool=pool)))
+        asyncio.run(greenlet_spawn(usar_o_pool))
+
+    assert metricas.checkouts == 3
+    assert metricas.timeouts == 1
+    assert metricas.maior_tempo_de_espera >= 0.01
+    assert metricas.conexoes_criadas == 2
+    assert metricas.eventos_de_overflow == 1
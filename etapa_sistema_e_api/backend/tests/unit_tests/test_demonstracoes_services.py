@@ -1,23 +1,100 @@
+import asyncio
+from datetime import date
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from services.demonstracoes_service import get_demonstracoes, get_descricoes, get_trimestres_e_anos, DemonstracoesResponse
+from paginacao import CursorInvalido, decodificar_cursor
 
-def test_get_demonstracoes():
+COLUNAS_DA_LISTAGEM = [
+    "data_demonstracao", "trimestre", "ano", "registro_operadora", "cd_conta_contabil",
+    "descricao", "vl_saldo_inicial", "vl_saldo_final", "id"
+]
+
+def criar_session(resultado):
     session = MagicMock()
-    session.query.return_value.count.return_value = 0
-    session.query.return_value.filter.return_value.all.return_value = []
-    response = get_demonstracoes(session, limit=10, start_cursor=None, trimestre=None, ano=None, descricao=None, registro_operadora=None)
-    assert response.demonstracoes == []
-    assert response.total_elementos == 0
+    session.execute = AsyncMock(return_value=resultado)
+    return session
+
+def criar_resultado(linhas, total=None):
+    # O serviço lê as linhas como tuplas (keys() e all()), e o total pelo scalar_one() do COUNT(*)
+    resultado = MagicMock()
+    resultado.scalar_one.return_value = total
+    resultado.keys.return_value = COLUNAS_DA_LISTAGEM
+    resultado.all.return_value = linhas
+    return resultado
+
+def test_get_demonstracoes():
+    linhas = [
+        (date(2023, 1, 1), 1, 2023, "123456", 411, "Despesa", 0.0, -10.0, 1),
+        (date(2023, 4, 1), 2, 2023, "123456", 411, "Despesa", -10.0, -25.5, 2),
+    ]
+    session = criar_session(criar_resultado(linhas, total=2))
+    response = asyncio.run(get_demonstracoes(session, limit=10, start_cursor=None, trimestre=None, ano=None, descricao=None, registro_operadora=None))
+    assert response.demonstracoes == [dict(zip(COLUNAS_DA_LISTAGEM, linha)) for linha in linhas]
+    assert response.demonstracoes[1]["vl_saldo_final"] == -25.5
+    assert response.total_elementos == 2
+    assert response.next_cursor is None
+
+def test_get_demonstracoes_pagina_cheia_devolve_o_proximo_cursor():
+    linhas = [(date(2023, 1, 1), 1, 2023, "123456", 411, "Despesa", 0.0, -10.0, id) for id in (5, 9)]
+    session = criar_session(criar_resultado(linhas, total=3))
+    response = asyncio.run(get_demonstracoes(session, limit=2, start_cursor=None, trimestre=None, ano=None, descricao=None, registro_operadora=None))
+    assert [demonstracao["id"] for demonstracao in response.demonstracoes] == [5, 9]
+    assert response.next_cursor == 9
 
 def test_get_descricoes():
-    session = MagicMock()
-    session.query.return_value.distinct.return_value.order_by.return_value.all.return_value = [("Receita",), ("Despesa",)]
-    response = get_descricoes(session)
+    resultado = MagicMock()
+    resultado.all.return_value = [("Receita",), ("Despesa",)]
+    session = criar_session(resultado)
+    response = asyncio.run(get_descricoes(session))
     assert response == ["Receita", "Despesa"]
 
 def test_get_trimestres_e_anos():
-    session = MagicMock()
-    session.query.return_value.distinct.return_value.order_by.return_value.all.return_value = [(1, 2023), (2, 2023)]
-    response = get_trimestres_e_anos(session)
-    assert response == [{"trimestre": 1, "ano": 2023}, {"trimestre": 2, "ano": 2023}]
\ No newline at end of file
+    resultado = MagicMock()
+    resultado.all.return_value = [(1, 2023), (2, 2023)]
+    session = criar_session(resultado)
+    response = asyncio.run(get_trimestres_e_anos(session))
+    assert response == [{"trimestre": 1, "ano": 2023}, {"trimestre": 2, "ano": 2023}]
+
+def test_get_demonstracoes_filtro_descricao_usa_unaccent_imutavel():
+    session = criar_session(criar_resultado([], total=0))
+    asyncio.run(get_demonstracoes(session, limit=10, start_cursor=None, trimestre=None, ano=None, descricao="despesa", registro_operadora=None))
+    query = str(session.execute.call_args[0][0])
+    assert "unaccent_imutavel(demonstracoes_contabeis.descricao)" in query
+
+def test_get_demonstracoes_sem_contagem_apos_a_primeira_pagina():
+    linhas = [(date(2023, 1, 1), 1, 2023, "123456", 411, "Despesa", 0.0, -10.0, 21)]
+    session = criar_session(criar_resultado(linhas))
+    response = asyncio.run(get_demonstracoes(session, limit=10, start_cursor="20", trimestre=None, ano=None, descricao=None, registro_operadora=None))
+    assert [demonstracao["id"] for demonstracao in response.demonstracoes] == [21]
+    assert response.total_elementos is None
+    assert session.execute.call_count == 1
+    query = str(session.execute.call_args[0][0])
+    assert "count(" not in query
+    assert "demonstracoes_contabeis.id > " in query
+
+def test_get_demonstracoes_cursor_por_periodo():
+    session = criar_session(criar_resultado([(date(2023, 4, 1), 2, 2023, "123456", 411, "Despesa", 0.0, -10.0, 42)], total=1))
+    primeira = asyncio.run(get_demonstracoes(session, limit=1, start_cursor=None, trimestre=None, ano=None, descricao=None, registro_operadora=None, ordenacao="periodo_desc"))
+    assert decodificar_cursor(primeira.next_cursor, 3) == [2023, 2, 42]
+
+    asyncio.run(get_demonstracoes(session, limit=1, start_cursor=primeira.next_cursor, trimestre=None, ano=None, descricao=None, registro_operadora=None, ordenacao="periodo_desc"))
+    query = str(session.execute.call_args[0][0])
+    assert "(demonstracoes_contabeis.ano, demonstracoes_contabeis.trimestre, demonstracoes_contabeis.id) < " in query
+    assert "ORDER BY demonstracoes_contabeis.ano DESC, demonstracoes_contabeis.trimestre DESC, demonstracoes_contabeis.id DESC" in query
+
+def test_get_demonstracoes_cursor_invalido():
+    session = criar_session(MagicMock())
+    with pytest.raises(CursorInvalido):
+        asyncio.run(get_demonstracoes(session, limit=10, start_cursor="abc", trimestre=None, ano=None, descricao=None, registro_operadora=None, ordenacao="periodo"))
+
+def test_get_demonstracoes_seleciona_so_as_colunas_da_listagem():
+    resultado = MagicMock()
+    resultado.scalar_one.return_value = 1
+    resultado.keys.return_value = ["id"]
+    resultado.all.return_value = [(7,)]
+    session = criar_session(resultado)
+    response = asyncio.run(get_demonstracoes(session, limit=10, start_cursor=None, trimestre=None, ano=None, descricao=None, registro_operadora=None))
+    assert response.demonstracoes == [{"id": 7}]
+    query = str(session.execute.call_args[0][0])
+    assert "CAST(demonstracoes_contabeis.vl_saldo_final AS FLOAT) AS vl_saldo_final" in query
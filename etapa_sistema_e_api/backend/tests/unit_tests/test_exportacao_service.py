@@ -0,0 +1,57 @@
+import asyncio
+import gzip
+import io
+import json
+import pyarrow.parquet as pq
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+from services.exportacao_service import exportar_demonstracoes
+
+LINHAS = [
+    (1, date(2023, 1, 1), 1, 2023, "123456", 411, "Despesa", Decimal("10.00"), Decimal("-5.50")),
+    (2, date(2023, 1, 1), 1, 2023, "123456", 412, "Receita", None, Decimal("7.25")),
+    (3, date(2023, 4, 1), 2, 2023, "654321", 411, "Despesa", Decimal("0.00"), Decimal("-1.00")),
+]
+
+def criar_session(linhas):
+    async def partitions(tamanho):
+        for i in range(0, len(linhas), tamanho):
+            yield linhas[i:i + tamanho]
+
+    resultado = MagicMock()
+    resultado.partitions = partitions
+    session = MagicMock()
+    session.stream = AsyncMock(return_value=resultado)
+    return session
+
+def exportar(session, formato, compressao=None):
+    async def coletar():
+        return [pedaco async for pedaco in exportar_demonstracoes(
+            session, formato, compressao, trimestre=None, ano=2023, descricao=None, registro_operadora=None, linhas_por_lote=2
+        )]
+    return asyncio.run(coletar())
+
+def test_exportar_csv_gzip_em_pedacos():
+    session = criar_session(LINHAS)
+    pedacos = exportar(session, "csv", "gzip")
+    linhas = gzip.decompress(b"".join(pedacos)).decode().splitlines()
+    assert linhas[0].startswith("id,data_demonstracao,trimestre,ano")
+    assert linhas[1] == "1,2023-01-01,1,2023,123456,411,Despesa,10.00,-5.50"
+    assert len(linhas) == 4
+    query = str(session.stream.call_args[0][0])
+    assert "ORDER BY demonstracoes_contabeis.ano, demonstracoes_contabeis.trimestre, demonstracoes_contabeis.id" in query
+
+def test_exportar_ndjson():
+    pedacos = exportar(criar_session(LINHAS), "ndjson")
+    registros = [json.loads(linha) for linha in b"".join(pedacos).decode().splitlines()]
+    assert registros[1] == {
+        "id": 2, "data_demonstracao": "2023-01-01", "trimestre": 1, "ano": 2023, "registro_operadora": "123456",
+        "cd_conta_contabil": 412, "descricao": "Receita", "vl_saldo_inicial": None, "vl_saldo_final": 7.25
+    }
+
+def test_exportar_parquet_um_row_group_por_lote():
+    pedacos = exportar(criar_session(LINHAS), "parquet", "zstd")
+    arquivo = pq.ParquetFile(io.BytesIO(b"".join(pedacos)))
+    assert arquivo.metadata.num_row_groups == 2
+    assert arquivo.read().column("id").to_pylist() == [1, 2, 3]
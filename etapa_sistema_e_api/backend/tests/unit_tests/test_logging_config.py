@@ -0,0 +1,49 @@
+import json
+import logging
+from unittest.mock import patch
+import logging_config
+import metricas
+
+
+def criar_registro(nivel=logging.INFO, **extras):
+    registro = logging.LogRecord("api.requisicoes", nivel, __file__, 1, "GET %s %d", ("/api/operadoras/", 200), None)
+    for chave, valor in extras.items():
+        setattr(registro, chave, valor)
+    return registro
+
+
+def test_formatador_json_inclui_os_campos_extras():
+    registro = logging_config.QueueHandlerEstruturado(None).prepare(criar_registro(rota="/api/operadoras/", status=200))
+    saida = json.loads(logging_config.FormatadorJson().format(registro))
+    assert saida["message"] == "GET /api/operadoras/ 200"
+    assert saida["level"] == "INFO"
+    assert saida["logger"] == "api.requisicoes"
+    assert saida["rota"] == "/api/operadoras/"
+    assert saida["status"] == 200
+
+
+def test_amostragem_descarta_info_mas_mantem_avisos():
+    filtro = logging_config.FiltroDeAmostragem(0.0)
+    assert not filtro.filter(criar_registro(logging.INFO))
+    assert filtro.filter(criar_registro(logging.WARNING))
+    assert logging_config.FiltroDeAmostragem(1.0).filter(criar_registro(logging.INFO))
+
+
+def test_consulta_lenta_e_registrada_acima_do_limite():
+    class Contexto:
+        pass
+
+    contexto = Contexto()
+
+    with patch.object(metricas, "DB_LIMITE_CONSULTA_LENTA_MS", 500), \
+            patch.object(metricas.time, "perf_counter", side_effect=[10.0, 11.0]), \
+            patch.object(metricas.logger_de_consultas_lentas, "warning") as warning:
+        metricas.antes_da_consulta(None, None, "SELECT pg_sleep(1)", None, contexto, False)
+        metricas.depois_da_consulta(None, None, "SELECT pg_sleep(1)", None, contexto, False)
+    assert warning.call_args.kwargs["extra"] == {"duracao_ms": 1000.0, "sql": "SELECT pg_sleep(1)"}
+
+    with patch.object(metricas, "DB_LIMITE_CONSULTA_LENTA_MS", 0), \
+            patch.object(metricas.logger_de_consultas_lentas, "warning") as warning:
+        metricas.antes_da_consulta(None, None, "SELECT 1", None, contexto, False)
+        metricas.depois_da_consulta(None, None, "SELECT 1", None, contexto, False)
+    warning.assert_not_called()
@@ -1,23 +1,90 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock
-from services.operadoras_service import get_operadoras, get_ufs, get_modalidades, OperadorasResponse
+from unittest.mock import AsyncMock, MagicMock
+from services.operadoras_service import get_operadoras, get_operadora_by_registro, get_ufs, get_modalidades, get_maiores_despesas_trimestre, get_maiores_despesas_ano, OperadorasResponse
 
-def test_get_operadoras():
+def criar_session(resultado):
     session = MagicMock()
-    session.query.return_value.count.return_value = 0
-    session.query.return_value.filter.return_value.all.return_value = []
-    response = get_operadoras(session, limit=10, registro_operadora=None, cnpj=None, razao_social=None, nome_fantasia=None, modalidade=None, regiao_de_comercializacao=None, start_cursor=None, cidade=None, uf=None)
-    assert response.operadoras == []
-    assert response.total_elementos == 0
+    session.execute = AsyncMock(return_value=resultado)
+    return session
+
+def test_get_operadoras():
+    # O serviço lê as linhas como tuplas (keys() e all()), e o total pelo scalar_one() do COUNT(*)
+    resultado = MagicMock()
+    resultado.scalar_one.return_value = 2
+    resultado.keys.return_value = ["registro_operadora", "cnpj", "razao_social", "uf"]
+    resultado.all.return_value = [("123456", "12345678000199", "Operadora A", "SP"), ("654321", "99887766000155", "Operadora B", "RJ")]
+    session = criar_session(resultado)
+    response = asyncio.run(get_operadoras(session, limit=2, registro_operadora=None, cnpj=None, razao_social=None, nome_fantasia=None, modalidade=None, regiao_de_comercializacao=None, start_cursor=None, cidade=None, uf=None))
+    assert response.operadoras == [
+        {"registro_operadora": "123456", "cnpj": "12345678000199", "razao_social": "Operadora A", "uf": "SP"},
+        {"registro_operadora": "654321", "cnpj": "99887766000155", "razao_social": "Operadora B", "uf": "RJ"},
+    ]
+    assert response.total_elementos == 2
+    assert response.next_cursor == "654321"
 
 def test_get_ufs():
-    session = MagicMock()
-    session.query.return_value.distinct.return_value.order_by.return_value.all.return_value = [("SP",), ("RJ",)]
-    response = get_ufs(session)
+    resultado = MagicMock()
+    resultado.all.return_value = [("SP",), ("RJ",)]
+    session = criar_session(resultado)
+    response = asyncio.run(get_ufs(session))
     assert response == ["SP", "RJ"]
 
 def test_get_modalidades():
-    session = MagicMock()
-    session.query.return_value.distinct.return_value.order_by.return_value.all.return_value = [("Medicina de Grupo",), ("Odontologia",)]
-    response = get_modalidades(session)
-    assert response == ["Medicina de Grupo", "Odontologia"]
\ No newline at end of file
+    resultado = MagicMock()
+    resultado.all.return_value = [("Medicina de Grupo",), ("Odontologia",)]
+    session = criar_session(resultado)
+    response = asyncio.run(get_modalidades(session))
+    assert response == ["Medicina de Grupo", "Odontologia"]
+
+def test_get_maiores_despesas_trimestre_le_o_resumo():
+    resultado = MagicMock()
+    resultado.fetchall.return_value = []
+    session = criar_session(resultado)
+    response = asyncio.run(get_maiores_despesas_trimestre(session, descricao="despesa", trimestre=1, ano=2023))
+    assert response == []
+    query = str(session.execute.call_args[0][0])
+    assert "FROM resumo_despesas_operadoras" in query
+    assert "demonstracoes_contabeis" not in query
+
+def test_get_operadora_by_registro_pagina_os_ids_sem_carregar_demonstracoes():
+    resultado = MagicMock()
+    resultado.mappings.return_value.first.return_value = {
+        "registro_operadora": "123456", "cnpj": "12345678000199", "razao_social": None, "nome_fantasia": None,
+        "modalidade": None, "logradouro": None, "numero": None, "complemento": None, "bairro": None,
+        "cidade": None, "uf": None, "cep": None, "ddd": None, "telefone": None, "fax": None,
+        "endereco_eletronico": None, "representante": None, "cargo_representante": None,
+        "regiao_de_comercializacao": None, "data_registro_ans": None,
+        "total_demonstracoes": 5, "demonstracoes_contabeis": [3, 4],
+    }
+    session = criar_session(resultado)
+    operadora = asyncio.run(get_operadora_by_registro(session, "123456", limite_demonstracoes=2, cursor_demonstracoes=2))
+    assert operadora.demonstracoes_contabeis == [3, 4]
+    assert operadora.total_demonstracoes == 5
+    assert operadora.next_cursor_demonstracoes == 4
+    assert session.execute.call_count == 1
+    query = str(session.execute.call_args[0][0])
+    assert "array_agg" in query
+    assert "demonstracoes_contabeis.id > " in query
+    assert "demonstracoes_contabeis.descricao" not in query
+
+def test_get_operadora_by_registro_apenas_contagem():
+    resultado = MagicMock()
+    resultado.mappings.return_value.first.return_value = None
+    session = criar_session(resultado)
+    assert asyncio.run(get_operadora_by_registro(session, "000000", apenas_contagem=True)) is None
+    query = str(session.execute.call_args[0][0])
+    assert "count(*)" in query
+    assert "array_agg" not in query
+
+def test_get_maiores_despesas_ano_agrega_antes_de_juntar():
+    resultado = MagicMock()
+    resultado.fetchall.return_value = []
+    session = criar_session(resultado)
+    response = asyncio.run(get_maiores_despesas_ano(session, descricao="despesa", ano=2023, top_n=5, por_trimestre=True))
+    assert response == []
+    query = str(session.execute.call_args[0][0])
+    assert "WITH despesas AS MATERIALIZED" in query
+    assert "FROM ranking r" in query
+    assert "json_agg" in query
+    assert session.execute.call_args[0][1]["top_n"] == 5
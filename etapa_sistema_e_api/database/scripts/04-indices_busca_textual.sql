@@ -0,0 +1,40 @@
+-- Uma partição demonstracoes_contabeis_<ano>_<trimestre> para cada trimestre carregado na partição padrão, com os
+-- mesmos nomes e limites das partições criadas por etapa_banco_de_dados/gerador_de_sql.py
+DO $$
+DECLARE
+    periodo RECORD;
+BEGIN
+    IF to_regclass('demonstracoes_contabeis_padrao') IS NULL THEN
+        RETURN;
+    END IF;
+    ALTER TABLE demonstracoes_contabeis DETACH PARTITION demonstracoes_contabeis_padrao;
+    FOR periodo IN SELECT DISTINCT ano, trimestre FROM demonstracoes_contabeis_padrao ORDER BY ano, trimestre LOOP
+        EXECUTE format(
+            'CREATE TABLE demonstracoes_contabeis_%s_%s PARTITION OF demonstracoes_contabeis FOR VALUES FROM (%s, %s) TO (%s, %s)',
+            periodo.ano, periodo.trimestre, periodo.ano, periodo.trimestre, periodo.ano, periodo.trimestre + 1
+        );
+    END LOOP;
+    INSERT INTO demonstracoes_contabeis SELECT * FROM demonstracoes_contabeis_padrao;
+    DROP TABLE demonstracoes_contabeis_padrao;
+END $$;
+
+-- Chave estrangeira verificada uma única vez, depois da carga e sobre todas as partições
+-- (o PostgreSQL 17 não aceita NOT VALID em chave estrangeira de tabela particionada)
+DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_operadora' AND conrelid = 'demonstracoes_contabeis'::regclass) THEN ALTER TABLE demonstracoes_contabeis ADD CONSTRAINT fk_operadora FOREIGN KEY (registro_operadora) REFERENCES operadoras_ativas (registro_operadora) ON DELETE CASCADE ON UPDATE CASCADE; END IF; END $$;
+
+-- Índices trigram para os filtros unaccent_imutavel(coluna) ILIKE unaccent_imutavel('%texto%') da API
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_social_trgm ON public.operadoras_ativas USING gin (unaccent_imutavel(razao_social) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_nome_fantasia_trgm ON public.operadoras_ativas USING gin (unaccent_imutavel(nome_fantasia) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_cidade_trgm ON public.operadoras_ativas USING gin (unaccent_imutavel(cidade) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_demonstracoes_descricao_trgm ON public.demonstracoes_contabeis USING gin (unaccent_imutavel(descricao) gin_trgm_ops);
+
+-- Índices da paginação por cursor: (ano, trimestre, id) para a ordenação por período e (registro_operadora, id) para a lista de uma operadora
+CREATE INDEX IF NOT EXISTS idx_demonstracoes_periodo ON public.demonstracoes_contabeis (ano, trimestre, id);
+CREATE INDEX IF NOT EXISTS idx_demonstracoes_operadora_id ON public.demonstracoes_contabeis (registro_operadora, id);
+
+-- Resumo usado nos rankings de maiores despesas
+REFRESH MATERIALIZED VIEW resumo_despesas_operadoras;
+
+ANALYZE operadoras_ativas;
+ANALYZE demonstracoes_contabeis;
+ANALYZE resumo_despesas_operadoras;
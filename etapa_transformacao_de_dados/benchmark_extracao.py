@@ -0,0 +1,53 @@
+"""
+Mede páginas/s da extração das tabelas do Anexo I com 1, 2, 4 e N processos (N = núcleos da máquina),
+e confere se o DataFrame gerado em paralelo é igual ao da extração serial.
+
+Uso, a partir de etapa_transformacao_de_dados, com o arquivos_baixados.zip gerado pela etapa de web scrapping:
+    python benchmark_extracao.py --processos 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+import pdfplumber
+
+from tratamento_de_dados import filtrar_e_carregar_arquivo, gerar_tabelas, importar_pdfs_do_zip
+
+
+def medir(caminho, processos, repeticoes):
+    tempos, df = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df = pd.concat(list(gerar_tabelas(caminho, processos)), ignore_index=True)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), df
+
+
+def __main__():
+    parser = argparse.ArgumentParser(description="Benchmark da extração paralela das tabelas do PDF")
+    parser.add_argument('--zip', default='arquivos_baixados.zip')
+    parser.add_argument('--arquivo', default='Anexo I.pdf', help="PDF dentro do zip")
+    parser.add_argument('--processos', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count()}))
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    pdfs = importar_pdfs_do_zip(args.zip)
+    with filtrar_e_carregar_arquivo(pdfs, args.arquivo) as caminho:
+        if caminho is None:
+            return
+        with pdfplumber.open(caminho) as pdf_doc:
+            paginas = len(pdf_doc.pages)
+        print(f"'{args.arquivo}': {paginas} páginas, {os.cpu_count()} núcleos")
+
+        print(f"{'processos':>9} {'tempo (s)':>10} {'páginas/s':>10} {'ganho':>7}  mesmo DataFrame")
+        referencia, tempo_serial = None, None
+        for processos in args.processos:
+            tempo, df = medir(caminho, processos, args.repeticoes)
+            if referencia is None:
+                referencia, tempo_serial = df, tempo
+            print(f"{processos:>9} {tempo:>10.2f} {paginas / tempo:>10.1f} {tempo_serial / tempo:>6.1f}x  {df.equals(referencia)}")
+
+
+if __name__ == '__main__':
+    __main__()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+
+import pdfplumber
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Muda quando o formato dos arquivos do cache mudar, para não ler entradas antigas
+VERSAO_DO_CACHE = 2
+
+
+class CacheDeTabelas:
+    """
+    Cache em disco das tabelas extraídas do PDF, em dois níveis:
+    - documentos/<sha256>.json: as chaves das páginas de um PDF, pelo SHA-256 dos bytes e da configuração
+      da extração. Se o PDF não mudou, as tabelas saem direto dos Parquet, sem abrir o pdfplumber.
+    - paginas/<sha256>_<página>.parquet: a tabela bruta de uma página (linha 0 = cabeçalho), pela chave do
+      documento e pelo número da página. Numa execução interrompida, só as páginas que faltam são extraídas.
+    O tamanho total é limitado; passando do limite, os arquivos usados há mais tempo são apagados.
+    """
+
+    def __init__(self, diretorio, tamanho_maximo_em_bytes, configuracao_da_extracao):
+        self.diretorio = diretorio
+        self.tamanho_maximo_em_bytes = tamanho_maximo_em_bytes
+        # A chave inclui a configuração e a versão do pdfplumber, já que as duas mudam o resultado da extração
+        self.configuracao = json.dumps(
+            [VERSAO_DO_CACHE, pdfplumber.__version__, configuracao_da_extracao], sort_keys=True
+        ).encode()
+        os.makedirs(os.path.join(diretorio, 'documentos'), exist_ok=True)
+        os.makedirs(os.path.join(diretorio, 'paginas'), exist_ok=True)
+
+    def chave_do_documento(self, caminho_do_pdf):
+        chave = hashlib.sha256(self.configuracao)
+        with open(caminho_do_pdf, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+                chave.update(bloco)
+        return chave.hexdigest()
+
+    @staticmethod
+    def chave_da_pagina(chave_do_documento, pagina):
+        # Só o conteúdo da página não basta: a tabela também depende dos Form XObjects e das fontes (ToUnicode)
+        # em Resources. Por isso as páginas não são reaproveitadas entre versões diferentes do PDF
+        return f'{chave_do_documento}_{pagina}'
+
+    def caminho_do_documento(self, chave):
+        return os.path.join(self.diretorio, 'documentos', f'{chave}.json')
+
+    def caminho_da_pagina(self, chave):
+        return os.path.join(self.diretorio, 'paginas', f'{chave}.parquet')
+
+    def ler_documento(self, chave):
+        """
+        Chaves das páginas do documento, ou None se ele não está no cache ou perdeu alguma página.
+        """
+        try:
+            with open(self.caminho_do_documento(chave)) as arquivo:
+                chaves_das_paginas = json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+        if not all(self.tem_pagina(chave_da_pagina) for chave_da_pagina in chaves_das_paginas):
+            return None
+        os.utime(self.caminho_do_documento(chave))
+        return chaves_das_paginas
+
+    def salvar_documento(self, chave, chaves_das_paginas):
+        self.escrever(self.caminho_do_documento(chave), lambda caminho: self.escrever_json(caminho, chaves_das_paginas))
+
+    def tem_pagina(self, chave):
+        return os.path.exists(self.caminho_da_pagina(chave))
+
+    def ler_pagina(self, chave):
+        caminho = self.caminho_da_pagina(chave)
+        linhas = pq.read_table(caminho).to_pylist()
+        os.utime(caminho)
+        # Página sem tabela é guardada como um Parquet sem linhas
+        return [list(linha.values()) for linha in linhas] or None
+
+    def salvar_pagina(self, chave, tabela):
+        # Uma coluna por posição, em texto: o cabeçalho fica na primeira linha e pode ter nomes repetidos ou nulos
+        colunas = list(zip(*tabela)) if tabela else []
+        parquet = pa.table({f'c{i}': pa.array(coluna, type=pa.string()) for i, coluna in enumerate(colunas)})
+        self.escrever(self.caminho_da_pagina(chave), lambda caminho: pq.write_table(parquet, caminho))
+
+    @staticmethod
+    def escrever_json(caminho, valor):
+        with open(caminho, 'w') as arquivo:
+            json.dump(valor, arquivo)
+
+    @staticmethod
+    def escrever(caminho, gravar):
+        # Grava num arquivo temporário e renomeia, para uma execução interrompida não deixar entrada pela metade
+        temporario = f'{caminho}.{os.getpid()}.tmp'
+        gravar(temporario)
+        os.replace(temporario, caminho)
+
+    def limitar_tamanho(self):
+        arquivos = []
+        for subdiretorio in ('documentos', 'paginas'):
+            with os.scandir(os.path.join(self.diretorio, subdiretorio)) as entradas:
+                arquivos.extend((entrada.stat().st_mtime, entrada.stat().st_size, entrada.path) for entrada in entradas)
+        tamanho_total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if tamanho_total <= self.tamanho_maximo_em_bytes:
+                break
+            os.remove(caminho)
+            tamanho_total -= tamanho
@@ -0,0 +1,76 @@
+"""
+PDFs mínimos com tabelas desenhadas, para os testes da extração. Cada página tem o /Contents como um array de
+referências indiretas, com a grade e o texto em streams separados.
+"""
+
+LARGURA_DA_CELULA = 100
+ALTURA_DA_CELULA = 20
+
+
+def desenhar_grade(tabela):
+    comandos = []
+    for i, linha in enumerate(tabela):
+        for j, _ in enumerate(linha):
+            x, y = 50 + j * LARGURA_DA_CELULA, 700 - i * ALTURA_DA_CELULA
+            comandos.append(f'{x} {y} {LARGURA_DA_CELULA} {ALTURA_DA_CELULA} re S')
+    return '\n'.join(comandos)
+
+
+def desenhar_texto(tabela):
+    comandos = []
+    for i, linha in enumerate(tabela):
+        for j, valor in enumerate(linha):
+            x, y = 55 + j * LARGURA_DA_CELULA, 706 - i * ALTURA_DA_CELULA
+            comandos.append(f'BT /F1 10 Tf {x} {y} Td ({valor}) Tj ET')
+    return '\n'.join(comandos)
+
+
+def stream(conteudo, dicionario=''):
+    dados = conteudo.encode('latin-1')
+    return b'<< ' + dicionario.encode() + b' /Length ' + str(len(dados)).encode() + b' >>\nstream\n' + dados + b'\nendstream'
+
+
+def criar_pdf(caminho, paginas, tabela_no_form_xobject=None):
+    """
+    Uma página por item de paginas: uma tabela (lista de linhas, a primeira é o cabeçalho) ou None para uma
+    página sem tabela. Com tabela_no_form_xobject, o texto de todas as páginas vem de um Form XObject (/Fm0 Do),
+    e o conteúdo das páginas é o mesmo qualquer que seja a tabela desenhada nele.
+    """
+    objetos = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    recursos = '/Font << /F1 3 0 R >>'
+    if tabela_no_form_xobject is not None:
+        objetos.append(stream(desenhar_texto(tabela_no_form_xobject),
+                              '/Type /XObject /Subtype /Form /BBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >>'))
+        recursos += f' /XObject << /Fm0 {len(objetos)} 0 R >>'
+
+    kids = []
+    for tabela in paginas:
+        if tabela is None:
+            conteudos = ['', '']
+        elif tabela_no_form_xobject is not None:
+            conteudos = [desenhar_grade(tabela), '/Fm0 Do']
+        else:
+            conteudos = [desenhar_grade(tabela), desenhar_texto(tabela)]
+        referencias = []
+        for conteudo in conteudos:
+            objetos.append(stream(conteudo))
+            referencias.append(f'{len(objetos)} 0 R')
+        objetos.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << {recursos} >> '
+                       f'/Contents [{" ".join(referencias)}] >>'.encode())
+        kids.append(f'{len(objetos)} 0 R')
+    objetos[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'.encode()
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(pdf))
+        pdf += f'{numero} 0 obj\n'.encode() + objeto + b'\nendobj\n'
+    inicio_do_xref = len(pdf)
+    pdf += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    for posicao in posicoes:
+        pdf += f'{posicao:010d} 00000 n \n'.encode()
+    pdf += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_do_xref}\n%%EOF\n'.encode()
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(pdf)
+    return caminho
@@ -0,0 +1,117 @@
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+import tratamento_de_dados
+from cache_de_tabelas import CacheDeTabelas
+from pdfs import criar_pdf
+
+
+TABELA = [['Nome', 'Valor'], ['a', '1'], ['b', '2']]
+OUTRA_TABELA = [['Nome', 'Valor'], ['c', '3']]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheDeTabelas(str(tmp_path / 'cache'), 1024 * 1024, tratamento_de_dados.CONFIGURACAO_DA_EXTRACAO)
+
+
+def como_listas(tabelas):
+    return [[list(df.columns)] + df.values.tolist() for df in tabelas]
+
+
+def contar_paginas_extraidas(monkeypatch):
+    extraidas = []
+    extrair = tratamento_de_dados.extrair_tabelas_das_paginas
+
+    def extrair_e_contar(pdf_doc, paginas):
+        extraidas.extend(paginas)
+        return extrair(pdf_doc, paginas)
+
+    monkeypatch.setattr(tratamento_de_dados, 'extrair_tabelas_das_paginas', extrair_e_contar)
+    return extraidas
+
+
+def test_pagina_com_varios_streams_e_extraida_e_guardada(tmp_path, cache):
+    # O /Contents de cada página é um array de referências indiretas
+    caminho = criar_pdf(str(tmp_path / 'anexo.pdf'), [TABELA, OUTRA_TABELA])
+
+    tabelas = como_listas(tratamento_de_dados.gerar_tabelas(caminho, cache=cache))
+
+    assert tabelas == [TABELA, OUTRA_TABELA]
+    chave_do_documento = cache.chave_do_documento(caminho)
+    assert cache.ler_documento(chave_do_documento) == [f'{chave_do_documento}_0', f'{chave_do_documento}_1']
+
+
+def test_documento_no_cache_nao_abre_o_pdf(tmp_path, cache, monkeypatch):
+    caminho = criar_pdf(str(tmp_path / 'anexo.pdf'), [TABELA, None, OUTRA_TABELA])
+    list(tratamento_de_dados.gerar_tabelas(caminho, cache=cache))
+
+    def falhar(*args, **kwargs):
+        raise AssertionError('o PDF não deveria ser aberto')
+
+    monkeypatch.setattr(tratamento_de_dados.pdfplumber, 'open', falhar)
+    assert como_listas(tratamento_de_dados.gerar_tabelas(caminho, cache=cache)) == [TABELA, OUTRA_TABELA]
+
+
+def test_so_as_paginas_que_faltam_sao_extraidas(tmp_path, cache, monkeypatch):
+    caminho = criar_pdf(str(tmp_path / 'anexo.pdf'), [TABELA, OUTRA_TABELA, TABELA])
+    list(tratamento_de_dados.gerar_tabelas(caminho, cache=cache))
+    chave_do_documento = cache.chave_do_documento(caminho)
+    os.remove(cache.caminho_da_pagina(cache.chave_da_pagina(chave_do_documento, 1)))
+    assert cache.ler_documento(chave_do_documento) is None
+
+    extraidas = contar_paginas_extraidas(monkeypatch)
+    tabelas = como_listas(tratamento_de_dados.gerar_tabelas(caminho, cache=cache))
+
+    assert extraidas == [1]
+    assert tabelas == [TABELA, OUTRA_TABELA, TABELA]
+
+
+def test_form_xobject_alterado_nao_devolve_a_tabela_antiga(tmp_path, cache):
+    # As duas versões têm o mesmo conteúdo de página; só a tabela desenhada pelo /Fm0 muda
+    primeira = criar_pdf(str(tmp_path / 'v1.pdf'), [TABELA], tabela_no_form_xobject=TABELA)
+    segunda = criar_pdf(str(tmp_path / 'v2.pdf'), [TABELA], tabela_no_form_xobject=[TABELA[0], ['z', '9'], ['y', '8']])
+
+    assert como_listas(tratamento_de_dados.gerar_tabelas(primeira, cache=cache)) == [TABELA]
+    assert como_listas(tratamento_de_dados.gerar_tabelas(segunda, cache=cache)) == [[TABELA[0], ['z', '9'], ['y', '8']]]
+
+
+def test_pagina_sem_tabela_e_um_parquet_vazio(cache):
+    cache.salvar_pagina('vazia', None)
+
+    assert cache.tem_pagina('vazia')
+    assert pq.read_table(cache.caminho_da_pagina('vazia')).num_rows == 0
+    assert cache.ler_pagina('vazia') is None
+
+
+def test_tabela_guardada_volta_igual(cache):
+    tabela = [['Nome', None, 'Nome'], ['a', 'b', None]]
+    cache.salvar_pagina('pagina', tabela)
+
+    assert cache.ler_pagina('pagina') == tabela
+
+
+def test_limitar_tamanho_apaga_os_arquivos_usados_ha_mais_tempo(cache):
+    for numero, chave in enumerate(['antiga', 'media', 'nova']):
+        cache.salvar_pagina(chave, TABELA)
+        os.utime(cache.caminho_da_pagina(chave), (numero, numero))
+    tamanho_de_uma_pagina = os.path.getsize(cache.caminho_da_pagina('nova'))
+    cache.tamanho_maximo_em_bytes = 2 * tamanho_de_uma_pagina
+
+    cache.limitar_tamanho()
+
+    assert not cache.tem_pagina('antiga')
+    assert cache.tem_pagina('media')
+    assert cache.tem_pagina('nova')
+
+
+def test_documento_com_pagina_apagada_pelo_limite_nao_e_lido(cache):
+    cache.salvar_pagina('documento_0', TABELA)
+    cache.salvar_documento('documento', ['documento_0'])
+    cache.tamanho_maximo_em_bytes = 0
+
+    cache.limitar_tamanho()
+
+    assert cache.ler_documento('documento') is None
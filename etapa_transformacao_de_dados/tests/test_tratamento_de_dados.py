@@ -0,0 +1,88 @@
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import tratamento_de_dados
+from pdfs import criar_pdf
+
+
+def ler_entradas(nome_zip):
+    with zipfile.ZipFile(nome_zip) as zipf:
+        return {nome: pd.read_csv(io.BytesIO(zipf.read(nome)), index_col=0) for nome in zipf.namelist()}
+
+
+def test_paginas_com_o_mesmo_cabecalho_viram_um_csv_so(tmp_path):
+    nome_zip = str(tmp_path / 'anexo.zip')
+    paginas = [pd.DataFrame([['a', '1']], columns=['Nome', 'OD']), pd.DataFrame([['b', '2']], columns=['Nome', 'OD'])]
+
+    assert tratamento_de_dados.salvar_csv_zip(iter(paginas), nome_zip) == 2
+
+    entradas = ler_entradas(nome_zip)
+    assert list(entradas) == ['tabela.csv']
+    assert list(entradas['tabela.csv'].columns) == ['Nome', 'Seg. Odontológica']
+    assert list(entradas['tabela.csv'].index) == [0, 1]
+    assert list(entradas['tabela.csv']['Nome']) == ['a', 'b']
+
+
+def test_paginas_com_colunas_diferentes_vao_para_outra_entrada(tmp_path):
+    nome_zip = str(tmp_path / 'anexo.zip')
+    paginas = [
+        pd.DataFrame([['a', '1']], columns=['Nome', 'Valor']),
+        pd.DataFrame([['x', '9', 'extra']], columns=['Nome', 'Valor', 'Obs']),
+        pd.DataFrame([['p', 'q']], columns=['Outro', 'Cabeçalho']),
+        pd.DataFrame([['b', '2']], columns=['Nome', 'Valor']),
+        pd.DataFrame([['y', '8', 'mais']], columns=['Nome', 'Valor', 'Obs']),
+    ]
+
+    assert tratamento_de_dados.salvar_csv_zip(iter(paginas), nome_zip) == 5
+
+    entradas = ler_entradas(nome_zip)
+    assert list(entradas) == ['tabela.csv', 'tabela_2.csv', 'tabela_3.csv']
+    assert list(entradas['tabela.csv']['Nome']) == ['a', 'b']
+    assert list(entradas['tabela_2.csv'].columns) == ['Nome', 'Valor', 'Obs']
+    assert list(entradas['tabela_2.csv']['Obs']) == ['extra', 'mais']
+    assert list(entradas['tabela_2.csv'].index) == [0, 1]
+    # Mesma quantidade de colunas, mas outro cabeçalho: não é renomeado pela posição
+    assert list(entradas['tabela_3.csv'].columns) == ['Outro', 'Cabeçalho']
+
+
+def test_dividir_paginas_cobre_todas_as_paginas_em_intervalos_limitados():
+    paginas = list(range(1000))
+
+    intervalos = tratamento_de_dados.dividir_paginas(paginas, 2)
+
+    assert [pagina for intervalo in intervalos for pagina in intervalo] == paginas
+    assert max(len(intervalo) for intervalo in intervalos) == tratamento_de_dados.PAGINAS_POR_INTERVALO
+    assert len(tratamento_de_dados.dividir_paginas(list(range(16)), 2)) == 8
+
+
+def test_extracao_paralela_e_igual_a_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(tratamento_de_dados, 'PAGINAS_POR_INTERVALO', 2)
+    tabelas = [[['Nome', 'Valor'], [f'linha {pagina}', str(pagina)]] for pagina in range(12)]
+    tabelas[5] = None
+    caminho = criar_pdf(str(tmp_path / 'anexo.pdf'), tabelas)
+
+    serial = list(tratamento_de_dados.gerar_tabelas(caminho, processos=1))
+    paralelo = list(tratamento_de_dados.gerar_tabelas(caminho, processos=2))
+
+    assert len(paralelo) == 11
+    assert all(df_paralelo.equals(df_serial) for df_paralelo, df_serial in zip(paralelo, serial))
+
+
+def test_pool_recebe_uma_janela_de_intervalos_e_cancela_o_resto_ao_fechar(monkeypatch):
+    # Threads no lugar de processos, para contar os intervalos extraídos
+    extraidos = []
+    monkeypatch.setattr(tratamento_de_dados, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(tratamento_de_dados, 'PAGINAS_POR_INTERVALO', 1)
+    monkeypatch.setattr(tratamento_de_dados, 'extrair_tabelas_do_intervalo',
+                        lambda intervalo: extraidos.append(intervalo) or [[['pagina'], [intervalo[0]]]])
+
+    extraidas = tratamento_de_dados.extrair_paginas(None, 'anexo.pdf', list(range(100)), 2)
+    assert next(extraidas) == [['pagina'], [0]]
+    extraidas.close()
+
+    janela = 2 * tratamento_de_dados.INTERVALOS_POR_PROCESSO
+    assert len(extraidos) <= janela + 1
+    assert sorted(extraidos) == [[pagina] for pagina in range(len(extraidos))]
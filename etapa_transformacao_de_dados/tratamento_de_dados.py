@@ -3,43 +3,158 @@ import zipfile
 import pdfplumber
 import pandas as pd
 import io
+import argparse
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
+from itertools import islice
+from cache_de_tabelas import CacheDeTabelas
 
 
+# Caminho do PDF em cada processo do pool, definido uma vez só pelo inicializar_processo
+caminho_do_pdf = None
+
+# Com processos > 1, no máximo processos * INTERVALOS_POR_PROCESSO intervalos de até PAGINAS_POR_INTERVALO páginas
+# ficam no pool (em extração ou com o resultado esperando o consumidor)
+PAGINAS_POR_INTERVALO = 16
+INTERVALOS_POR_PROCESSO = 2
+
+# table_settings do pdfplumber; faz parte da chave do cache, então mudá-la invalida as tabelas já extraídas
+CONFIGURACAO_DA_EXTRACAO = {}
+
+
+class PdfsDoZip:
+    """
+    Acesso aos PDFs de um zip sem carregá-los na memória: só o índice do zip é lido aqui, e cada PDF é
+    descompactado quando for aberto.
+    """
+
+    def __init__(self, zip_file):
+        self.zip_file = zip_file
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            self.nomes = [arquivo for arquivo in zip_ref.namelist() if arquivo.lower().endswith('.pdf')]
+
+    @contextmanager
+    def abrir(self, nome):
+        # O pdfplumber vai e volta no arquivo, e voltar num membro comprimido do zip descompacta tudo de novo;
+        # por isso o PDF vai, em blocos, para um arquivo temporário, apagado ao sair do with
+        with tempfile.TemporaryDirectory() as diretorio, zipfile.ZipFile(self.zip_file, 'r') as zip_ref:
+            caminho = os.path.join(diretorio, os.path.basename(nome))
+            with zip_ref.open(nome) as membro, open(caminho, 'wb') as temporario:
+                shutil.copyfileobj(membro, temporario, 1024 * 1024)
+            yield caminho
+
 def importar_pdfs_do_zip(zip_file):
-    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-        nomes = zip_ref.namelist()
-        pdfs = []
-        for arquivo in nomes:
-            if arquivo.lower().endswith('.pdf'):
-                conteudo = zip_ref.read(arquivo)
-                pdfs.append({'nome': arquivo, 'conteudo': conteudo})
-    return pdfs
+    return PdfsDoZip(zip_file)
 
+@contextmanager
 def filtrar_e_carregar_arquivo(pdfs, arquivo_das_tabelas):
-    arquivos_filtrados = [pdf for pdf in pdfs if pdf['nome'] == arquivo_das_tabelas]
-
-    if not arquivos_filtrados:
+    """
+    Caminho de uma cópia temporária do PDF, válida dentro do with, ou None se ele não está no zip.
+    """
+    if arquivo_das_tabelas not in pdfs.nomes:
         print(f"Arquivo '{arquivo_das_tabelas}' não encontrado no zip.")
+        yield None
         return
 
-    arquivo = arquivos_filtrados[0]
+    with pdfs.abrir(arquivo_das_tabelas) as caminho:
+        yield caminho
 
-    return io.BytesIO(arquivo['conteudo'])
 
+def extrair_tabelas_das_paginas(pdf_doc, paginas):
+    # Tabelas brutas (listas de linhas, None se a página não tem tabela), na ordem das páginas
+    for pagina in paginas:
+        pagina_do_pdf = pdf_doc.pages[pagina]
+        tabela = pagina_do_pdf.extract_table(CONFIGURACAO_DA_EXTRACAO)
+        # Libera os objetos da página que o pdfplumber guarda em cache, senão o documento inteiro fica na memória
+        pagina_do_pdf.close()
+        yield tabela
 
-def processar_paginas_e_extrair_tabelas(pdfs, arquivo_das_tabelas):
-    pdf_stream = filtrar_e_carregar_arquivo(pdfs, arquivo_das_tabelas)
-    with pdfplumber.open(pdf_stream) as pdf_doc:
-        todas_tabelas = []
-        for pagina in pdf_doc.pages:
-            tabela = pagina.extract_table()
-            if tabela:
-                df_tabela = pd.DataFrame(tabela[1:], columns=tabela[0])
-                todas_tabelas.append(df_tabela)
-        if not todas_tabelas:
-            print("Nenhuma tabela encontrada no arquivo")
-            return None
-        return pd.concat(todas_tabelas, ignore_index=True)
+def inicializar_processo(caminho):
+    global caminho_do_pdf
+    caminho_do_pdf = caminho
+
+def extrair_tabelas_do_intervalo(paginas):
+    # Cada processo abre a sua própria cópia do PDF; os objetos do pdfplumber não podem ser enviados entre processos.
+    # Devolve as tabelas brutas, e não DataFrames: o cache guarda a tabela bruta, e o cabeçalho pode ter colunas
+    # repetidas ou None, que o Arrow não representa
+    with pdfplumber.open(caminho_do_pdf) as pdf_doc:
+        return list(extrair_tabelas_das_paginas(pdf_doc, paginas))
+
+def dividir_paginas(paginas, processos):
+    # Mais intervalos que processos, para um processo que pegou páginas mais densas não segurar os outros; e
+    # intervalos pequenos, para os resultados à espera do consumidor não crescerem com o tamanho do PDF
+    tamanho = max(1, min(-(-len(paginas) // (processos * 4)), PAGINAS_POR_INTERVALO))
+    return [paginas[inicio:inicio + tamanho] for inicio in range(0, len(paginas), tamanho)]
+
+def extrair_paginas(pdf_doc, caminho, paginas, processos):
+    if processos <= 1 or not paginas:
+        yield from extrair_tabelas_das_paginas(pdf_doc, paginas)
+        return
+    intervalos = iter(dividir_paginas(paginas, processos))
+    executor = ProcessPoolExecutor(processos, initializer=inicializar_processo, initargs=(caminho,))
+    try:
+        # Só uma janela de intervalos fica submetida ao pool (como no submeter_chunks_com_limite do gerador de SQL);
+        # os resultados saem na ordem dos intervalos, mesmo que terminem fora de ordem
+        em_andamento = deque(executor.submit(extrair_tabelas_do_intervalo, intervalo)
+                             for intervalo in islice(intervalos, processos * INTERVALOS_POR_PROCESSO))
+        while em_andamento:
+            tabelas = em_andamento.popleft().result()
+            proximo = next(intervalos, None)
+            if proximo is not None:
+                em_andamento.append(executor.submit(extrair_tabelas_do_intervalo, proximo))
+            yield from tabelas
+    finally:
+        # Se o consumidor parar no meio (erro ou generator fechado), os intervalos que não começaram são cancelados
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def como_dataframe(tabela):
+    return pd.DataFrame(tabela[1:], columns=tabela[0]) if tabela else None
+
+def gerar_tabelas(caminho, processos=1, cache=None):
+    """
+    Gera o DataFrame de cada página com tabela, na ordem das páginas. Com processos > 1, as páginas são
+    divididas em intervalos entre um pool de processos. Com cache, o pdfplumber só é aberto se o PDF mudou,
+    e só as páginas que não estão no cache são extraídas.
+    """
+    if cache is not None:
+        chave_do_documento = cache.chave_do_documento(caminho)
+        chaves_das_paginas = cache.ler_documento(chave_do_documento)
+        if chaves_das_paginas is not None:
+            for chave in chaves_das_paginas:
+                df = como_dataframe(cache.ler_pagina(chave))
+                if df is not None:
+                    yield df
+            return
+
+    with pdfplumber.open(caminho) as pdf_doc:
+        paginas = range(len(pdf_doc.pages))
+        if cache is None:
+            faltando = list(paginas)
+        else:
+            chaves_das_paginas = [cache.chave_da_pagina(chave_do_documento, pagina) for pagina in paginas]
+            faltando = [pagina for pagina in paginas if not cache.tem_pagina(chaves_das_paginas[pagina])]
+            print(f"{len(paginas) - len(faltando)} de {len(paginas)} páginas encontradas no cache")
+
+        paginas_faltando = set(faltando)
+        # O closing encerra o pool assim que o consumidor parar, sem esperar o generator ser coletado
+        with closing(extrair_paginas(pdf_doc, caminho, faltando, processos)) as extraidas:
+            for pagina in paginas:
+                if pagina in paginas_faltando:
+                    tabela = next(extraidas)
+                    if cache is not None:
+                        cache.salvar_pagina(chaves_das_paginas[pagina], tabela)
+                else:
+                    tabela = cache.ler_pagina(chaves_das_paginas[pagina])
+                df = como_dataframe(tabela)
+                if df is not None:
+                    yield df
+
+    if cache is not None:
+        cache.salvar_documento(chave_do_documento, chaves_das_paginas)
+        cache.limitar_tamanho()
 
 def trata_dados_tabela(df):
     df = df.rename(columns={
@@ -50,28 +165,93 @@ def trata_dados_tabela(df):
     df = df.replace(r'\n', ' ', regex=True)
     return df
 
-def salvar_csv_zip(df, nome_zip):
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=True)
-    csv_buffer.seek(0)
-    with zipfile.ZipFile(nome_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        zipf.writestr('tabela.csv', csv_buffer.getvalue())
+class EntradaCsv:
+    """
+    Uma entrada CSV do zip: o cabeçalho é escrito só na primeira tabela, e o índice continua entre as páginas.
+    """
+
+    def __init__(self, nome, arquivo):
+        self.nome = nome
+        self.arquivo = arquivo
+        self.linhas = None
+
+    def escrever(self, df):
+        inicio = self.linhas or 0
+        df.index = pd.RangeIndex(inicio, inicio + len(df))
+        df.to_csv(self.arquivo, index=True, header=self.linhas is None)
+        self.linhas = inicio + len(df)
+
+def salvar_csv_zip(tabelas, nome_zip, nivel_de_compressao=6):
+    """
+    Escreve as tabelas, uma página por vez, direto na entrada 'tabela.csv' do zip, com o cabeçalho só uma vez
+    e o índice contínuo entre as páginas. Só a tabela da página atual fica na memória.
+    Páginas com colunas diferentes das da primeira não são descartadas nem renomeadas: cada cabeçalho diferente
+    vai para a sua própria entrada (tabela_2.csv, tabela_3.csv, ...).
+    Devolve a quantidade de linhas escritas.
+    """
+    if isinstance(tabelas, pd.DataFrame):
+        tabelas = [tabelas]
+    entradas = {}
+    with zipfile.ZipFile(nome_zip, 'w', zipfile.ZIP_DEFLATED, compresslevel=nivel_de_compressao) as zipf, \
+            tempfile.TemporaryDirectory() as diretorio, ExitStack() as arquivos:
+        with zipf.open('tabela.csv', 'w') as entrada, io.TextIOWrapper(entrada, encoding='utf-8', newline='') as csv:
+            for df in tabelas:
+                df = trata_dados_tabela(df)
+                colunas = tuple(df.columns)
+                if not entradas:
+                    entradas[colunas] = EntradaCsv('tabela.csv', csv)
+                elif colunas not in entradas:
+                    # O zip só aceita uma entrada aberta para escrita por vez, então as outras vão antes para
+                    # arquivos temporários e são copiadas no final
+                    nome = f'tabela_{len(entradas) + 1}.csv'
+                    print(f"Página com colunas diferentes das da primeira ({list(colunas)}), escrita em '{nome}'")
+                    arquivo = arquivos.enter_context(
+                        open(os.path.join(diretorio, nome), 'w', encoding='utf-8', newline='')
+                    )
+                    entradas[colunas] = EntradaCsv(nome, arquivo)
+                entradas[colunas].escrever(df)
+        for entrada_csv in list(entradas.values())[1:]:
+            entrada_csv.arquivo.close()
+            zipf.write(entrada_csv.arquivo.name, entrada_csv.nome)
+    return sum(entrada_csv.linhas for entrada_csv in entradas.values())
 
 def __main__():
-    nome_do_zip = 'arquivos_baixados.zip'
-    arquivo_das_tabelas = 'Anexo I.pdf'
+    parser = argparse.ArgumentParser(description="Extrai as tabelas do Anexo I e gera o CSV compactado")
+    parser.add_argument('--arquivos', nargs='+', default=['Anexo I.pdf'],
+                        help="PDFs do zip a processar, um de cada vez (ex.: 'Anexo I.pdf' 'Anexo II.pdf')")
+    parser.add_argument('--processos', type=int, default=1,
+                        help="Processos usados na extração das páginas (0 usa todos os núcleos)")
+    parser.add_argument('--nivel_de_compressao', type=int, default=6, choices=range(10), metavar='0-9',
+                        help="Nível do deflate no zip gerado (0 = sem compressão, 9 = máxima)")
+    parser.add_argument('--diretorio_do_cache', default='.cache_tabelas',
+                        help="Onde guardar as tabelas já extraídas, por hash do PDF e número da página")
+    parser.add_argument('--tamanho_maximo_do_cache_mb', type=int, default=512)
+    parser.add_argument('--sem_cache', action='store_true', help="Extrai todas as páginas, sem ler nem gravar o cache")
+    args = parser.parse_args()
+    processos = args.processos or os.cpu_count()
+    cache = None if args.sem_cache else CacheDeTabelas(
+        args.diretorio_do_cache, args.tamanho_maximo_do_cache_mb * 1024 * 1024, CONFIGURACAO_DA_EXTRACAO
+    )
 
-    print(f"Processando '{nome_do_zip}' e '{arquivo_das_tabelas}'")
+    nome_do_zip = 'arquivos_baixados.zip'
     pdfs = importar_pdfs_do_zip(nome_do_zip)
-    df_todas_tabelas = processar_paginas_e_extrair_tabelas(pdfs, arquivo_das_tabelas)
-
-    if df_todas_tabelas is not None:
-        df_final = trata_dados_tabela(df_todas_tabelas)
-        salvar_csv_zip(df_final, arquivo_das_tabelas.replace('.pdf', '.zip'))
-        caminho_completo = os.path.abspath(f'{arquivo_das_tabelas.replace('.pdf', '.zip')}')
-        print(f"Arquivo 'Anexo I.zip' gerado com sucesso, você pode abri-lo para ver a tabela utilizando o seguinte caminho: {caminho_completo}")
-    else:
-        print("Nenhuma tabela encontrada no arquivo")
+
+    # Um anexo por vez: só o PDF que está sendo processado é descompactado, num arquivo temporário
+    for arquivo_das_tabelas in args.arquivos:
+        nome_do_zip_gerado = arquivo_das_tabelas.replace('.pdf', '.zip')
+        print(f"Processando '{nome_do_zip}' e '{arquivo_das_tabelas}' com {processos} processo(s)")
+        with filtrar_e_carregar_arquivo(pdfs, arquivo_das_tabelas) as caminho:
+            if caminho is None:
+                continue
+            # Cada página é tratada e escrita no CSV assim que é extraída, sem juntar o anexo inteiro num DataFrame
+            linhas = salvar_csv_zip(gerar_tabelas(caminho, processos, cache), nome_do_zip_gerado, args.nivel_de_compressao)
+
+        if linhas:
+            caminho_completo = os.path.abspath(nome_do_zip_gerado)
+            print(f"Arquivo '{nome_do_zip_gerado}' gerado com sucesso, você pode abri-lo para ver a tabela utilizando o seguinte caminho: {caminho_completo}")
+        else:
+            os.remove(nome_do_zip_gerado)
+            print("Nenhuma tabela encontrada no arquivo")
 
 
 if __name__ == '__main__':